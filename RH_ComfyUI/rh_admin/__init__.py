@@ -20,9 +20,11 @@ from .commands import (
     parse_add_points_args,
     parse_query_points_args,
 )
+from ..utils.model_manifest import manifest_loader
 
 sv_admin = SV("积分管理", pm=0)
 sv_user = SV("用户积分")
+sv_model = SV("模型管理", pm=0)
 
 
 @sv_admin.on_command(("增加积分", "加积分"), block=True)
@@ -97,3 +99,23 @@ async def query_points(bot: Bot, ev: Event) -> None:
 
     result: str = await query_user_points(target_user_id, ev)
     await bot.send(result)
+
+
+@sv_model.on_command(("刷新模型", "重载模型"), block=True)
+async def reload_models(bot: Bot, ev: Event) -> None:
+    """管理员重新扫描工作流清单, 注册新增或修改的模型, 移除清单已删除的模型.
+
+    Args:
+        bot: Bot 实例
+        ev: Event 实例
+    """
+    updated, removed = await manifest_loader.reload()
+    if not updated and not removed:
+        return await bot.send("📋 工作流清单没有变化")
+
+    lines = []
+    if updated:
+        lines.append(f"✅ 已注册/更新模型: {', '.join(updated)}")
+    if removed:
+        lines.append(f"🗑️ 已移除模型: {', '.join(removed)}")
+    await bot.send("\n".join(lines))
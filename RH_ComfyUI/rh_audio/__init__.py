@@ -19,12 +19,12 @@ async def _(bot: Bot, ev: Event):
         return await bot.send("你需要在命令后面加入你要生成的音乐prompt！")
 
     # 确认积分
-    success, msg = await check_point(ev, Music_Point)
+    success, msg = await check_point(ev, Music_Point, "music")
     if not success:
         return await bot.send(msg)
     else:
         await bot.send(msg)
-        music = await gen_music(prompt)
+        music = await gen_music(prompt, ev=ev)
 
         if music is None:
             return await bot.send("❌ 音乐生成失败！请检查prompt是否正确！")
@@ -41,12 +41,12 @@ async def _(bot: Bot, ev: Event):
         return await bot.send("你需要在命令后面加入你要生成的语音文本！")
 
     # 确认积分
-    success, msg = await check_point(ev, Speech_Point)
+    success, msg = await check_point(ev, Speech_Point, "speech")
     if not success:
         return await bot.send(msg)
     else:
         await bot.send(msg)
-        speech = await gen_speech(prompt)
+        speech = await gen_speech(prompt, ev=ev)
 
         if speech is None:
             return await bot.send("❌ 语音生成失败！请检查prompt是否正确！")
@@ -4,12 +4,13 @@ from gsuid_core.utils.plugins_config.models import (
     GSC,
     GsIntConfig,
     GsStrConfig,
+    GsBoolConfig,
 )
 
 CONFIG_DEFAULT: Dict[str, GSC] = {
     "ComfyUI_BaseURL": GsStrConfig(
         "ComfyUI 服务地址",
-        "用于设置ComfyUI Server Address的配置",
+        "用于设置ComfyUI Server Address的配置, 多台机器用逗号分隔",
         "127.0.0.1:8188",
         options=[
             "使用RunningHub代理",
@@ -18,12 +19,49 @@ CONFIG_DEFAULT: Dict[str, GSC] = {
     ),
     "RH_apikey": GsStrConfig(
         "RunningHub API Key",
-        "用于设置RunningHub API Key的配置",
+        "用于设置RunningHub API Key的配置, 多个Key以逗号分隔, 请求时自动选择负载最低的Key",
         "",
     ),
+    "RH_Webhook_URL": GsStrConfig(
+        "RunningHub回调地址",
+        "RunningHub可访问的gsuid_core外网地址(如 http://1.2.3.4:8765), 配置后由RunningHub回调通知任务完成, 留空则轮询",
+        "",
+    ),
+    "RH_Webhook_Poll_Seconds": GsIntConfig(
+        "回调兜底轮询间隔",
+        "配置回调地址后, 未收到回调时每隔该秒数查询一次任务状态",
+        60,
+        options=[
+            30,
+            60,
+            120,
+        ],
+    ),
+    "RH_Max_Concurrency": GsIntConfig(
+        "RunningHub并发任务数",
+        "每个API Key同时运行的RunningHub AI应用任务数, 请按账号等级的并发上限设置",
+        1,
+        options=[
+            1,
+            3,
+            5,
+            10,
+        ],
+    ),
+    "RH_Requests_Per_Minute": GsIntConfig(
+        "RunningHub每分钟请求数",
+        "同一API Key每分钟向RunningHub发送的请求数上限, 0为不限制(仍会按限速响应退避)",
+        60,
+        options=[
+            0,
+            30,
+            60,
+            120,
+        ],
+    ),
     "BLT_apikey": GsStrConfig(
         "BLT API Key",
-        "用于设置BLT/OpenAI兼容API的API Key配置",
+        "用于设置BLT/OpenAI兼容API的API Key配置, 多个Key以逗号分隔, 请求时自动选择负载最低的Key",
         "",
         options=[
             "sk-xxx",
@@ -37,6 +75,33 @@ CONFIG_DEFAULT: Dict[str, GSC] = {
             "https://api.bltcy.ai",
         ],
     ),
+    "BLT_Prefer_B64": GsBoolConfig(
+        "BLT优先b64_json",
+        "生图时优先让BLT以b64_json随响应返回图片, 省去一次CDN下载; 模型不支持时自动退回url",
+        True,
+    ),
+    "BLT_Key_Concurrency": GsIntConfig(
+        "BLT单Key并发数",
+        "每个BLT API Key同时进行的请求数, 0为不限制",
+        0,
+        options=[
+            0,
+            2,
+            4,
+            8,
+        ],
+    ),
+    "BLT_Requests_Per_Minute": GsIntConfig(
+        "BLT每分钟请求数",
+        "同一API Key每分钟向BLT发送的请求数上限, 0为不限制(仍会按限速响应退避)",
+        60,
+        options=[
+            0,
+            30,
+            60,
+            120,
+        ],
+    ),
     "Default_Point": GsIntConfig(
         "默认初始积分",
         "用于设置新用户默认初始积分的配置",
@@ -59,6 +124,17 @@ CONFIG_DEFAULT: Dict[str, GSC] = {
             20,
         ],
     ),
+    "Max_Batch_Size": GsIntConfig(
+        "单次最多生成张数",
+        "生图/编辑图片时可通过 `4张` 一次生成多张, 按张扣除积分, 该项限制单次最多张数",
+        4,
+        options=[
+            1,
+            2,
+            4,
+            8,
+        ],
+    ),
     "Edit_Image_Point": GsIntConfig(
         "编辑图片积分消耗",
         "用于设置每次编辑消耗的积分的配置",
@@ -103,4 +179,265 @@ CONFIG_DEFAULT: Dict[str, GSC] = {
             20,
         ],
     ),
+    "Route_Cost_Weight": GsIntConfig(
+        "路由成本权重",
+        "模型路由时每单位调用成本折算的秒数, 越大越倾向使用自有ComfyUI, 0表示只看速度",
+        10,
+        options=[
+            0,
+            5,
+            10,
+            30,
+        ],
+    ),
+    "RAG_Cache_TTL": GsIntConfig(
+        "RAG推荐缓存时间",
+        "相同类别与提示词的RAG模型推荐结果缓存的秒数, 0表示不缓存",
+        600,
+        options=[
+            0,
+            300,
+            600,
+            3600,
+        ],
+    ),
+    "Circuit_Failure_Threshold": GsIntConfig(
+        "熔断失败次数",
+        "后端连续失败达到该次数后熔断, 期间相关模型视为不可用并直接切换到其他模型",
+        3,
+        options=[
+            2,
+            3,
+            5,
+            10,
+        ],
+    ),
+    "Circuit_Recovery_Seconds": GsIntConfig(
+        "熔断恢复时间",
+        "熔断后经过该秒数进入半开状态, 放行一次探测请求",
+        60,
+        options=[
+            30,
+            60,
+            120,
+            300,
+        ],
+    ),
+    "Health_Check_Interval": GsIntConfig(
+        "健康检查间隔",
+        "后台主动探测各后端的间隔秒数, 0表示关闭主动探测",
+        60,
+        options=[
+            0,
+            30,
+            60,
+            120,
+        ],
+    ),
+    "Trace_Enable": GsBoolConfig(
+        "启用任务追踪",
+        "开启后每次生成任务的各阶段耗时将以JSON Lines格式写入trace目录",
+        True,
+    ),
+    "Trace_Retention_Days": GsIntConfig(
+        "追踪文件保留天数",
+        "任务追踪文件按天写入, 超出天数的旧文件将被删除, 0表示不删除",
+        7,
+        options=[
+            0,
+            3,
+            7,
+            30,
+        ],
+    ),
+    "Micro_Batch_Enable": GsBoolConfig(
+        "启用ComfyUI微批处理",
+        "开启后短时间内尺寸相同的文生图请求将合并为一个ComfyUI工作流提交, 共享模型加载与排队开销",
+        False,
+    ),
+    "Micro_Batch_Window_MS": GsIntConfig(
+        "微批等待窗口",
+        "收到首个请求后等待其他可合并请求的毫秒数, 越大合并越多但单次请求延迟越高",
+        300,
+        options=[
+            100,
+            300,
+            500,
+            1000,
+        ],
+    ),
+    "Micro_Batch_Max": GsIntConfig(
+        "微批最大请求数",
+        "单个合并工作流最多包含的请求数, 达到后立即提交",
+        4,
+        options=[
+            2,
+            4,
+            6,
+            8,
+        ],
+    ),
+    "Queue_Max_Concurrency": GsIntConfig(
+        "最大并发任务数",
+        "同时执行的生成任务上限, 超出的任务按公平调度排队, 0表示不限制",
+        0,
+        options=[
+            0,
+            2,
+            4,
+            8,
+        ],
+    ),
+    "Queue_User_Concurrency": GsIntConfig(
+        "单用户并发任务数",
+        "每个用户同时执行的生成任务上限, 0表示不限制",
+        0,
+        options=[
+            0,
+            1,
+            2,
+            3,
+        ],
+    ),
+    "Queue_Group_Concurrency": GsIntConfig(
+        "单群并发任务数",
+        "每个群同时执行的生成任务上限, 0表示不限制",
+        0,
+        options=[
+            0,
+            1,
+            2,
+            4,
+        ],
+    ),
+    "Queue_Category_Limits": GsStrConfig(
+        "类别并发限额",
+        "按模型类别限制同时执行的任务数, 格式为 类别:数量, 多个用逗号分隔, 避免视频等耗时任务占满全部并发",
+        "text2video:1,image2video:1",
+        options=[
+            "text2video:1,image2video:1",
+            "text2video:2,image2video:2",
+            "",
+        ],
+    ),
+    "Queue_Admin_Weight": GsIntConfig(
+        "管理员调度权重",
+        "管理员(user_pm为0)排队时的权重, 权重越高获得的执行份额越多",
+        4,
+        options=[
+            1,
+            2,
+            4,
+            8,
+        ],
+    ),
+    "Queue_VIP_Point": GsIntConfig(
+        "VIP积分门槛",
+        "积分达到该值的用户按VIP权重排队, 0表示不启用",
+        0,
+        options=[
+            0,
+            200,
+            500,
+            1000,
+        ],
+    ),
+    "Queue_VIP_Weight": GsIntConfig(
+        "VIP调度权重",
+        "VIP用户排队时的权重",
+        2,
+        options=[
+            1,
+            2,
+            3,
+            4,
+        ],
+    ),
+    "Admission_SLA_Seconds": GsIntConfig(
+        "准入等待上限",
+        "扣除积分前估算的完成时间超出该秒数时不接受任务(不扣积分), 0表示不限制",
+        1800,
+        options=[
+            0,
+            600,
+            1800,
+            3600,
+        ],
+    ),
+    "Admission_Defer_Seconds": GsIntConfig(
+        "准入延后等待时间",
+        "预计完成时间超出上限时, 先等待该秒数让队列消化后再决定是否拒绝, 0表示直接拒绝",
+        0,
+        options=[
+            0,
+            60,
+            180,
+            300,
+        ],
+    ),
+    "ComfyUI_Max_Inflight": GsIntConfig(
+        "ComfyUI单机在途任务数",
+        "每台ComfyUI机器同时提交的任务数, 其余任务在本地排队以便按已加载模型重新排序, 0表示不限制",
+        0,
+        options=[
+            0,
+            1,
+            2,
+            4,
+        ],
+    ),
+    "Affinity_Window_Seconds": GsIntConfig(
+        "模型亲和公平窗口",
+        "为避免切换模型, 任务最多让位给使用已加载模型的任务的秒数, 0表示按提交顺序执行",
+        60,
+        options=[
+            0,
+            30,
+            60,
+            120,
+        ],
+    ),
+    "Cloud_Overflow_Enable": GsBoolConfig(
+        "启用云端溢出",
+        "本地ComfyUI繁忙或熔断时, 将同一工作流提交到RunningHub ComfyUI代理(需要配置RunningHub API Key, 按时长计费)",
+        False,
+    ),
+    "Cloud_Overflow_Queue": GsIntConfig(
+        "云端溢出排队阈值",
+        "本地等待中的ComfyUI任务数达到该值时, 新任务溢出到云端, 0表示不按排队数判断",
+        3,
+        options=[
+            0,
+            2,
+            3,
+            5,
+        ],
+    ),
+    "Cloud_Overflow_Wait_Seconds": GsIntConfig(
+        "云端溢出等待阈值",
+        "新任务在本地的预计等待秒数超出该值时溢出到云端, 0表示不按等待时间判断",
+        180,
+        options=[
+            0,
+            60,
+            180,
+            600,
+        ],
+    ),
+    "Hedge_Enable": GsBoolConfig(
+        "对冲请求",
+        "文生图主模型超过其p95耗时仍未返回时, 向其他后端的模型再发一次请求, 取先返回的结果并取消另一个",
+        False,
+    ),
+    "Hedge_Budget_Per_Hour": GsIntConfig(
+        "对冲成本预算",
+        "每小时对冲请求允许产生的额外调用成本(按模型成本计, 自有ComfyUI为0)",
+        20,
+        options=[
+            0,
+            10,
+            20,
+            50,
+        ],
+    ),
 }
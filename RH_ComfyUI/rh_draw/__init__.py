@@ -1,9 +1,16 @@
+import re
+from typing import Any, List, Tuple
+
 from gsuid_core.sv import SV
 from gsuid_core.bot import Bot
+from gsuid_core.logger import logger
 from gsuid_core.models import Event
+from gsuid_core.segment import MessageSegment
 from gsuid_core.utils.image.convert import convert_img
 
-from ..utils.wrapper import check_point, gen_image_by_img, gen_image_by_text, gen_edit_img_by_img
+from ..utils.wrapper import check_point, gen_images_by_img, gen_images_by_text, gen_edit_imgs_by_img
+from ..utils.progress import progress_reporter
+from ..utils.model_registry import refund_point, is_failed_result
 from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
 
 Draw_Point: int = RHCOMFYUI_CONFIG.get_config("Draw_Point").data
@@ -11,32 +18,74 @@ Edit_Image_Point: int = RHCOMFYUI_CONFIG.get_config("Edit_Image_Point").data
 
 sv_draw = SV("AI绘图")
 
+# 提示词中的 `4张`，表示一次生成多张
+BATCH_PATTERN = re.compile(r"(?:^|\s)(\d{1,2})\s*张(?=\s|$)")
+
+
+def parse_batch(text: str) -> Tuple[str, int]:
+    """从提示词中解析生成张数，返回 (去掉张数后的提示词, 张数)"""
+    match = BATCH_PATTERN.search(text)
+    if not match:
+        return text.strip(), 1
+
+    max_batch: int = RHCOMFYUI_CONFIG.get_config("Max_Batch_Size").data
+    batch = min(max(int(match.group(1)), 1), max(max_batch, 1))
+    prompt = (text[: match.start()] + " " + text[match.end() :]).strip()
+    return prompt, batch
+
+
+async def send_images(bot: Bot, ev: Event, result: Any, batch: int, point: int):
+    """
+    将一张或多张图片合并为一条消息发送，RunningHub 返回的 URL 直接发送
+
+    积分按张预先扣除，实际生成的张数不足时退还差额
+    """
+    results: List = result if isinstance(result, list) else [result]
+    images = [image for image in results if not is_failed_result(image) and image != "FAILED"]
+    missing = max(batch - len(images), 0)
+    if missing:
+        now_point = await refund_point(ev, missing * point)
+        refund_msg = f"已退还{missing * point}积分\n📋 当前积分: {now_point}"
+        if not images:
+            return await bot.send(f"❌ 图片生成失败！{refund_msg}")
+        await bot.send(f"✅ 图片生成完成！共 {len(images)}/{batch} 张，未生成的 {missing} 张{refund_msg}")
+    else:
+        await bot.send(f"✅ 图片生成完成！共 {len(images)} 张")
+    return await bot.send(
+        [MessageSegment.image(image if isinstance(image, str) else await convert_img(image)) for image in images]
+    )
+
 
 @sv_draw.on_command(("生图",), block=True)
 async def draw_img(bot: Bot, ev: Event):
-    prompt = ev.text.strip()
+    prompt, batch = parse_batch(ev.text)
 
     if not prompt:
         return await bot.send("你需要在命令后面加入你要绘图的prompt！")
 
-    # 确认积分
-    success, msg = await check_point(ev, Draw_Point)
+    # 确认积分，按张扣除
+    success, msg = await check_point(ev, Draw_Point * batch, "image2image" if ev.image_id else "text2image")
     if not success:
         return await bot.send(msg)
     else:
         await bot.send(msg)
-        if ev.image_id:
-            image = await gen_image_by_img(prompt, ev.image_id)
-        else:
-            image = await gen_image_by_text(prompt)
+        try:
+            # 支持流式响应的模型在生成期间发送进度消息
+            with progress_reporter(lambda text: bot.send(f"⏳ {text}")):
+                if ev.image_id:
+                    result = await gen_images_by_img(prompt, ev.image_id, batch, ev=ev)
+                else:
+                    result = await gen_images_by_text(prompt, batch, ev=ev)
+        except Exception as e:
+            logger.error(f"[RHComfyUI] 生图失败: {e}")
+            result = None
 
-        await bot.send("✅ 图片生成完成！")
-        return await bot.send(await convert_img(image))
+        return await send_images(bot, ev, result, batch, Draw_Point)
 
 
 @sv_draw.on_command(("编辑图片", "图片编辑"), block=True)
 async def edit_img_by_img(bot: Bot, ev: Event):
-    prompt = ev.text.strip()
+    prompt, batch = parse_batch(ev.text)
 
     if not prompt:
         return await bot.send("你需要在命令后面加入你要绘图的prompt！")
@@ -44,13 +93,16 @@ async def edit_img_by_img(bot: Bot, ev: Event):
     if not ev.image_id_list:
         return await bot.send("编辑图片需要在命令后面加入至少一张图片！")
 
-    # 确认积分
-    success, msg = await check_point(ev, Edit_Image_Point)
+    # 确认积分，按张扣除
+    success, msg = await check_point(ev, Edit_Image_Point * batch, "image_edit")
     if not success:
         return await bot.send(msg)
     else:
         await bot.send(msg)
-        image = await gen_edit_img_by_img(prompt, ev.image_id_list)
+        try:
+            result = await gen_edit_imgs_by_img(prompt, ev.image_id_list, batch, ev=ev)
+        except Exception as e:
+            logger.error(f"[RHComfyUI] 编辑图片失败: {e}")
+            result = None
 
-        await bot.send("✅ 图片生成完成！")
-        return await bot.send(await convert_img(image))
+        return await send_images(bot, ev, result, batch, Edit_Image_Point)
@@ -0,0 +1,37 @@
+"""RH_ComfyUI 性能指标模块.
+
+提供两种查看方式:
+- HTTP 文本接口 /rhcomfyui/metrics (Prometheus 格式, 可直接被抓取)
+- 管理员命令 性能指标
+"""
+
+from fastapi.responses import PlainTextResponse
+
+from gsuid_core.sv import SV
+from gsuid_core.bot import Bot
+from gsuid_core.models import Event
+from gsuid_core.web_app import app
+
+from ..utils.metrics import REGISTRY, render_summary
+
+sv_status = SV("性能指标", pm=0)
+
+
+@app.get("/rhcomfyui/metrics")
+async def get_rh_metrics() -> PlainTextResponse:
+    """Prometheus 文本格式的指标接口."""
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@sv_status.on_command(("性能指标", "查看性能指标"), block=True)
+async def send_rh_metrics(bot: Bot, ev: Event) -> None:
+    """管理员查看性能指标摘要.
+
+    Args:
+        bot: Bot 实例
+        ev: Event 实例
+    """
+    await bot.send(render_summary())
@@ -18,16 +18,16 @@ async def _(bot: Bot, ev: Event):
         return await bot.send("你需要在命令后面加入你要生成的视频文本！")
 
     # 确认积分
-    success, msg = await check_point(ev, Video_Point)
+    success, msg = await check_point(ev, Video_Point, "image2video" if ev.image_id else "text2video")
     if not success:
         return await bot.send(msg)
     else:
         await bot.send(msg)
 
         if ev.image_id:
-            video = await gen_video_by_img(prompt, ev.image_id)
+            video = await gen_video_by_img(prompt, ev.image_id, ev=ev)
         else:
-            video = await gen_video_by_text(prompt)
+            video = await gen_video_by_text(prompt, ev=ev)
 
         if video is None:
             return await bot.send("❌ 视频生成失败！请检查prompt是否正确！")
@@ -0,0 +1,33 @@
+"""RH_ComfyUI RunningHub 回调模块.
+
+在 gsuid_core 的 Web 服务上挂载 /rhcomfyui/rh_webhook,
+RunningHub 任务结束后回调此接口, 唤醒等待该任务的请求.
+"""
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from gsuid_core.web_app import app
+
+from ..utils.RH.rh_webhook import WEBHOOK_PATH, verify_token, handle_callback
+
+
+@app.post(WEBHOOK_PATH)
+async def receive_rh_webhook(request: Request, token: str = "") -> JSONResponse:
+    """接收 RunningHub 任务完成回调.
+
+    Args:
+        request: 回调请求, body 为 RunningHub 的 TASK_END 事件
+        token: 回调地址中携带的校验 token
+    """
+    if not verify_token(token):
+        return JSONResponse({"code": 403, "msg": "invalid token"}, status_code=403)
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        return JSONResponse({"code": 400, "msg": "invalid json"}, status_code=400)
+
+    # 非任务结束事件同样返回成功，避免 RunningHub 重复回调
+    handle_callback(payload)
+    return JSONResponse({"code": 0, "msg": "success"})
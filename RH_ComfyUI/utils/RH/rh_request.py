@@ -1,8 +1,10 @@
 import io
+import time
 import uuid
 import asyncio
-from typing import Dict, List, Union, Literal, Optional
+from typing import Dict, List, Union, Literal, Callable, Optional
 from pathlib import Path
+from contextlib import AsyncExitStack
 
 import aiohttp
 from PIL import Image
@@ -10,9 +12,22 @@ from aiohttp import FormData
 
 from gsuid_core.logger import logger
 
+from . import rh_webhook
+from ..metrics import (
+    RH_RETRIES,
+    RH_QUEUE_WAIT,
+    RH_COMPLETIONS,
+    UPLOAD_SECONDS,
+    RH_RATE_LIMITED,
+    DOWNLOAD_SECONDS,
+    record_transfer,
+)
+from ..tracing import span
+from ..key_pool import rh_keys
+from ..rate_limiter import rate_limiter
+from ..backend_health import backend_health
 from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
 
-API_KEY: str = RHCOMFYUI_CONFIG.get_config("RH_apikey").data
 BASE_URL = "https://www.runninghub.cn"
 
 UPLOAD_URL = f"{BASE_URL}/task/openapi/upload"
@@ -20,8 +35,6 @@ APP_URL = f"{BASE_URL}/task/openapi/ai-app/run"
 STATUS_URL = f"{BASE_URL}/task/openapi/status"
 OUTPUT_URL = f"{BASE_URL}/task/openapi/outputs"
 
-QUEUE = {}
-
 
 async def download_image_from_url(
     url: str,
@@ -30,10 +43,13 @@ async def download_image_from_url(
     for _ in range(3):
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return resp.status
-                    return Image.open(io.BytesIO(await resp.read()))
+                with DOWNLOAD_SECONDS.time(backend="runninghub"), span("rh.download"):
+                    async with session.get(url) as resp:
+                        if resp.status != 200:
+                            return resp.status
+                        content = await resp.read()
+                record_transfer("runninghub", "download", len(content))
+                return Image.open(io.BytesIO(content))
         except Exception as e:
             logger.warning(f"[RH] 下载图片失败: {e}")
             continue
@@ -47,10 +63,13 @@ async def download_video_from_url(
     for _ in range(3):
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        return resp.status
-                    return await resp.read()
+                with DOWNLOAD_SECONDS.time(backend="runninghub"), span("rh.download"):
+                    async with session.get(url) as resp:
+                        if resp.status != 200:
+                            return resp.status
+                        content = await resp.read()
+                record_transfer("runninghub", "download", len(content))
+                return content
         except Exception as e:
             logger.warning(f"[RH] 下载视频失败: {e}")
             continue
@@ -60,19 +79,21 @@ async def download_video_from_url(
 async def _base_rh_requst(
     method: Literal["POST", "GET"],
     url: str,
-    data: Optional[FormData] = None,
+    form: Optional[Callable[[], FormData]] = None,
     json: Dict = {},
+    api_key: str = "",
 ) -> Union[Dict, int]:
     logger.info(f"[RH] 请求: {method} {url}")
 
     params: dict = {}
 
     if json:
-        json["apiKey"] = API_KEY
-        params["json"] = json
+        params["json"] = {**json, "apiKey": api_key}
 
-    if data:
-        data.add_field("apiKey", API_KEY)
+    if form:
+        # FormData 只能发送一次，每次请求重新构造并带上本次使用的 Key
+        data = form()
+        data.add_field("apiKey", api_key)
         params = {"data": data}
 
     async with aiohttp.ClientSession() as session:
@@ -92,63 +113,69 @@ async def _base_rh_requst(
 async def _rh_request(
     method: Literal["POST", "GET"],
     url: str,
-    data: Optional[FormData] = None,
+    form: Optional[Callable[[], FormData]] = None,
     json: Dict = {},
 ) -> Union[Dict, int]:
     fail_count = 0  # 用于记录非421错误的失败次数
     max_retries = 3  # 最大重试次数
 
+    if not backend_health.allow_request("runninghub"):
+        logger.warning("[RH] 后端已熔断或正在试探恢复，直接返回失败")
+        return 503
+
     while fail_count < max_retries:
         try:
-            resp = await _base_rh_requst(method, url, data, json)
+            api_key = rh_keys.current()
+            if api_key is None:
+                logger.warning("[RH] 没有可用的API Key，将无法请求！")
+                return 401
+
+            await rate_limiter.acquire("runninghub", api_key)
+            resp = await _base_rh_requst(method, url, form, json, api_key)
 
             if isinstance(resp, int):
+                rh_keys.record(api_key, resp)
+                # 421 时暂停该 Key 的令牌桶，下一轮在 acquire 中等待放行或换用其他 Key
                 if resp == 421:
-                    logger.info("[RH] 请求过于频繁(421)，等待180秒后继续尝试...")
-                    await asyncio.sleep(180)
+                    RH_RATE_LIMITED.inc()
+                    RH_RETRIES.inc(reason="421")
+                    rate_limiter.throttled("runninghub", api_key)
                     continue
 
                 fail_count += 1
+                RH_RETRIES.inc(reason="error_code")
                 continue
+            rh_keys.record(api_key, "ok")
+            rate_limiter.succeeded("runninghub", api_key)
             return resp
 
         except Exception as e:
             logger.warning(f"[RH] 请求失败: {e}")
             fail_count += 1
+            RH_RETRIES.inc(reason="exception")
             continue
 
     return 500
 
 
-def is_run_task():
-    now_task = 0
-    for i in QUEUE:
-        if QUEUE[i] == "RUNNING":
-            now_task += 1
-
-    if now_task >= 1:
-        return True
-
-    return False
-
-
-async def submit_task(webappId: str, nodeInfoList: List[Dict]) -> Union[str, int]:
-    while is_run_task():
-        logger.info("[RH] 任务正在运行，等待...")
-        await asyncio.sleep(50)
-
+async def submit_task(
+    webappId: str,
+    nodeInfoList: List[Dict],
+    webhookUrl: str = "",
+) -> Union[str, int]:
     logger.info(f"[RH] 提交任务: {webappId}")
 
     data: Dict = {"nodeInfoList": nodeInfoList}
     data["webappId"] = webappId
+    if webhookUrl:
+        data["webhookUrl"] = webhookUrl
 
-    resp = await _rh_request("POST", APP_URL, json=data)
+    with span("rh.submit", webappId=webappId):
+        resp = await _rh_request("POST", APP_URL, json=data)
     if isinstance(resp, int):
         return resp
 
-    task_id = str(resp["taskId"])
-    QUEUE[webappId] = "RUNNING"
-    return task_id
+    return str(resp["taskId"])
 
 
 async def get_task_status(
@@ -187,8 +214,6 @@ async def upload_file(
     elif isinstance(file, Path):
         file = file.read_bytes()
 
-    data = FormData()
-
     if fileType == "image":
         content_type = "image/png"
         suffix = ".png"
@@ -199,31 +224,85 @@ async def upload_file(
         content_type = "video/mp4"
         suffix = ".mp4"
 
-    data.add_field(
-        "file",
-        file,
-        filename=f"{uuid.uuid4().hex}{suffix}",
-        content_type=content_type,
-    )
-    data.add_field("fileType", fileType)
+    filename = f"{uuid.uuid4().hex}{suffix}"
+
+    def build_form() -> FormData:
+        data = FormData()
+        data.add_field("file", file, filename=filename, content_type=content_type)
+        data.add_field("fileType", fileType)
+        return data
 
-    resp = await _rh_request("POST", UPLOAD_URL, data=data)
+    start = time.perf_counter()
+    with span("rh.upload", fileType=fileType):
+        resp = await _rh_request("POST", UPLOAD_URL, form=build_form)
     if isinstance(resp, int):
         return resp
+
+    UPLOAD_SECONDS.observe(time.perf_counter() - start, backend="runninghub")
+    record_transfer("runninghub", "upload", len(file))
     return resp["fileName"]
 
 
+async def _poll_result(taskId: str) -> Optional[Union[str, int]]:
+    """查询一次任务状态，已结束时返回结果，否则返回 None"""
+    status = await get_task_status(taskId)
+    if status == "SUCCESS":
+        return await get_task_result(taskId)
+    elif status == "FAILED":
+        return status
+    return None
+
+
+async def wait_task_result(taskId: str) -> Union[str, int]:
+    """
+    等待任务结果
+
+    配置了回调地址时等待回调，每隔 RH_Webhook_Poll_Seconds 才兜底查询一次状态；
+    否则每 3 秒轮询一次
+    """
+    if not rh_webhook.webhook_url():
+        while True:
+            result = await _poll_result(taskId)
+            if result is not None:
+                RH_COMPLETIONS.inc(source="poll")
+                return result
+            await asyncio.sleep(3)
+
+    interval = max(int(RHCOMFYUI_CONFIG.get_config("RH_Webhook_Poll_Seconds").data), 5)
+    future = rh_webhook.expect(taskId)
+    try:
+        while True:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=interval)
+                RH_COMPLETIONS.inc(source="webhook")
+                return result
+            except asyncio.TimeoutError:
+                result = await _poll_result(taskId)
+                if result is not None:
+                    logger.info(f"[RH] 任务 {taskId} 未收到回调，已通过轮询获取结果")
+                    RH_COMPLETIONS.inc(source="poll")
+                    return result
+    finally:
+        rh_webhook.discard(taskId)
+
+
 async def get_aiapp_result(webappId: str, nodeInfoList: List[Dict]) -> Union[str, int]:
-    reply = await submit_task(webappId, nodeInfoList)
-    if isinstance(reply, int):
-        return reply
-
-    while True:
-        status = await get_task_status(reply)
-        if status == "SUCCESS":
-            QUEUE[webappId] = "SUCCESS"
-            return await get_task_result(reply)
-        elif status == "FAILED":
-            QUEUE[webappId] = "FAILED"
-            return status
-        await asyncio.sleep(3)
+    """
+    运行一次 AI 应用任务
+
+    同时运行的任务数受 RunningHub 账号并发限制，任务在 Key 池中占用一个 Key 的名额，
+    提交与查询都使用该 Key
+    """
+    async with AsyncExitStack() as stack:
+        with RH_QUEUE_WAIT.time(), span("rh.queue_wait"):
+            api_key = await stack.enter_async_context(rh_keys.slot())
+        if api_key is None:
+            logger.warning("[RH] 没有可用的API Key，将无法请求！")
+            return 401
+
+        reply = await submit_task(webappId, nodeInfoList, rh_webhook.webhook_url())
+        if isinstance(reply, int):
+            return reply
+
+        with span("rh.poll", taskId=reply):
+            return await wait_task_result(reply)
@@ -0,0 +1,114 @@
+"""
+RunningHub 任务完成回调
+提交任务时附带 webhookUrl，RunningHub 在任务结束后 POST 到 gsuid_core 上的回调接口，
+get_aiapp_result 等待以 taskId 为键的 Future，未收到回调时才退回低频轮询
+"""
+
+import hmac
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, Tuple, Union, Optional
+from collections import OrderedDict
+
+from gsuid_core.logger import logger
+
+from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+WEBHOOK_PATH = "/rhcomfyui/rh_webhook"
+
+# 每次启动随机生成，回调地址中携带以拒绝伪造的回调
+WEBHOOK_TOKEN = uuid.uuid4().hex
+
+# 先于等待方到达的回调结果保留的秒数与数量
+_EARLY_TTL = 600
+_EARLY_MAX = 256
+
+TaskResult = Union[str, int]
+
+_waiters: Dict[str, asyncio.Future] = {}
+_early: "OrderedDict[str, Tuple[float, TaskResult]]" = OrderedDict()
+
+
+def webhook_url() -> str:
+    """完整的回调地址，未配置 RH_Webhook_URL 时返回空字符串"""
+    base = str(RHCOMFYUI_CONFIG.get_config("RH_Webhook_URL").data).strip().rstrip("/")
+    if not base:
+        return ""
+    return f"{base}{WEBHOOK_PATH}?token={WEBHOOK_TOKEN}"
+
+
+def expect(task_id: str) -> asyncio.Future:
+    """登记等待某个任务的回调，回调已先到达时直接返回已完成的 Future"""
+    future = asyncio.get_running_loop().create_future()
+    early = _early.pop(task_id, None)
+    if early is not None and time.monotonic() - early[0] < _EARLY_TTL:
+        future.set_result(early[1])
+    else:
+        _waiters[task_id] = future
+    return future
+
+
+def discard(task_id: str) -> None:
+    _waiters.pop(task_id, None)
+
+
+def parse_callback(payload: Dict[str, Any]) -> Optional[Tuple[str, TaskResult]]:
+    """
+    解析回调内容，返回 (taskId, fileUrl 或错误码)
+
+    eventData 为 JSON 字符串，结构与 /task/openapi/outputs 的响应相同
+    """
+    task_id = str(payload.get("taskId", ""))
+    if not task_id or payload.get("event") != "TASK_END":
+        return None
+
+    event_data = payload.get("eventData") or {}
+    if isinstance(event_data, str):
+        try:
+            event_data = json.loads(event_data)
+        except ValueError:
+            return task_id, 500
+    # 回调内容来自外部请求，结构不符时按失败处理，不向回调接口抛出异常
+    if not isinstance(event_data, dict):
+        return task_id, 500
+
+    try:
+        code = int(event_data.get("code"))
+    except (TypeError, ValueError):
+        return task_id, 500
+    if code != 0:
+        return task_id, code
+    outputs = event_data.get("data")
+    if not isinstance(outputs, list) or not outputs or not isinstance(outputs[0], dict):
+        return task_id, 500
+    file_url = outputs[0].get("fileUrl")
+    if not file_url:
+        return task_id, 500
+    return task_id, str(file_url)
+
+
+def verify_token(token: str) -> bool:
+    return hmac.compare_digest(token, WEBHOOK_TOKEN)
+
+
+def handle_callback(payload: Dict[str, Any]) -> bool:
+    """处理一次回调，返回是否为任务结束事件"""
+    parsed = parse_callback(payload)
+    if parsed is None:
+        return False
+
+    task_id, result = parsed
+    logger.info(f"[RH] 收到任务回调: {task_id}")
+    future = _waiters.pop(task_id, None)
+    if future is not None:
+        if not future.done():
+            future.set_result(result)
+        return True
+
+    # 回调先于提交方登记到达
+    _early[task_id] = (time.monotonic(), result)
+    while len(_early) > _EARLY_MAX:
+        _early.popitem(last=False)
+    return True
@@ -0,0 +1,91 @@
+"""
+准入控制
+扣除积分前根据插件调度队列、后端实时排队深度与各模型历史耗时估算完成时间，
+超出 SLA 时延后等待或直接拒绝（不扣积分），准入时告知用户排队位置与预计等待时间
+"""
+
+import time
+import asyncio
+from typing import Optional
+from dataclasses import dataclass
+
+from gsuid_core.logger import logger
+
+from .model_router import model_router
+from .fair_scheduler import fair_scheduler
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 延后等待时重新估算的间隔
+DEFER_POLL_SECONDS = 10
+
+
+@dataclass
+class AdmissionResult:
+    admitted: bool
+    model: Optional[str] = None
+    position: int = 0  # 前方任务数
+    eta: float = 0  # 预计完成秒数
+    reason: str = ""
+
+
+def _config_int(key: str) -> int:
+    try:
+        return int(RHCOMFYUI_CONFIG.get_config(key).data)
+    except Exception:
+        return 0
+
+
+def format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{max(seconds, 1)}秒"
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes}分{seconds}秒" if seconds else f"{minutes}分钟"
+
+
+async def estimate(category: str) -> AdmissionResult:
+    """按该类别可用模型中预计最快完成的一个估算排队位置与完成时间"""
+    from .model_registry import MODEL_REGISTRY, get_available_models
+
+    names = get_available_models(category)
+    if not names:
+        return AdmissionResult(admitted=False, reason="当前没有可用的模型")
+
+    # 插件内同类别排队的任务尚未提交到后端，一并计入排队深度
+    local = fair_scheduler.waiting_in(category)
+    best = AdmissionResult(admitted=True)
+    for name in names:
+        info = MODEL_REGISTRY[name]
+        depth = await model_router.backend_queue_depth(info.backend) + local
+        eta = model_router.expected_seconds(info, depth)
+        if best.model is None or eta < best.eta:
+            best = AdmissionResult(admitted=True, model=name, position=depth, eta=eta)
+    return best
+
+
+async def admit(category: str) -> AdmissionResult:
+    """
+    准入检查
+
+    预计完成时间超出 Admission_SLA_Seconds 时，最多延后等待 Admission_Defer_Seconds
+    让队列消化，仍超出则拒绝
+    """
+    result = await estimate(category)
+    sla = _config_int("Admission_SLA_Seconds")
+    if not result.admitted or sla <= 0 or result.eta <= sla:
+        return result
+
+    deadline = time.monotonic() + _config_int("Admission_Defer_Seconds")
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(DEFER_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+        result = await estimate(category)
+        if not result.admitted or result.eta <= sla:
+            return result
+
+    logger.info(f"[RHComfyUI][Admission] {category} 预计 {result.eta:.0f}s 超出 SLA {sla}s，拒绝")
+    result.admitted = False
+    result.reason = (
+        f"当前排队任务较多（前方 {result.position} 个），预计需要{format_seconds(result.eta)}，"
+        f"超出{format_seconds(sla)}的上限"
+    )
+    return result
@@ -0,0 +1,351 @@
+"""
+后端健康检查模块
+为 ComfyUI / BLT / RunningHub 各维护一个熔断器:
+- 被动: 模型调用连续失败 N 次后熔断 (OPEN)
+- 主动: 后台定时探测各后端，熔断恢复期过后进入半开 (HALF_OPEN) 并放行一次探测
+半开期间各后端的请求入口通过 allow_request 只放行一个试探调用，其余请求直接失败且不计入熔断；
+试探调用进行中该后端视为不可用，新请求直接选择其他模型
+熔断状态通过 ModelAvailabilityChecker 反映到 AvailabilityResult，使请求直接切换到其他模型
+"""
+
+import time
+import asyncio
+from enum import Enum
+from typing import TYPE_CHECKING, Set, Dict, List, Callable, Iterator, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import field, dataclass
+
+from gsuid_core.logger import logger
+from gsuid_core.server import on_core_start
+
+from .metrics import BACKEND_FAILURES, BACKEND_CIRCUIT_STATE
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+_STATE_GAUGE = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2,
+}
+
+
+class CircuitBreaker:
+    """单个后端的熔断器"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.last_error = ""
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._listeners: List[Callable[["CircuitBreaker"], None]] = []
+        BACKEND_CIRCUIT_STATE.set(0, backend=name)
+
+    def add_listener(self, listener: Callable[["CircuitBreaker"], None]) -> None:
+        self._listeners.append(listener)
+
+    def _set_state(self, state: CircuitState) -> None:
+        if state == self._state:
+            return
+        logger.info(f"[RHComfyUI][Health] 后端 {self.name} 熔断状态: {self._state.value} -> {state.value}")
+        self._state = state
+        BACKEND_CIRCUIT_STATE.set(_STATE_GAUGE[state], backend=self.name)
+        self._notify()
+
+    def _notify(self) -> None:
+        """通知监听者熔断状态或试探调用发生变化"""
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.warning(f"[RHComfyUI][Health] 熔断状态回调失败: {e}")
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._set_state(CircuitState.HALF_OPEN)
+        return self._state
+
+    def is_open(self) -> bool:
+        """熔断中（恢复期未过）"""
+        return self.state == CircuitState.OPEN
+
+    def _trial_active(self) -> bool:
+        # 试探调用未记录结果时，超过恢复期后允许新的试探
+        return self._probing and time.monotonic() - self._probe_started < self.recovery_timeout
+
+    def is_blocked(self) -> bool:
+        """熔断中，或半开且试探调用进行中：新请求会被拒绝，应选择其他模型"""
+        state = self.state
+        return state == CircuitState.OPEN or (state == CircuitState.HALF_OPEN and self._trial_active())
+
+    def allow_request(self) -> bool:
+        """是否放行一次请求，半开状态下同一时间只放行一个探测请求"""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._trial_active():
+            self._probing = True
+            self._probe_started = time.monotonic()
+            self._notify()
+            # 试探超时后主动通知，使可用性缓存重新放行该后端
+            self._call_later(self.recovery_timeout, self._notify)
+            return True
+        return False
+
+    def end_trial(self) -> None:
+        """试探调用结束但未记录结果（被取消等），允许新的试探"""
+        if self._probing:
+            self._probing = False
+            self._notify()
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        self._set_state(CircuitState.CLOSED)
+
+    def record_failure(self, reason: str = "", source: str = "passive") -> None:
+        self.failures += 1
+        self.last_error = reason
+        self._probing = False
+        BACKEND_FAILURES.inc(backend=self.name, source=source)
+
+        if self._state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.OPEN)
+            # 恢复期结束时主动读取一次状态，触发 OPEN -> HALF_OPEN 并通知监听者
+            self._call_later(self.recovery_timeout, lambda: self.state)
+
+    @staticmethod
+    def _call_later(delay: float, callback: Callable[[], object]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.call_later(delay, callback)
+
+
+class BackendHealth:
+    """所有后端的熔断器与主动健康检查"""
+
+    BACKENDS = ("comfyui", "blt", "runninghub")
+
+    def __init__(self):
+        threshold = self._int_config("Circuit_Failure_Threshold", 3)
+        recovery = self._int_config("Circuit_Recovery_Seconds", 60)
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name, threshold, recovery) for name in self.BACKENDS
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _int_config(key: str, default: int) -> int:
+        try:
+            return int(RHCOMFYUI_CONFIG.get_config(key).data)
+        except Exception:
+            return default
+
+    def get(self, backend: str) -> Optional[CircuitBreaker]:
+        return self.breakers.get(backend)
+
+    def is_open(self, backend: str) -> bool:
+        breaker = self.breakers.get(backend)
+        return breaker.is_open() if breaker else False
+
+    def is_blocked(self, backend: str) -> bool:
+        breaker = self.breakers.get(backend)
+        return breaker.is_blocked() if breaker else False
+
+    def end_trial(self, backend: str) -> None:
+        breaker = self.breakers.get(backend)
+        if breaker is not None:
+            breaker.end_trial()
+
+    def allow_request(self, backend: str) -> bool:
+        """
+        后端请求入口的熔断检查：熔断中拒绝，半开时只放行一个试探调用
+
+        试探调用在同一次模型调用内的后续请求（上传、提交、轮询）继续放行；
+        被拒绝的调用记录在 BackendTrace 中，run_model 不将其计入熔断与路由统计
+        """
+        breaker = self.breakers.get(backend)
+        if breaker is None:
+            return True
+        trace = _trace.get()
+        if trace is not None and backend in trace.trial and breaker.state == CircuitState.HALF_OPEN:
+            return True
+        if breaker.allow_request():
+            if trace is not None and breaker.state == CircuitState.HALF_OPEN:
+                trace.trial.add(backend)
+            return True
+        if trace is not None:
+            trace.rejected = True
+        return False
+
+    def record(self, backend: str, success: bool, reason: str = "") -> None:
+        """记录一次被动观测到的调用结果"""
+        breaker = self.breakers.get(backend)
+        if breaker is None:
+            return
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure(reason)
+
+    def add_listener(self, listener: Callable[[CircuitBreaker], None]) -> None:
+        for breaker in self.breakers.values():
+            breaker.add_listener(listener)
+
+    # ===== 主动探测 =====
+    async def _probe_comfyui(self, session: "aiohttp.ClientSession") -> Optional[str]:
+        from .comfyui.comfyui_api import get_api
+
+        async with session.get(f"{get_api().url}/system_stats") as resp:
+            if resp.status != 200:
+                return f"HTTP {resp.status}"
+        return None
+
+    async def _probe_blt(self, session: "aiohttp.ClientSession") -> Optional[str]:
+        from .blt import blt_request
+        from .key_pool import blt_keys
+
+        headers = {"Authorization": f"Bearer {blt_keys.primary()}"}
+        async with session.get(f"{blt_request.BASE_URL}/v1/models", headers=headers) as resp:
+            if resp.status in (401, 402, 403):
+                return f"HTTP {resp.status}"
+            if resp.status >= 500:
+                return f"HTTP {resp.status}"
+        return None
+
+    async def _probe_runninghub(self, session: "aiohttp.ClientSession") -> Optional[str]:
+        from .RH import rh_request
+        from .key_pool import rh_keys
+
+        url = f"{rh_request.BASE_URL}/uc/openapi/accountStatus"
+        async with session.post(url, json={"apikey": rh_keys.primary()}) as resp:
+            if resp.status != 200:
+                return f"HTTP {resp.status}"
+            data = await resp.json(content_type=None)
+            if data.get("code") != 0:
+                return f"code {data.get('code')}: {data.get('msg')}"
+        return None
+
+    def _is_configured(self, backend: str) -> bool:
+        keys = {
+            "comfyui": "ComfyUI_BaseURL",
+            "blt": "BLT_apikey",
+            "runninghub": "RH_apikey",
+        }
+        try:
+            value = str(RHCOMFYUI_CONFIG.get_config(keys[backend]).data).strip()
+        except Exception:
+            return False
+        return bool(value) and value != "127.0.0.1:8188"
+
+    async def probe(self, backend: str) -> bool:
+        """主动探测一个后端，并据此更新熔断器"""
+        breaker = self.breakers[backend]
+        if breaker.state == CircuitState.OPEN:
+            # 恢复期内不探测，避免对已故障后端持续施压
+            return False
+
+        probes = {
+            "comfyui": self._probe_comfyui,
+            "blt": self._probe_blt,
+            "runninghub": self._probe_runninghub,
+        }
+        import aiohttp
+
+        try:
+            timeout = aiohttp.ClientTimeout(total=10)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                error = await probes[backend](session)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            breaker.record_success()
+            return True
+
+        logger.warning(f"[RHComfyUI][Health] 后端 {backend} 健康检查失败: {error}")
+        breaker.record_failure(error, source="probe")
+        return False
+
+    async def run_forever(self) -> None:
+        """后台定时探测所有已配置的后端"""
+        while True:
+            interval = self._int_config("Health_Check_Interval", 60)
+            if interval <= 0:
+                return
+            for backend in self.BACKENDS:
+                if self._is_configured(backend):
+                    await self.probe(backend)
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+
+# 全局健康状态实例
+backend_health = BackendHealth()
+
+
+@dataclass
+class BackendTrace:
+    """一次模型调用与后端熔断相关的记录，子任务共享同一对象"""
+
+    served: List[str] = field(default_factory=list)  # 实际完成调用的后端（如 ComfyUI 任务溢出到 RunningHub 代理）
+    trial: Set[str] = field(default_factory=set)  # 本次调用作为半开试探放行的后端
+    rejected: bool = False  # 被熔断器拒绝，未实际发出请求
+
+
+_trace: ContextVar[Optional[BackendTrace]] = ContextVar("rh_backend_trace", default=None)
+
+
+@contextmanager
+def track_backend() -> Iterator[BackendTrace]:
+    """收集调用期间的实际后端、试探放行与熔断拒绝"""
+    trace = BackendTrace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def mark_backend(backend: str) -> None:
+    """记录当前模型调用改由 backend 完成，run_model 据此记录熔断与路由统计"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.served.append(backend)
+
+
+def merge_backend(other: BackendTrace) -> None:
+    """将代为执行的子任务（如微批合并提交）的后端记录合并到当前模型调用"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.served.extend(other.served)
+        trace.trial |= other.trial
+        trace.rejected = trace.rejected or other.rejected
+
+
+@on_core_start
+async def start_backend_health_check():
+    backend_health.start()
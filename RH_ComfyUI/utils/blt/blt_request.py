@@ -5,22 +5,70 @@ BLT 通用请求模块
 
 import io
 import re
+import time
 import base64
 import asyncio
-from typing import Any, Dict, List, Union, Literal, Optional
+from json import loads as json_loads
+from typing import Any, Set, Dict, List, Tuple, Union, Literal, Callable, Optional, Awaitable
 
 import aiohttp
 from PIL import Image
 
 from gsuid_core.logger import logger
 
+from ..metrics import BLT_RESPONSES, BLT_FIRST_BYTE, DOWNLOAD_SECONDS, BLT_RESPONSE_FORMATS, record_transfer
+from ..tracing import span
+from ..constant import BLT_EDIT_MAX_SIDE, BLT_RESPONSE_FORMAT, BLT_EDIT_DEFAULT_MAX_SIDE
+from ..key_pool import blt_keys
+from ..rate_limiter import rate_limiter
+from ..backend_health import backend_health
 from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
 
-# 从配置获取
-API_KEY: str = RHCOMFYUI_CONFIG.get_config("BLT_apikey").data
+# 从配置获取，API Key 由 Key 池管理
 BASE_URL: str = RHCOMFYUI_CONFIG.get_config("BLT_API_URL").data
 CHAT_COMPLETIONS_URL = f"{BASE_URL}/v1/chat/completions"
 IMAGES_GENERATIONS_URL = f"{BASE_URL}/v1/images/generations"
+IMAGES_EDITS_URL = f"{BASE_URL}/v1/images/edits"
+
+# 请求参数错误 / 鉴权失败 / 余额不足 / 接口不存在 / 返回格式不支持，重试不会成功
+NON_RETRYABLE_STATUS = (400, 401, 402, 403, 404, 405, 415, 422)
+
+# 服务端没有 /v1/images/edits 接口时返回的状态码
+UNSUPPORTED_ENDPOINT_STATUS = (404, 405)
+
+# 运行中发现不支持 /v1/images/edits 的模型，改用 base64 JSON 请求
+_json_edit_models: Set[str] = set()
+
+# 服务端以 400/422 拒绝 response_format 时，_base_request 返回 415，
+# 以区别于提示词、内容审核等其他参数错误（这些错误换格式重发同样会失败且可能重复计费）
+FORMAT_ERROR_STATUS = (400, 422)
+FORMAT_REJECTED_STATUS = 415
+FORMAT_ERROR_KEYWORDS = ("response_format", "b64_json")
+
+# 超过该大小的响应（通常内联了 b64_json 图片）在线程中解析 JSON
+LARGE_RESPONSE_BYTES = 256 * 1024
+
+# base64 分块解码的块大小，需为 4 的倍数；块越小解码线程越频繁让出 GIL，事件循环延迟越低
+B64_CHUNK_CHARS = 4 * 16 * 1024
+
+# 运行中发现不支持 b64_json 的模型
+_url_only_models: Set[str] = set()
+
+# 请求过于频繁
+RATE_LIMITED_STATUS = (421, 429)
+
+# 流式响应的进度回调，参数为一行进度文本（如 "进度 35%"）
+StreamProgress = Callable[[str], Awaitable[None]]
+
+# 流式内容中超过该长度的行视为图片数据，不作为进度回调
+PROGRESS_LINE_MAX = 200
+
+# 从模型返回的文本中提取图片：Markdown 图片 > data URL > 裸 URL，均取最后一个
+IMAGE_REF_PATTERNS = (
+    re.compile(r"!\[[^\]]*\]\(\s*([^)\s]+)\s*\)"),
+    re.compile(r"data:image/[a-zA-Z+]+;base64,[A-Za-z0-9+/=]+"),
+    re.compile(r"https?://[^\s)\]\"'<>]+"),
+)
 
 
 async def _base_request(
@@ -29,6 +77,10 @@ async def _base_request(
     headers: Optional[Dict] = None,
     json: Optional[Dict] = None,
     data: Optional[Dict] = None,
+    api_key: str = "",
+    form: Optional[Callable[[], aiohttp.FormData]] = None,
+    stream: bool = False,
+    on_progress: Optional[StreamProgress] = None,
 ) -> Union[Dict, int]:
     """
     基础HTTP请求函数
@@ -39,6 +91,10 @@ async def _base_request(
         headers: 请求头
         json: JSON格式请求体
         data: 表单数据请求体
+        api_key: 本次请求使用的 API Key，被限速时暂停其令牌桶
+        form: 构造 multipart 请求体的函数
+        stream: 按 SSE 读取 chat/completions 的流式响应
+        on_progress: 流式响应的进度回调
 
     Returns:
         响应数据字典 或 错误状态码
@@ -50,16 +106,34 @@ async def _base_request(
         params["json"] = json
     if data:
         params["data"] = data
+    if form:
+        params["data"] = form()
 
     try:
         async with aiohttp.ClientSession() as session:
+            start = time.monotonic()
             async with session.request(method, url, headers=headers, **params) as resp:
                 logger.info(f"[BLT] 响应状态: {resp.status}")
+                BLT_RESPONSES.inc(status=resp.status)
 
+                if resp.status in RATE_LIMITED_STATUS:
+                    rate_limiter.throttled("blt", api_key, resp.headers.get("Retry-After"))
+                if resp.status in FORMAT_ERROR_STATUS and await _rejects_response_format(resp):
+                    return FORMAT_REJECTED_STATUS
                 if resp.status != 200:
                     return resp.status
 
-                resp_data = await resp.json()
+                # 服务端忽略 stream 参数时按普通 JSON 响应解析
+                if stream and resp.content_type == "text/event-stream":
+                    return await _read_sse(resp, start, on_progress)
+                BLT_FIRST_BYTE.observe(time.monotonic() - start, stream="false")
+
+                body = await resp.read()
+                if len(body) > LARGE_RESPONSE_BYTES:
+                    logger.debug(f"[BLT] 响应数据: {len(body)} 字节")
+                    return await asyncio.to_thread(json_loads, body)
+
+                resp_data = json_loads(body)
                 logger.debug(f"[BLT] 响应数据: {resp_data}")
                 return resp_data
 
@@ -68,6 +142,16 @@ async def _base_request(
         return 500
 
 
+async def _rejects_response_format(resp: aiohttp.ClientResponse) -> bool:
+    """错误响应是否指明 response_format / b64_json 不受支持"""
+    try:
+        text = (await resp.text(errors="replace"))[:2000]
+    except Exception:
+        return False
+    logger.warning(f"[BLT] 请求参数错误: {text[:200]}")
+    return any(keyword in text.lower() for keyword in FORMAT_ERROR_KEYWORDS)
+
+
 async def _request(
     method: Literal["POST", "GET"],
     url: str,
@@ -75,6 +159,9 @@ async def _request(
     json: Optional[Dict] = None,
     data: Optional[Dict] = None,
     max_retries: int = 3,
+    form: Optional[Callable[[], aiohttp.FormData]] = None,
+    stream: bool = False,
+    on_progress: Optional[StreamProgress] = None,
 ) -> Union[Dict, int]:
     """
     带重试机制的HTTP请求函数
@@ -86,36 +173,49 @@ async def _request(
         json: JSON格式请求体
         data: 表单数据请求体
         max_retries: 最大重试次数
+        form: 构造 multipart 请求体的函数，FormData 只能发送一次，每次重试重新构造
+        stream: 按 SSE 读取流式响应，中途断开时整体重试
+        on_progress: 流式响应的进度回调
 
     Returns:
         响应数据字典 或 错误状态码 (500表示重试耗尽)
     """
     fail_count = 0
 
+    if not backend_health.allow_request("blt"):
+        logger.warning("[BLT] 后端已熔断或正在试探恢复，直接返回失败")
+        return 503
+
     while fail_count < max_retries:
         try:
-            if not headers:
-                headers = {}
-
-            if API_KEY:
-                headers["Authorization"] = f"Bearer {API_KEY}"
-            else:
-                logger.warning("[BLT] 未配置API_KEY，将无法请求！")
-                return -1
+            async with blt_keys.slot() as api_key:
+                if api_key is None:
+                    logger.warning("[BLT] 未配置API_KEY或全部Key已停用，将无法请求！")
+                    return -1
 
-            resp = await _base_request(method, url, headers, json, data)
+                request_headers = {**(headers or {}), "Authorization": f"Bearer {api_key}"}
+                await rate_limiter.acquire("blt", api_key)
+                resp = await _base_request(method, url, request_headers, json, data, api_key, form, stream, on_progress)
 
             if isinstance(resp, int):
-                # 421表示请求过于频繁，需要等待后重试
-                if resp == 421:
-                    logger.info("[BLT] 请求过于频繁(421)，等待180秒后继续尝试...")
-                    await asyncio.sleep(180)
+                retry_other_key = blt_keys.record(api_key, resp)
+                # 请求过于频繁，令牌桶已按 Retry-After 暂停，下一轮在 acquire 中等待放行或换用其他 Key
+                if resp in RATE_LIMITED_STATUS:
+                    continue
+
+                # 该 Key 鉴权/余额错误时换用其他 Key，没有其他 Key 时重试无意义，直接返回
+                if retry_other_key:
                     continue
+                if resp in NON_RETRYABLE_STATUS:
+                    logger.warning(f"[BLT] 请求返回不可重试的状态码: {resp}")
+                    return resp
 
                 fail_count += 1
                 logger.warning(f"[BLT] 请求返回错误状态码: {resp}, 重试 ({fail_count}/{max_retries})")
                 continue
 
+            blt_keys.record(api_key, "ok")
+            rate_limiter.succeeded("blt", api_key)
             return resp
 
         except Exception as e:
@@ -128,6 +228,117 @@ async def _request(
     return 500
 
 
+class _StreamContent:
+    """拼接 SSE 中的增量内容，完整的短行作为进度文本回调"""
+
+    def __init__(self, on_progress: Optional[StreamProgress] = None):
+        self.on_progress = on_progress
+        self.parts: List[str] = []
+        self._line: List[str] = []
+        self._line_len = 0
+
+    async def feed(self, delta: str) -> None:
+        self.parts.append(delta)
+        if self.on_progress is None:
+            return
+
+        *complete, rest = delta.split("\n")
+        for piece in complete:
+            # 超长的行（base64 图片数据）不拼接，直接丢弃
+            if self._line_len + len(piece) <= PROGRESS_LINE_MAX:
+                await self._emit("".join(self._line) + piece)
+            self._line, self._line_len = [], 0
+        self._line_len += len(rest)
+        if self._line_len <= PROGRESS_LINE_MAX:
+            self._line.append(rest)
+
+    async def _emit(self, line: str) -> None:
+        line = line.strip()
+        if not line or any(pattern.search(line) for pattern in IMAGE_REF_PATTERNS) or self.on_progress is None:
+            return
+        try:
+            await self.on_progress(line)
+        except Exception as e:
+            logger.warning(f"[BLT] 进度回调失败: {e}")
+
+    async def finish(self) -> Dict[str, Any]:
+        """回调最后一行进度，返回与非流式响应结构相同的字典"""
+        if self._line_len <= PROGRESS_LINE_MAX:
+            await self._emit("".join(self._line))
+        self._line, self._line_len = [], 0
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(self.parts)}}]}
+
+
+async def _read_sse(
+    resp: aiohttp.ClientResponse,
+    start: float,
+    on_progress: Optional[StreamProgress] = None,
+) -> Union[Dict, int]:
+    """
+    读取 chat/completions 的 SSE 响应，逐个事件拼接 choices[0].delta.content
+
+    按原始字节块自行切分行，单行 base64 数据超过 aiohttp 的行长度限制也能读取
+
+    Returns:
+        与非流式响应结构相同的字典 或 错误状态码
+    """
+    content = _StreamContent(on_progress)
+    buffer = bytearray()
+    scanned = 0
+    received = 0
+
+    async def handle(line: bytes) -> Optional[Union[Dict, int]]:
+        """处理一行 SSE，流结束时返回结果"""
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return None
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return await content.finish()
+
+        event = await asyncio.to_thread(json_loads, data) if len(data) > LARGE_RESPONSE_BYTES else json_loads(data)
+        if event.get("error"):
+            logger.warning(f"[BLT] 流式响应返回错误: {str(event['error'])[:200]}")
+            return 500
+        choices = event.get("choices") or [{}]
+        delta = (choices[0].get("delta") or choices[0].get("message") or {}).get("content")
+        if isinstance(delta, str) and delta:
+            await content.feed(delta)
+        return None
+
+    async for chunk in resp.content.iter_any():
+        if not received:
+            BLT_FIRST_BYTE.observe(time.monotonic() - start, stream="true")
+        received += len(chunk)
+        buffer.extend(chunk)
+        # 只在新到达的数据中查找换行，长行分多块到达时不重复扫描
+        while (end := buffer.find(b"\n", scanned)) >= 0:
+            line = bytes(buffer[:end])
+            del buffer[: end + 1]
+            scanned = 0
+            if (result := await handle(line)) is not None:
+                logger.debug(f"[BLT] 流式响应: {received} 字节")
+                return result
+        scanned = len(buffer)
+
+    # 没有收到 [DONE] 就断开：有内容时按已收到的内容解析
+    if buffer and (result := await handle(bytes(buffer))) is not None:
+        return result
+    if not content.parts:
+        logger.warning("[BLT] 流式响应没有内容")
+        return 500
+    return await content.finish()
+
+
+def _extract_image_ref(content: str) -> str:
+    """从带进度文本或 Markdown 的内容中取出图片地址，没有时原样返回"""
+    for pattern in IMAGE_REF_PATTERNS:
+        matches = pattern.findall(content)
+        if matches:
+            return matches[-1]
+    return content
+
+
 async def _download_image_from_url(url: str) -> Union[Image.Image, int]:
     """
     从URL下载图片（异步）
@@ -141,12 +352,14 @@ async def _download_image_from_url(url: str) -> Union[Image.Image, int]:
     logger.info(f"[BLT] 下载图片: {url}")
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    logger.warning(f"[BLT] 下载图片失败，状态码: {resp.status}")
-                    return 500
-                image_data = await resp.read()
-                return Image.open(io.BytesIO(image_data))
+            with DOWNLOAD_SECONDS.time(backend="blt"), span("blt.download"):
+                async with session.get(url) as resp:
+                    if resp.status != 200:
+                        logger.warning(f"[BLT] 下载图片失败，状态码: {resp.status}")
+                        return 500
+                    image_data = await resp.read()
+            record_transfer("blt", "download", len(image_data))
+            return Image.open(io.BytesIO(image_data))
     except Exception as e:
         logger.warning(f"[BLT] 下载图片失败: {e}")
         return 500
@@ -154,7 +367,10 @@ async def _download_image_from_url(url: str) -> Union[Image.Image, int]:
 
 def _decode_base64_image(base64_data: str) -> Union[Image.Image, int]:
     """
-    解码base64图片数据
+    解码base64图片数据（同步，较大的图片请在线程中调用）
+
+    按块解码写入缓冲区，避免整段 base64 先复制一份再解码；
+    返回前完成像素解码，使耗时全部留在调用线程中
 
     Args:
         base64_data: base64编码的图片数据
@@ -164,15 +380,19 @@ def _decode_base64_image(base64_data: str) -> Union[Image.Image, int]:
     """
     try:
         # 处理可能存在的data URL前缀
+        start = 0
         if base64_data.startswith("data:"):
-            # 提取base64部分
-            pattern = r"data:image/([a-zA-Z+]+);base64,(.+)"
-            match = re.match(pattern, base64_data)
+            match = re.match(r"data:image/[a-zA-Z+]+;base64,", base64_data)
             if match:
-                base64_data = match.group(2)
-
-        image_bytes = base64.b64decode(base64_data)
-        return Image.open(io.BytesIO(image_bytes))
+                start = match.end()
+
+        buffer = io.BytesIO()
+        for offset in range(start, len(base64_data), B64_CHUNK_CHARS):
+            buffer.write(base64.b64decode(base64_data[offset : offset + B64_CHUNK_CHARS]))
+        buffer.seek(0)
+        image = Image.open(buffer)
+        image.load()
+        return image
     except Exception as e:
         logger.warning(f"[BLT] 解码base64图片失败: {e}")
         return 500
@@ -199,7 +419,7 @@ async def _parse_image_from_content(content: str) -> Union[Image.Image, int]:
     if content.startswith("data:") or (
         len(content) > 100 and "/" not in content and not content.startswith(("http://", "https://"))
     ):
-        return _decode_base64_image(content)
+        return await asyncio.to_thread(_decode_base64_image, content)
 
     # 尝试作为URL下载
     if content.startswith(("http://", "https://")):
@@ -209,6 +429,28 @@ async def _parse_image_from_content(content: str) -> Union[Image.Image, int]:
     return 500
 
 
+async def _parse_data_item(data_item: Dict[str, Any]) -> Union[Image.Image, int]:
+    """解析 /v1/images/generations 响应 data 中的一项"""
+    # 优先使用内联的 b64_json，省去下载
+    if data_item.get("b64_json"):
+        logger.info(f"[BLT] 获取到 b64_json 图片: {len(data_item['b64_json'])} 字符")
+        with span("blt.decode"):
+            return await asyncio.to_thread(_decode_base64_image, data_item["b64_json"])
+    if "url" in data_item:
+        logger.info(f"[BLT] 获取到图片内容: {data_item['url'][:100]}...")
+        return await _parse_image_from_content(data_item["url"])
+
+    logger.error(f"[BLT] 响应data项中没有url或b64_json字段: {str(data_item)[:200]}")
+    return 500
+
+
+def _response_format(model: str) -> str:
+    """模型的图片返回格式：按 BLT_RESPONSE_FORMAT 声明，未声明时优先 b64_json"""
+    if model in _url_only_models or not RHCOMFYUI_CONFIG.get_config("BLT_Prefer_B64").data:
+        return "url"
+    return BLT_RESPONSE_FORMAT.get(model, "b64_json")
+
+
 async def draw_image_by_model(
     model: str,
     prompt: str,
@@ -219,10 +461,14 @@ async def draw_image_by_model(
     max_tokens: Optional[int] = None,
     presence_penalty: Optional[float] = None,
     frequency_penalty: Optional[float] = None,
+    on_progress: Optional[StreamProgress] = None,
 ) -> Union[Image.Image, int]:
     """
     调用OpenAI兼容API生成图片
 
+    stream 为 True 时按 SSE 逐段接收内容，期间的进度文本逐行交给 on_progress，
+    全部接收后从内容中提取图片
+
     Args:
         model: 要使用的模型的ID (如: gpt-4o-image)
         prompt: 生成图片的提示词
@@ -233,16 +479,17 @@ async def draw_image_by_model(
         max_tokens: 最大token数
         presence_penalty: 存在惩罚 (-2.0 到 2.0)
         frequency_penalty: 频率惩罚 (-2.0 到 2.0)
+        on_progress: 流式响应的进度回调，参数为一行进度文本
 
     Returns:
         PIL.Image.Image 对象 或 错误状态码
     """
-    logger.info(f"[BLT] 开始生成图片: model={model}, prompt={prompt}")
+    logger.info(f"[BLT] 开始生成图片: model={model}, prompt={prompt}, stream={stream}")
 
     # 构造请求头
     headers = {
         "Content-Type": "application/json",
-        "Accept": "application/json",
+        "Accept": "text/event-stream" if stream else "application/json",
     }
 
     # 构造请求体
@@ -274,7 +521,15 @@ async def draw_image_by_model(
     logger.debug(f"[BLT] 请求体: {request_body}")
 
     # 发送请求
-    resp = await _request("POST", CHAT_COMPLETIONS_URL, headers=headers, json=request_body)
+    with span("blt.chat_completions", model=model, stream=stream):
+        resp = await _request(
+            "POST",
+            CHAT_COMPLETIONS_URL,
+            headers=headers,
+            json=request_body,
+            stream=stream,
+            on_progress=on_progress,
+        )
 
     if isinstance(resp, int):
         logger.error(f"[BLT] 图片生成失败，错误状态码: {resp}")
@@ -291,7 +546,7 @@ async def draw_image_by_model(
             logger.error(f"[BLT] 响应message中没有content字段: {choice}")
             return 500
 
-        content = choice["message"]["content"]
+        content = _extract_image_ref(choice["message"]["content"] or "")
         logger.info(f"[BLT] 获取到内容: {content[:100]}...")
 
         # 解析图片
@@ -314,22 +569,25 @@ async def draw_image_by_blt(
     prompt: str,
     aspect_ratio: Literal["1:1", "4:3", "16:9", "9:16", "3:4", "21:9", None] = "16:9",
     image_list: Optional[List[bytes]] = None,
-) -> Union[Image.Image, int]:
+    n: int = 1,
+) -> Union[Image.Image, List[Image.Image], int]:
     """
     调用 OpenAI Dall-e 格式 API 生成图片 (/v1/images/generations)
 
+    返回格式按 _response_format 选择，b64_json 被服务端拒绝时退回 url 重新请求
+
     Args:
         model: 要使用的模型ID (如: gemini-3.1-flash-image-preview)
         prompt: 生成图片的提示词
-        response_format: 返回格式 (url 或 b64_json)
         aspect_ratio: 图片宽高比 (如: 1:1, 4:3, 16:9 等)
         image: 参考图数组，格式为 list[bytes]，会自动转换为 b64_json 格式
         image_size: 图片大小 (1K, 2K, 4K, 512px)，仅部分模型支持
+        n: 生成数量，大于 1 时返回图片列表
 
     Returns:
-        PIL.Image.Image 对象 或 错误状态码
+        PIL.Image.Image 对象（n > 1 时为列表） 或 错误状态码
     """
-    logger.info(f"[BLT] 开始生成图片(Dall-e格式): model={model}, prompt={prompt}")
+    logger.info(f"[BLT] 开始生成图片(Dall-e格式): model={model}, prompt={prompt}, n={n}")
 
     # 构造请求头
     headers = {
@@ -338,34 +596,51 @@ async def draw_image_by_blt(
     }
 
     # 构造请求体
+    response_format = _response_format(model)
     request_body: Dict[str, Any] = {
         "model": model,
         "prompt": prompt,
-        "response_format": "url",
+        "response_format": response_format,
         "image_size": "2K",
     }
 
     if aspect_ratio is not None:
         request_body["aspect_ratio"] = aspect_ratio
+    if n > 1:
+        request_body["n"] = n
     if image_list is not None:
         # 将 list[bytes] 转换为 base64 字符串列表
         request_body["image"] = [base64.b64encode(img_bytes).decode() for img_bytes in image_list]
+        record_transfer("blt", "upload", sum(len(img_bytes) for img_bytes in image_list))
 
-    # 截断过长的 base64 字符串用于日志输出
-    log_body = request_body.copy()
-    if "image" in log_body:
-        log_body["image"] = [f"{img[:50]}... (长度: {len(img)})" for img in log_body["image"]]
-
-    logger.debug(f"[BLT] 请求体: {log_body}")
+    logger.debug(f"[BLT] 请求体: model={model}, 参考图: {len(image_list or [])} 张")
 
     # 发送请求
-    resp = await _request(
-        "POST",
-        IMAGES_GENERATIONS_URL,
-        headers=headers,
-        json=request_body,
-    )
-
+    with span("blt.images_generations", model=model, response_format=response_format):
+        resp = await _request(
+            "POST",
+            IMAGES_GENERATIONS_URL,
+            headers=headers,
+            json=request_body,
+        )
+
+    # 不支持 b64_json 时记住该模型，之后直接使用 url
+    if response_format == "b64_json" and resp == FORMAT_REJECTED_STATUS:
+        logger.warning(f"[BLT] {model} 不支持 b64_json 返回格式({resp})，退回 url")
+        _url_only_models.add(model)
+        response_format = request_body["response_format"] = "url"
+        with span("blt.images_generations", model=model, response_format=response_format):
+            resp = await _request("POST", IMAGES_GENERATIONS_URL, headers=headers, json=request_body)
+
+    BLT_RESPONSE_FORMATS.inc(model=model, format=response_format)
+    return await _parse_images_response(resp, n)
+
+
+async def _parse_images_response(
+    resp: Union[Dict, int],
+    n: int,
+) -> Union[Image.Image, List[Image.Image], int]:
+    """解析 /v1/images/generations 与 /v1/images/edits 的响应，n > 1 时返回图片列表"""
     if isinstance(resp, int):
         logger.error(f"[BLT] 图片生成失败(Dall-e格式)，错误状态码: {resp}")
         return resp
@@ -377,31 +652,117 @@ async def draw_image_by_blt(
             logger.error(f"[BLT] 响应中没有data字段: {resp}")
             return 500
 
-        data_item = resp["data"][0]
-
-        # 尝试获取 url 或 b64_json
-        image_content = None
-        if "url" in data_item:
-            image_content = data_item["url"]
-        elif "b64_json" in data_item:
-            # 添加 data URL 前缀以便解析
-            image_content = f"data:image/png;base64,{data_item['b64_json']}"
-        else:
-            logger.error(f"[BLT] 响应data项中没有url或b64_json字段: {data_item}")
-            return 500
-
-        logger.info(f"[BLT] 获取到图片内容: {image_content[:100]}...")
-
-        # 解析图片
-        result_image = await _parse_image_from_content(image_content)
-
-        if isinstance(result_image, int):
+        # 批量生成时并发解析全部图片
+        results = await asyncio.gather(*(_parse_data_item(item) for item in resp["data"][: max(n, 1)]))
+        images = [image for image in results if not isinstance(image, int)]
+        if not images:
             logger.error("[BLT] 图片解析失败(Dall-e格式)")
-            return result_image
+            return results[0]
 
-        logger.info(f"[BLT] 图片生成成功(Dall-e格式)！尺寸: {result_image.size}")
-        return result_image
+        logger.info(f"[BLT] 图片生成成功(Dall-e格式)！数量: {len(images)} 尺寸: {images[0].size}")
+        return images if n > 1 else images[0]
 
     except Exception as e:
         logger.error(f"[BLT] 响应解析失败(Dall-e格式): {e}")
         return 500
+
+
+def _fit_reference_image(img_bytes: bytes, max_side: int) -> Tuple[bytes, str, str]:
+    """
+    将参考图等比缩小到最长边不超过 max_side（同步，请在线程中调用）
+
+    未超过时原样返回，不重新编码；无法识别的图片也原样上传，由服务端判断
+
+    Returns:
+        (图片字节, 文件名, Content-Type)
+    """
+    try:
+        image = Image.open(io.BytesIO(img_bytes))
+        image_format = (image.format or "PNG").upper()
+        if max(image.size) <= max_side:
+            return img_bytes, f"image.{image_format.lower()}", Image.MIME.get(image_format, "image/png")
+
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        # 带透明通道的图片保存为 PNG，其余保存为 JPEG 以减小上传体积
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(buffer, "PNG")
+            return buffer.getvalue(), "image.png", "image/png"
+        image.convert("RGB").save(buffer, "JPEG", quality=95)
+        return buffer.getvalue(), "image.jpg", "image/jpeg"
+    except Exception as e:
+        logger.warning(f"[BLT] 参考图缩放失败，按原图上传: {e}")
+        return img_bytes, "image.png", "application/octet-stream"
+
+
+async def edit_image_by_blt(
+    model: str,
+    prompt: str,
+    image_list: List[bytes],
+    n: int = 1,
+) -> Union[Image.Image, List[Image.Image], int]:
+    """
+    调用 OpenAI 格式的图片编辑 API (/v1/images/edits)
+
+    参考图以 multipart 原始字节上传，避免 base64 带来的 33% 体积膨胀与整段 JSON 编码；
+    上传前在线程中缩小到 BLT_EDIT_MAX_SIDE。服务端没有该接口时退回 draw_image_by_blt
+
+    Args:
+        model: 要使用的模型ID (如: gemini-3.1-flash-image-preview)
+        prompt: 编辑图片的提示词
+        image_list: 参考图数组，格式为 list[bytes]
+        n: 生成数量，大于 1 时返回图片列表
+
+    Returns:
+        PIL.Image.Image 对象（n > 1 时为列表） 或 错误状态码
+    """
+    if model in _json_edit_models:
+        return await draw_image_by_blt(model=model, prompt=prompt, aspect_ratio=None, image_list=image_list, n=n)
+
+    logger.info(f"[BLT] 开始编辑图片(multipart): model={model}, prompt={prompt}, n={n}")
+
+    max_side = BLT_EDIT_MAX_SIDE.get(model, BLT_EDIT_DEFAULT_MAX_SIDE)
+    with span("blt.resize_reference", model=model, count=len(image_list)):
+        references = await asyncio.gather(
+            *(asyncio.to_thread(_fit_reference_image, img_bytes, max_side) for img_bytes in image_list)
+        )
+    upload_size = sum(len(ref[0]) for ref in references)
+    logger.debug(
+        f"[BLT] 参考图: {len(references)} 张, 原始 {sum(len(b) for b in image_list)} 字节, 上传 {upload_size} 字节"
+    )
+
+    response_format = _response_format(model)
+
+    def build_form() -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        form.add_field("model", model)
+        form.add_field("prompt", prompt)
+        form.add_field("response_format", response_format)
+        form.add_field("image_size", "2K")
+        if n > 1:
+            form.add_field("n", str(n))
+        for img_bytes, filename, content_type in references:
+            form.add_field("image", img_bytes, filename=filename, content_type=content_type)
+        return form
+
+    headers = {"Accept": "application/json"}
+    with span("blt.images_edits", model=model, response_format=response_format):
+        resp = await _request("POST", IMAGES_EDITS_URL, headers=headers, form=build_form)
+
+    # 不支持 b64_json 时记住该模型，之后直接使用 url
+    if response_format == "b64_json" and resp == FORMAT_REJECTED_STATUS:
+        logger.warning(f"[BLT] {model} 不支持 b64_json 返回格式({resp})，退回 url")
+        _url_only_models.add(model)
+        response_format = "url"
+        with span("blt.images_edits", model=model, response_format=response_format):
+            resp = await _request("POST", IMAGES_EDITS_URL, headers=headers, form=build_form)
+
+    # 服务端没有图片编辑接口，之后该模型直接使用 base64 JSON 请求
+    if isinstance(resp, int) and resp in UNSUPPORTED_ENDPOINT_STATUS:
+        logger.warning(f"[BLT] {model} 不支持 /v1/images/edits({resp})，退回 /v1/images/generations")
+        _json_edit_models.add(model)
+        return await draw_image_by_blt(model=model, prompt=prompt, aspect_ratio=None, image_list=image_list, n=n)
+
+    record_transfer("blt", "upload", upload_size)
+    BLT_RESPONSE_FORMATS.inc(model=model, format=response_format)
+    return await _parse_images_response(resp, n)
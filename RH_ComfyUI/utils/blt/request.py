@@ -1,6 +1,6 @@
 from typing import List, Literal
 
-from .blt_request import draw_image_by_blt
+from .blt_request import draw_image_by_blt, edit_image_by_blt
 
 
 def _calculate_aspect_ratio(w: int, h: int) -> Literal["1:1", "4:3", "16:9", "9:16", "3:4", "21:9"]:
@@ -38,6 +38,7 @@ async def draw_image_by_banana2(
     prompt: str,
     w: int = 720,
     h: int = 1280,
+    batch: int = 1,
 ):
     # 自动计算最接近的宽高比
     ratio = _calculate_aspect_ratio(w, h)
@@ -45,6 +46,7 @@ async def draw_image_by_banana2(
         model="gemini-3.1-flash-image-preview",
         prompt=prompt,
         aspect_ratio=ratio,
+        n=batch,
     )
 
 
@@ -52,6 +54,7 @@ async def draw_image_by_banana_pro(
     prompt: str,
     w: int = 720,
     h: int = 1280,
+    batch: int = 1,
 ):
     # 自动计算最接近的宽高比
     ratio = _calculate_aspect_ratio(w, h)
@@ -59,22 +62,23 @@ async def draw_image_by_banana_pro(
         model="nano-banana-2-2k",
         prompt=prompt,
         aspect_ratio=ratio,
+        n=batch,
     )
 
 
-async def edit_img_by_banana2(prompt: str, img_list: List[bytes]):
-    return await draw_image_by_blt(
+async def edit_img_by_banana2(prompt: str, img_list: List[bytes], batch: int = 1):
+    return await edit_image_by_blt(
         model="gemini-3.1-flash-image-preview",
         prompt=prompt,
-        aspect_ratio=None,
         image_list=img_list,
+        n=batch,
     )
 
 
-async def edit_img_by_banana_pro(prompt: str, img_list: List[bytes]):
-    return await draw_image_by_blt(
+async def edit_img_by_banana_pro(prompt: str, img_list: List[bytes], batch: int = 1):
+    return await edit_image_by_blt(
         model="nano-banana-2-2k",
         prompt=prompt,
-        aspect_ratio=None,
         image_list=img_list,
+        n=batch,
     )
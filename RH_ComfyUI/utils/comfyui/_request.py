@@ -1,6 +1,9 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Callable, Optional, Awaitable
+from pathlib import Path
+from dataclasses import replace
 
-from .comfyui_api import api
+from .dispatcher import workflow_models, comfyui_dispatcher
+from .micro_batch import BatchSpec, micro_batcher
 from ..resource.RESOURCE_PATH import (
     EDIT_WORKFLOW_PATH,
     MUSIC_WORKFLOW_PATH,
@@ -12,62 +15,168 @@ from ..resource.RESOURCE_PATH import (
     load_workflow,
 )
 
+if TYPE_CHECKING:
+    from .comfyui_api import ComfyUIAPI
+
+
+async def dispatch(workflow: Dict, run: Callable[["ComfyUIAPI"], Awaitable[Any]]):
+    """
+    在模型亲和调度分配的 ComfyUI 机器上执行 run(api)
+
+    上传、提交与取回结果需要在同一台机器上完成，因此都放在 run 中
+    """
+    async with comfyui_dispatcher.acquire(workflow_models(workflow)) as api:
+        return await run(api)
+
+
+# 空 latent 节点，可直接设置 batch_size
+_EMPTY_LATENT_TYPES = ("EmptyLatentImage", "EmptySD3LatentImage", "EmptyHunyuanLatentVideo")
+
+
+def apply_batch_size(workflow: Dict, batch: int) -> Dict:
+    """
+    让工作流一次生成 batch 张图
+
+    KSampler 的 latent 来自空 latent 节点时直接设置 batch_size，
+    来自 VAEEncode 等节点时在中间插入 RepeatLatentBatch
+    """
+    if batch <= 1:
+        return workflow
+
+    next_id = max(int(i) for i in workflow if i.isdigit()) + 1
+    for node in list(workflow.values()):
+        latent = node["inputs"].get("latent_image")
+        if not isinstance(latent, list):
+            continue
+
+        source = workflow[latent[0]]
+        if source["class_type"] in _EMPTY_LATENT_TYPES:
+            source["inputs"]["batch_size"] = batch
+            continue
+
+        repeat_id = str(next_id)
+        next_id += 1
+        workflow[repeat_id] = {
+            "class_type": "RepeatLatentBatch",
+            "inputs": {"samples": latent, "amount": batch},
+        }
+        node["inputs"]["latent_image"] = [repeat_id, 0]
+    return workflow
+
+
+async def generate_images(api: "ComfyUIAPI", workflow: Dict, batch: int):
+    """batch 为 1 时返回单张图片，否则返回图片列表"""
+    if batch <= 1:
+        return await api.generate_image_by_prompt(workflow)
+    return await api.generate_images_by_prompt(apply_batch_size(workflow, batch))
+
+
+def _apply_qwen_2512(workflow: Dict, ids: Dict[str, str], prompt: str, w: int, h: int):
+    workflow[ids["108"]]["inputs"]["text"] = prompt
+    workflow[ids["107"]]["inputs"]["width"] = w
+    workflow[ids["107"]]["inputs"]["height"] = h
+
+
+# 提示词 (108) 与尺寸 (107) 随请求变化，采样步数等由工作流固定
+QWEN_2512_BATCH = BatchSpec(
+    name="qwen_2512",
+    workflow_path=DRAW_TEXT_WORKFLOW_PATH / "qwen_2512.json",
+    roots=("108", "107"),
+    apply=_apply_qwen_2512,
+)
+
 
 async def draw_img_by_qwen_2512(
     prompt: str,
     w: int = 720,
     h: int = 1280,
+    batch: int = 1,
+    workflow_path: Optional[Path] = None,
 ):
-    workflow = load_workflow(DRAW_TEXT_WORKFLOW_PATH / "qwen_2512.json")
+    workflow_path = workflow_path or QWEN_2512_BATCH.workflow_path
+    # 单张请求可与其他用户的同尺寸请求合并提交，清单指定了其他工作流时单独分组
+    if batch <= 1 and micro_batcher.enabled:
+        spec = QWEN_2512_BATCH
+        if workflow_path != spec.workflow_path:
+            spec = replace(spec, name=f"{spec.name}:{workflow_path}", workflow_path=workflow_path)
+        return await micro_batcher.submit(spec, (w, h), prompt=prompt, w=w, h=h)
+
+    workflow = load_workflow(workflow_path)
     workflow["108"]["inputs"]["text"] = prompt
     workflow["107"]["inputs"]["width"] = w
     workflow["107"]["inputs"]["height"] = h
-    image = await api.generate_image_by_prompt(workflow)
-    return image
+
+    async def _run(api: "ComfyUIAPI"):
+        return await generate_images(api, workflow, batch)
+
+    return await dispatch(workflow, _run)
 
 
-async def draw_img_by_img_by_qwen_2512(prompt: str, input_image: bytes):
-    workflow = load_workflow(DRAW_IMAGE_WORKFLOW_PATH / "qwen_2512_with_lora.json")
+async def draw_img_by_img_by_qwen_2512(
+    prompt: str,
+    input_image: bytes,
+    batch: int = 1,
+    workflow_path: Optional[Path] = None,
+):
+    workflow = load_workflow(workflow_path or DRAW_IMAGE_WORKFLOW_PATH / "qwen_2512_with_lora.json")
     workflow["23"]["inputs"]["text"] = prompt
-    workflow["41"]["inputs"]["image"] = await api.upload_image(input_image)
-    image = await api.generate_image_by_prompt(workflow)
-    return image
+
+    async def _run(api: "ComfyUIAPI"):
+        workflow["41"]["inputs"]["image"] = await api.upload_image(input_image)
+        return await generate_images(api, workflow, batch)
+
+    return await dispatch(workflow, _run)
 
 
-async def edit_img_by_qwen_edit_2511(prompt: str, img_list: List[bytes]):
-    workflow = load_workflow(EDIT_WORKFLOW_PATH / "qwen_edit_2511.json")
+async def edit_img_by_qwen_edit_2511(
+    prompt: str,
+    img_list: List[bytes],
+    batch: int = 1,
+    workflow_path: Optional[Path] = None,
+):
+    workflow = load_workflow(workflow_path or EDIT_WORKFLOW_PATH / "qwen_edit_2511.json")
     workflow["103"]["inputs"]["text"] = prompt
 
-    img_slot = ["41", "79", "81"]
-    img_slot2 = ["73", "79", "81"]
-    for index, i in enumerate(img_list):
-        if index >= 3:
-            break
+    async def _run(api: "ComfyUIAPI"):
+        img_slot = ["41", "79", "81"]
+        img_slot2 = ["73", "79", "81"]
+        for index, i in enumerate(img_list):
+            if index >= 3:
+                break
 
-        workflow[img_slot[index]]["inputs"]["image"] = await api.upload_image(i)
+            workflow[img_slot[index]]["inputs"]["image"] = await api.upload_image(i)
 
-        for j in ["68", "69"]:
-            workflow[j]["inputs"][f"image{index + 1}"] = [img_slot2[index], 0]
+            for j in ["68", "69"]:
+                workflow[j]["inputs"][f"image{index + 1}"] = [img_slot2[index], 0]
 
-    image = await api.generate_image_by_prompt(workflow)
-    return image
+        return await generate_images(api, workflow, batch)
 
+    return await dispatch(workflow, _run)
 
-async def gen_music_by_ace_step_1_5(style_prompt: str, lyric_prompt: Optional[str] = None):
-    workflow = load_workflow(MUSIC_WORKFLOW_PATH / "ace_step1.5.json")
+
+async def gen_music_by_ace_step_1_5(
+    style_prompt: str,
+    lyric_prompt: Optional[str] = None,
+    workflow_path: Optional[Path] = None,
+):
+    workflow = load_workflow(workflow_path or MUSIC_WORKFLOW_PATH / "ace_step1.5.json")
     workflow["131"]["inputs"]["text"] = style_prompt
     workflow["130"]["inputs"]["text"] = lyric_prompt if lyric_prompt else ""
 
-    audio = await api.generate_audio_by_prompt(workflow)
-    return audio
+    async def _run(api: "ComfyUIAPI"):
+        return await api.generate_audio_by_prompt(workflow)
 
+    return await dispatch(workflow, _run)
 
-async def gen_speech_by_index_tts_2(text: str):
-    workflow = load_workflow(SPEECH_WORKFLOW_PATH / "IndexTTS2.json")
+
+async def gen_speech_by_index_tts_2(text: str, workflow_path: Optional[Path] = None):
+    workflow = load_workflow(workflow_path or SPEECH_WORKFLOW_PATH / "IndexTTS2.json")
     workflow["14"]["inputs"]["value"] = text
 
-    audio = await api.generate_audio_by_prompt(workflow)
-    return audio
+    async def _run(api: "ComfyUIAPI"):
+        return await api.generate_audio_by_prompt(workflow)
+
+    return await dispatch(workflow, _run)
 
 
 async def gen_video_by_text_by_wan2_2(
@@ -75,15 +184,18 @@ async def gen_video_by_text_by_wan2_2(
     w: int = 720,
     h: int = 1280,
     duration: int = 5,
+    workflow_path: Optional[Path] = None,
 ):
-    workflow = load_workflow(VIDEO_BY_TEXT_WORKFLOW_PATH / "wan2.2_text2video.json")
+    workflow = load_workflow(workflow_path or VIDEO_BY_TEXT_WORKFLOW_PATH / "wan2.2_text2video.json")
     workflow["37"]["inputs"]["text"] = text
     workflow["44"]["inputs"]["value"] = w
     workflow["34"]["inputs"]["value"] = h
     workflow["33"]["inputs"]["value"] = duration
 
-    video = await api.generate_video_by_prompt(workflow)
-    return video
+    async def _run(api: "ComfyUIAPI"):
+        return await api.generate_video_by_prompt(workflow)
+
+    return await dispatch(workflow, _run)
 
 
 async def gen_video_by_img_by_wan2_2(
@@ -92,13 +204,16 @@ async def gen_video_by_img_by_wan2_2(
     w: int = 720,
     h: int = 1280,
     duration: int = 5,
+    workflow_path: Optional[Path] = None,
 ):
-    workflow = load_workflow(VIDEO_BY_IMAGE_WORKFLOW_PATH / "wan2.2_image2video.json")
+    workflow = load_workflow(workflow_path or VIDEO_BY_IMAGE_WORKFLOW_PATH / "wan2.2_image2video.json")
     workflow["102"]["inputs"]["text"] = text
     workflow["289"]["inputs"]["value"] = w
     workflow["290"]["inputs"]["value"] = h
-    workflow["67"]["inputs"]["image"] = await api.upload_image(img)
     workflow["294"]["inputs"]["value"] = duration
 
-    video = await api.generate_video_by_prompt(workflow)
-    return video
+    async def _run(api: "ComfyUIAPI"):
+        workflow["67"]["inputs"]["image"] = await api.upload_image(img)
+        return await api.generate_video_by_prompt(workflow)
+
+    return await dispatch(workflow, _run)
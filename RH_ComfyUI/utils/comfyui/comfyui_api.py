@@ -1,8 +1,9 @@
 import io
 import json
+import time
 import uuid
 import asyncio
-from typing import Dict, List, Union, Optional
+from typing import Set, Dict, List, Union, Optional
 from pathlib import Path
 from collections import defaultdict
 
@@ -13,27 +14,49 @@ from websockets import ClientConnection
 
 from gsuid_core.logger import logger
 
+from ..metrics import (
+    UPLOAD_SECONDS,
+    COMFYUI_HISTORY,
+    COMFYUI_SAMPLER,
+    DOWNLOAD_SECONDS,
+    COMFYUI_EXECUTION,
+    COMFYUI_QUEUE_PROMPT,
+    COMFYUI_EXECUTION_WAIT,
+    record_transfer,
+)
+from ..tracing import span
+from ..key_pool import rh_keys
+from ..backend_health import backend_health
 from ..resource.RESOURCE_PATH import OUTPUT_PATH
 from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
 
-API_KEY: str = RHCOMFYUI_CONFIG.get_config("RH_apikey").data
 BASE_URL: str = RHCOMFYUI_CONFIG.get_config("ComfyUI_BaseURL").data
 
 
+def base_addresses() -> List[str]:
+    """ComfyUI_BaseURL 可填写多个地址，以逗号分隔"""
+    return [i.strip() for i in BASE_URL.split(",") if i.strip()] or [BASE_URL]
+
+
 class ComfyUIAPI:
-    def __init__(self) -> None:
-        if "runninghub" in BASE_URL.lower():
-            self.server_address = f"www.runninghub.cn/proxy/{API_KEY}"
-            self.url = f"https://www.runninghub.cn/proxy/{API_KEY}"
+    def __init__(self, address: Optional[str] = None) -> None:
+        self.address = address or base_addresses()[0]
+        if "runninghub" in self.address.lower():
+            self.backend = "runninghub"
+            api_key = rh_keys.primary()
+            self.server_address = f"www.runninghub.cn/proxy/{api_key}"
+            self.url = f"https://www.runninghub.cn/proxy/{api_key}"
         else:
-            self.server_address = BASE_URL
-            self.url = f"http://{BASE_URL}"
+            self.backend = "comfyui"
+            self.server_address = self.address
+            self.url = f"http://{self.address}"
 
         self.client_id = str(uuid.uuid4())
         self.ws: Optional[ClientConnection] = None  # 2. 初始化 ws 为 None
         self.is_prompt = False
         self._prompt_events = defaultdict(asyncio.Queue)  # 1. 使用Queue来分发消息
         self._listener_task = None  # 用于持有监听任务
+        self._cancel_tasks: Set[asyncio.Task] = set()
 
     async def connect(self):
         """
@@ -58,34 +81,83 @@ class ComfyUIAPI:
 
     async def get_history(self, prompt_id: str):
         url = f"{self.url}/history/{prompt_id}"
-        async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
-            response = await client.get(url, timeout=10.0)
-            response.raise_for_status()
-            result = response.json()
+        with COMFYUI_HISTORY.time(), span("comfyui.history"):
+            async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
+                response = await client.get(url, timeout=10.0)
+                response.raise_for_status()
+                result = response.json()
             logger.info(result)
             return result
 
+    async def get_queue_remaining(self) -> int:
+        """获取 ComfyUI 当前排队 + 执行中的任务数"""
+        async with httpx.AsyncClient(timeout=5, follow_redirects=True) as client:
+            response = await client.get(f"{self.url}/prompt")
+            response.raise_for_status()
+            return int(response.json()["exec_info"]["queue_remaining"])
+
     async def queue_prompt(self, prompt: Dict):
+        if not backend_health.allow_request(self.backend):
+            raise ConnectionError("🚫 [ComfyUI] 后端连续失败已熔断，请稍后再试！")
+
         if not self.ws or self.ws.state != websockets.State.OPEN:
             await self.connect()
 
         p = {"prompt": prompt, "client_id": self.client_id}
         headers = {"Content-Type": "application/json"}
-        async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
-            req = await client.post(f"{self.url}/prompt", json=p, headers=headers)
-            req.raise_for_status()  # Good practice to check for errors
-            prompt_data = req.json()
+        with COMFYUI_QUEUE_PROMPT.time(), span("comfyui.queue_prompt"):
+            async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
+                req = await client.post(f"{self.url}/prompt", json=p, headers=headers)
+                req.raise_for_status()  # Good practice to check for errors
+                prompt_data = req.json()
         logger.info(f"Prompt ID: {prompt_data}")
         return prompt_data
 
+    async def execute_prompt(self, prompt: Dict) -> str:
+        """提交工作流并等待执行完成，返回 prompt_id；等待期间被取消时一并取消 ComfyUI 上的任务"""
+        prompt_data = await self.queue_prompt(prompt)
+        prompt_id = prompt_data["prompt_id"]
+        try:
+            await self.track_progress(prompt, prompt_id)
+        except asyncio.CancelledError:
+            task = asyncio.create_task(self.cancel_prompt(prompt_id))
+            self._cancel_tasks.add(task)
+            task.add_done_callback(self._cancel_tasks.discard)
+            raise
+        return prompt_id
+
+    async def cancel_prompt(self, prompt_id: str) -> None:
+        """仍在排队时从队列中删除，正在执行时中断"""
+        try:
+            async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+                response = await client.get(f"{self.url}/queue")
+                response.raise_for_status()
+                running = [item[1] for item in response.json().get("queue_running", [])]
+                if prompt_id in running:
+                    await client.post(f"{self.url}/interrupt", json={"prompt_id": prompt_id})
+                    logger.info(f"🛑 [ComfyUI] 已中断任务 {prompt_id}")
+                else:
+                    await client.post(f"{self.url}/queue", json={"delete": [prompt_id]})
+                    logger.info(f"🛑 [ComfyUI] 已从队列删除任务 {prompt_id}")
+        except Exception as e:
+            logger.warning(f"[ComfyUI] 取消任务 {prompt_id} 失败: {e}")
+
     def save_image(self, images: List, output_path: Path, image_name: str):
+        saved = self.save_images(images[:1], output_path, image_name)
+        return saved[0] if saved else None
+
+    def save_images(self, images: List, output_path: Path, image_name: str) -> List[Image.Image]:
+        """保存全部输出图片，批量生成时按序号命名"""
+        saved = []
         for itm in images:
             if itm["type"] != "output":
                 continue
             output_path.mkdir(parents=True, exist_ok=True)
             image = Image.open(io.BytesIO(itm["image_data"]))
-            image.save(output_path / f"{image_name}.jpg", "JPEG")
-            return image
+            name = image_name if not saved else f"{image_name}_{len(saved)}"
+            image.save(output_path / f"{name}.jpg", "JPEG")
+            saved.append(image)
+        return saved
 
     def save_video(self, videos: List, output_path: Path, image_name: str):
         for itm in videos:
@@ -104,10 +176,12 @@ class ComfyUIAPI:
             "type": folder_type,
         }
 
-        async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            response.raise_for_status()
-            return response.content
+        with DOWNLOAD_SECONDS.time(backend="comfyui"), span("comfyui.download", filename=filename):
+            async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
+                response = await client.get(url, params=params, timeout=10.0)
+                response.raise_for_status()
+        record_transfer("comfyui", "download", len(response.content))
+        return response.content
 
     async def get_videos(self, prompt_id: str):
         output_audios = []
@@ -127,26 +201,27 @@ class ComfyUIAPI:
         return output_audios
 
     async def get_images(self, prompt_id):
-        output_images = []
-
         history = (await self.get_history(prompt_id))[prompt_id]
-        for node_id in history["outputs"]:
-            node_output = history["outputs"][node_id]
-            output_data = {}
-            if "images" in node_output:
-                for image in node_output["images"]:
-                    if image["type"] == "output":
-                        image_data = await self.get_image(
-                            image["filename"],
-                            image["subfolder"],
-                            image["type"],
-                        )
-                        output_data["image_data"] = image_data
-                        output_data["file_name"] = image["filename"]
-                        output_data["type"] = image["type"]
-                        output_images.append(output_data)
-
-        return output_images
+        outputs = [
+            (node_id, image)
+            for node_id, node_output in history["outputs"].items()
+            for image in node_output.get("images", [])
+            if image["type"] == "output"
+        ]
+
+        # 批量生成时并发下载全部图片
+        contents = await asyncio.gather(
+            *(self.get_image(image["filename"], image["subfolder"], image["type"]) for _, image in outputs)
+        )
+        return [
+            {
+                "node_id": node_id,
+                "image_data": image_data,
+                "file_name": image["filename"],
+                "type": image["type"],
+            }
+            for (node_id, image), image_data in zip(outputs, contents)
+        ]
 
     async def get_audios(self, prompt_id: str):
         output_audios = []
@@ -196,10 +271,12 @@ class ComfyUIAPI:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
-                    response = await client.get(url, params=params, timeout=10.0)
-                    response.raise_for_status()
-                    return response.content
+                with DOWNLOAD_SECONDS.time(backend="comfyui"), span("comfyui.download", filename=filename):
+                    async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
+                        response = await client.get(url, params=params, timeout=10.0)
+                        response.raise_for_status()
+                record_transfer("comfyui", "download", len(response.content))
+                return response.content
             except httpx.HTTPStatusError as e:
                 if attempt == max_retries - 1:  # 最后一次尝试
                     logger.info(f"获取音频文件失败，URL: {url}, 参数: {params}, 错误: {e}")
@@ -225,9 +302,7 @@ class ComfyUIAPI:
         prompt: Dict,
     ):
         logger.debug(f"🚧 [ComfyUI] 生成文本提示词: {prompt}")
-        prompt_data = await self.queue_prompt(prompt)
-        prompt_id = prompt_data["prompt_id"]
-        await self.track_progress(prompt, prompt_id)
+        prompt_id = await self.execute_prompt(prompt)
         texts = await self.get_texts(prompt_id)
         logger.info(f"✅ [ComfyUI] 文本生成完成！文本内容: {texts}")
         return texts
@@ -245,9 +320,7 @@ class ComfyUIAPI:
             file_name = f"{uuid.uuid4()}.mp3"
 
         logger.debug(f"🚧 [ComfyUI] 生成音频提示词: {prompt}")
-        prompt_data = await self.queue_prompt(prompt)
-        prompt_id = prompt_data["prompt_id"]
-        await self.track_progress(prompt, prompt_id)
+        prompt_id = await self.execute_prompt(prompt)
         audios = await self.get_audios(prompt_id)
         logger.info(f"✅ [ComfyUI] 音频生成完成！包含音频数量: {len(audios)}")
         if audios and len(audios) > 0:
@@ -266,24 +339,57 @@ class ComfyUIAPI:
         output_path: Optional[Path] = None,
         image_name: Optional[str] = None,
     ):
+        images = await self.generate_images_by_prompt(prompt, output_path, image_name)
+        return images[0]
+
+    async def generate_images_by_prompt(
+        self,
+        prompt: Dict,
+        output_path: Optional[Path] = None,
+        image_name: Optional[str] = None,
+    ) -> List[Image.Image]:
+        """生成并返回工作流输出的全部图片（批量生成时为多张）"""
         if image_name is None:
             image_name = f"{uuid.uuid4()}.png"
         if output_path is None:
             output_path = OUTPUT_PATH
 
+        images = await self._run_image_prompt(prompt)
+        saved = self.save_images(images, output_path, image_name)
+        if not saved:
+            raise ValueError("🚫 [ComfyUI失败] 未知原因生成失败！")
+        logger.info(f"✅ [ComfyUI] 图片生成完成！共 {len(saved)} 张")
+        return saved
+
+    async def generate_images_by_node(
+        self,
+        prompt: Dict,
+        output_path: Optional[Path] = None,
+    ) -> Dict[str, List[Image.Image]]:
+        """生成图片并按输出节点 ID 分组返回，用于拆分合并提交的工作流"""
+        if output_path is None:
+            output_path = OUTPUT_PATH
+
+        grouped: Dict[str, List[Dict]] = defaultdict(list)
+        for image in await self._run_image_prompt(prompt):
+            grouped[image["node_id"]].append(image)
+
+        result = {
+            node_id: self.save_images(images, output_path, f"{uuid.uuid4()}") for node_id, images in grouped.items()
+        }
+        if not any(result.values()):
+            raise ValueError("🚫 [ComfyUI失败] 未知原因生成失败！")
+        logger.info(f"✅ [ComfyUI] 图片生成完成！共 {sum(len(i) for i in result.values())} 张")
+        return result
+
+    async def _run_image_prompt(self, prompt: Dict) -> List[Dict]:
         logger.debug(f"🚧 [ComfyUI] 生成图片提示词: {prompt}")
-        prompt_data = await self.queue_prompt(prompt)
-        prompt_id = prompt_data["prompt_id"]
-        await self.track_progress(prompt, prompt_id)
+        prompt_id = await self.execute_prompt(prompt)
         images = await self.get_images(prompt_id)
-        image = self.save_image(images, output_path, image_name)
-        if image is None:
-            raise ValueError("🚫 [ComfyUI失败] 未知原因生成失败！")
         if self.is_prompt:
             while self.is_prompt:
                 await asyncio.sleep(5)
-        logger.info(f"✅ [ComfyUI] 图片生成完成！图片路径: {image}")
-        return image
+        return images
 
     async def generate_video_by_prompt(
         self,
@@ -298,9 +404,7 @@ class ComfyUIAPI:
 
         logger.debug(f"🚧 [ComfyUI] 生成视频提示词: {prompt}")
 
-        prompt_data = await self.queue_prompt(prompt)
-        prompt_id = prompt_data["prompt_id"]
-        await self.track_progress(prompt, prompt_id)
+        prompt_id = await self.execute_prompt(prompt)
         videos = await self.get_videos(prompt_id)
 
         logger.info(f"✅ [ComfyUI] 视频生成完成！包含视频数量: {len(videos)}")
@@ -346,8 +450,15 @@ class ComfyUIAPI:
             "overwrite": (None, "true"),
         }
 
+        start = time.perf_counter()
         async with httpx.AsyncClient(timeout=6000, follow_redirects=True) as client:
-            response = await client.post(f"{self.url}/upload/image", files=files)
+            with span("comfyui.upload", filename=image_name):
+                response = await client.post(f"{self.url}/upload/image", files=files)
+            UPLOAD_SECONDS.observe(time.perf_counter() - start, backend="comfyui")
+            if isinstance(image_bytes, io.BytesIO):
+                record_transfer("comfyui", "upload", image_bytes.getbuffer().nbytes)
+            else:
+                record_transfer("comfyui", "upload", len(image_bytes))
             try:
                 upload_name = response.json()["name"]
                 return upload_name
@@ -396,21 +507,40 @@ class ComfyUIAPI:
         """
         不再直接 recv，而是从自己的队列里获取消息。
         """
+        with span("comfyui.track", prompt_id=prompt_id):
+            await self._track_progress(prompt_id)
+
+    async def _track_progress(self, prompt_id):
         q = self._prompt_events[prompt_id]
+        queued_at = time.perf_counter()
+        execution_start: Optional[float] = None
+        first_progress: Optional[float] = None
+        last_progress: Optional[float] = None
         try:
             while True:
                 message = await q.get()  # 从队列中获取属于自己的消息
 
                 logger.debug(f"Prompt {prompt_id} -> {message}")
 
+                if message["type"] == "execution_start":
+                    execution_start = time.perf_counter()
+                    COMFYUI_EXECUTION_WAIT.observe(execution_start - queued_at)
+
                 if message["type"] == "progress":
                     data = message["data"]
                     current_step = data["value"]
+                    last_progress = time.perf_counter()
+                    if first_progress is None:
+                        first_progress = last_progress
                     logger.debug(f"Prompt {prompt_id} -> Step: {current_step} of: {data['max']}")
 
                 # 当收到执行完成的信号时，任务结束
                 if message.get("type") == "executing" and message.get("data", {}).get("node") is None:
                     logger.success(f"Prompt {prompt_id} finished.")
+                    if execution_start is not None:
+                        COMFYUI_EXECUTION.observe(time.perf_counter() - execution_start)
+                    if first_progress is not None and last_progress is not None:
+                        COMFYUI_SAMPLER.observe(last_progress - first_progress)
                     break  # 退出循环
         finally:
             # 清理，防止内存泄漏
@@ -430,11 +560,44 @@ class ComfyUIAPI:
         await asyncio.sleep(60)
         while True:
             try:
-                self.__init__()
+                self.__init__(self.address)
                 break
             except Exception as e:
                 logger.warning(f"❌ [ComfyUI] 重启ComfyUI失败: {e}")
                 await asyncio.sleep(40)
 
 
-api = ComfyUIAPI()
+_api: Optional[ComfyUIAPI] = None
+_apis: Optional[List[ComfyUIAPI]] = None
+_cloud_api: Optional[ComfyUIAPI] = None
+
+
+def get_api() -> ComfyUIAPI:
+    """获取全局 ComfyUI 客户端（第一台机器），首次使用时才创建"""
+    global _api
+    if _api is None:
+        _api = ComfyUIAPI()
+    return _api
+
+
+def get_cloud_api() -> ComfyUIAPI:
+    """RunningHub ComfyUI 代理的客户端，用于本地机器繁忙时溢出"""
+    global _cloud_api
+    if _cloud_api is None:
+        _cloud_api = ComfyUIAPI("runninghub")
+    return _cloud_api
+
+
+def get_apis() -> List[ComfyUIAPI]:
+    """获取全部 ComfyUI 机器的客户端，第一台与 get_api() 为同一实例"""
+    global _apis
+    if _apis is None:
+        _apis = [get_api(), *(ComfyUIAPI(address) for address in base_addresses()[1:])]
+    return _apis
+
+
+def __getattr__(name: str):
+    # 兼容旧代码中的 comfyui_api.api
+    if name == "api":
+        return get_api()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
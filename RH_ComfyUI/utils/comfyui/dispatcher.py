@@ -0,0 +1,242 @@
+"""
+ComfyUI 模型亲和调度
+ComfyUI 切换工作流时需要卸载并重新加载模型，耗时往往超过采样本身。
+限制单机在途任务数时，任务在提交到 ComfyUI 前先在本地排队，每台机器同时只执行有限个任务，
+机器空闲时优先分配与其已加载模型相同的任务；等待超过公平窗口的任务不再让位，
+多台机器时同一模型族的任务优先路由到已加载该模型的机器。不限制时任务直接提交到在途任务最少的机器
+
+开启云端溢出后，本地排队过长或预计等待超出上限时，同一份工作流改为提交到 RunningHub ComfyUI 代理，
+每个任务的路由决策与云端占用时长记录在指标与任务追踪中
+"""
+
+import time
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, FrozenSet, AsyncIterator
+from contextlib import asynccontextmanager
+from collections import deque, defaultdict
+from dataclasses import field, dataclass
+
+from gsuid_core.logger import logger
+
+from ..metrics import COMFYUI_ROUTES, COMFYUI_MODEL_SWAPS, COMFYUI_CLOUD_SECONDS, COMFYUI_DISPATCH_WAIT
+from ..tracing import span
+from ..backend_health import mark_backend, backend_health
+from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+if TYPE_CHECKING:
+    from .comfyui_api import ComfyUIAPI
+
+# 加载器节点中表示模型文件的输入
+MODEL_FILE_SUFFIXES = (".safetensors", ".ckpt", ".pt", ".pth", ".gguf", ".bin", ".sft")
+
+# 没有历史数据时单个任务占用机器的预计秒数
+DEFAULT_JOB_SECONDS = 60
+
+
+def workflow_models(workflow: Dict) -> FrozenSet[str]:
+    """解析工作流中各加载器节点引用的模型文件"""
+    models = set()
+    for node in workflow.values():
+        if "Loader" not in node.get("class_type", ""):
+            continue
+        for value in node["inputs"].values():
+            if isinstance(value, str) and value.lower().endswith(MODEL_FILE_SUFFIXES):
+                models.add(value)
+    return frozenset(models)
+
+
+def _config_int(key: str, default: int) -> int:
+    try:
+        return int(RHCOMFYUI_CONFIG.get_config(key).data)
+    except Exception:
+        return default
+
+
+def _max_inflight() -> int:
+    """单机在途任务上限，0 表示不限制"""
+    return max(_config_int("ComfyUI_Max_Inflight", 0), 0)
+
+
+def _config_bool(key: str) -> bool:
+    try:
+        return bool(RHCOMFYUI_CONFIG.get_config(key).data)
+    except Exception:
+        return False
+
+
+@dataclass(eq=False)
+class _Box:
+    api: "ComfyUIAPI"
+    inflight: int = 0
+    loaded: FrozenSet[str] = frozenset()
+    last_used: float = 0
+
+
+@dataclass(eq=False)
+class _Job:
+    models: FrozenSet[str]
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class ComfyUIDispatcher:
+    def __init__(self) -> None:
+        self._boxes: Optional[List[_Box]] = None
+        self._pending: List[_Job] = []
+        self._durations: Dict[FrozenSet[str], deque] = defaultdict(lambda: deque(maxlen=20))
+
+    @property
+    def boxes(self) -> List[_Box]:
+        if self._boxes is None:
+            from .comfyui_api import get_apis
+
+            self._boxes = [_Box(api) for api in get_apis()]
+        return self._boxes
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _p50(self, models: FrozenSet[str]) -> float:
+        durations = self._durations.get(models)
+        if not durations:
+            return DEFAULT_JOB_SECONDS
+        return sorted(durations)[len(durations) // 2]
+
+    def estimate_wait(self) -> float:
+        """新任务在本地开始执行前的预计等待秒数"""
+        boxes = self.boxes
+        max_inflight = _max_inflight()
+        inflight = sum(b.inflight for b in boxes)
+        if not self._pending and (inflight == 0 if not max_inflight else inflight < len(boxes) * max_inflight):
+            return 0
+
+        # 执行中的任务按已完成一半估算
+        running = sum(self._p50(b.loaded) * b.inflight for b in boxes) / 2
+        queued = sum(self._p50(job.models) for job in self._pending)
+        return (running + queued) / len(boxes)
+
+    def can_overflow(self) -> bool:
+        """已开启云端溢出且 RunningHub 可用，本地 ComfyUI 熔断时模型仍可选择"""
+        if not _config_bool("Cloud_Overflow_Enable") or not RHCOMFYUI_CONFIG.get_config("RH_apikey").data:
+            return False
+        return any(b.api.backend == "comfyui" for b in self.boxes) and not backend_health.is_blocked("runninghub")
+
+    def _overflow_reason(self) -> Optional[str]:
+        """需要溢出到云端时返回原因，否则返回 None"""
+        if not self.can_overflow():
+            return None
+
+        if backend_health.is_blocked("comfyui"):
+            return "unhealthy"
+        max_queue = _config_int("Cloud_Overflow_Queue", 0)
+        if max_queue and len(self._pending) >= max_queue:
+            return "queue"
+        max_wait = _config_int("Cloud_Overflow_Wait_Seconds", 0)
+        if max_wait and self.estimate_wait() > max_wait:
+            return "wait"
+        return None
+
+    @asynccontextmanager
+    async def acquire(self, models: FrozenSet[str]) -> AsyncIterator["ComfyUIAPI"]:
+        """排队直到分配到一台机器，在该机器上完成上传、提交与取回结果后释放"""
+        reason = self._overflow_reason()
+        if reason is not None:
+            async with self._cloud(reason) as api:
+                yield api
+            return
+
+        COMFYUI_ROUTES.inc(target="local", reason="default")
+        job = _Job(models, asyncio.get_running_loop().create_future())
+        self._pending.append(job)
+        self._dispatch()
+
+        try:
+            with span("comfyui.dispatch", target="local", pending=len(self._pending)):
+                box: _Box = await job.future
+        except asyncio.CancelledError:
+            if job in self._pending:
+                self._pending.remove(job)
+            elif job.future.done() and not job.future.cancelled():
+                self._release(job.future.result())
+            raise
+        granted = time.monotonic()
+        COMFYUI_DISPATCH_WAIT.observe(granted - job.enqueued)
+
+        try:
+            yield box.api
+        finally:
+            self._durations[models].append(time.monotonic() - granted)
+            self._release(box)
+
+    @asynccontextmanager
+    async def _cloud(self, reason: str) -> AsyncIterator["ComfyUIAPI"]:
+        from .comfyui_api import get_cloud_api
+
+        COMFYUI_ROUTES.inc(target="cloud", reason=reason)
+        # 云端任务的成败计入 RunningHub，不影响本地 ComfyUI 的熔断与路由统计
+        mark_backend("runninghub")
+        logger.info(f"☁️ [ComfyUI] 本地排队 {len(self._pending)} 个任务 ({reason})，溢出到 RunningHub 代理")
+        start = time.monotonic()
+        with span("comfyui.dispatch", target="cloud", reason=reason) as route_span:
+            try:
+                yield get_cloud_api()
+            finally:
+                # RunningHub 按占用时长计费，记录到任务追踪中
+                seconds = time.monotonic() - start
+                COMFYUI_CLOUD_SECONDS.inc(seconds)
+                if route_span:
+                    route_span.set_attr(cloud_seconds=round(seconds, 2))
+
+    def _release(self, box: _Box) -> None:
+        box.inflight -= 1
+        box.last_used = time.monotonic()
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        max_inflight = _max_inflight()
+        while self._pending:
+            free = [b for b in self.boxes if not max_inflight or b.inflight < max_inflight]
+            if not free:
+                return
+
+            job, box = self._pick(free)
+            self._pending.remove(job)
+            if job.future.done():
+                continue
+
+            if job.models and box.loaded and box.loaded != job.models:
+                COMFYUI_MODEL_SWAPS.inc(address=box.api.address)
+                logger.debug(f"[RHComfyUI][Dispatch] {box.api.address} 切换模型: {sorted(job.models)}")
+            if job.models:
+                box.loaded = job.models
+            box.inflight += 1
+            job.future.set_result(box)
+
+    def _pick(self, free: List[_Box]) -> Tuple[_Job, _Box]:
+        oldest = self._pending[0]
+        window = _config_int("Affinity_Window_Seconds", 60)
+        if window <= 0 or time.monotonic() - oldest.enqueued >= window:
+            return oldest, self._best_box(oldest, free)
+
+        # 空闲机器上已加载了该任务所需的模型
+        for job in self._pending:
+            for box in free:
+                if job.models and box.loaded == job.models:
+                    return job, box
+
+        # 不与正在其他机器上运行的模型争抢
+        busy = {b.loaded for b in self.boxes if b.inflight and b not in free}
+        for job in self._pending:
+            if job.models not in busy:
+                return job, self._best_box(job, free)
+
+        return oldest, self._best_box(oldest, free)
+
+    @staticmethod
+    def _best_box(job: _Job, free: List[_Box]) -> _Box:
+        """在途任务最少的机器 > 已加载该模型的机器 > 尚未加载任何模型的机器 > 最久未使用的机器"""
+        return min(free, key=lambda b: (b.inflight, b.loaded != job.models, bool(b.loaded), b.last_used))
+
+
+comfyui_dispatcher = ComfyUIDispatcher()
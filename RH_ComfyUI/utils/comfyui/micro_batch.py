@@ -0,0 +1,184 @@
+"""
+ComfyUI 跨用户微批处理
+在短时间窗口内收集同一模型、同一尺寸的文生图请求，合并为一个工作流提交：
+加载器、LoRA、负面提示词等与请求无关的节点只保留一份，随请求变化的子图
+（提示词编码 → 采样 → 解码 → 保存）按请求复制，出图后按 SaveImage 节点 ID 拆分回各个请求
+"""
+
+import copy
+import asyncio
+from typing import Any, Set, Dict, List, Tuple, Callable, Iterable, Optional
+from pathlib import Path
+from dataclasses import field, dataclass
+
+from gsuid_core.logger import logger
+
+from ..metrics import COMFYUI_MICRO_BATCH
+from ..tracing import Span, span, attach_spans, collect_spans
+from .dispatcher import workflow_models, comfyui_dispatcher
+from ..backend_health import BackendTrace, merge_backend, track_backend
+from ..resource.RESOURCE_PATH import load_workflow
+from ...rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 每个请求各自的输出节点
+_OUTPUT_TYPES = ("SaveImage",)
+
+
+@dataclass(frozen=True)
+class BatchSpec:
+    """
+    可微批的工作流
+
+    roots 为随请求变化的节点，其下游节点都会按请求复制；
+    apply(workflow, ids, **params) 按 原节点ID → 本请求节点ID 的映射写入请求参数
+    """
+
+    name: str
+    workflow_path: Path
+    roots: Tuple[str, ...]
+    apply: Callable[..., None]
+
+
+@dataclass
+class _Pending:
+    spec: BatchSpec
+    params: Dict[str, Any]
+    future: asyncio.Future
+    # 合并提交的后端记录与阶段耗时，由每个请求合并到自己的模型调用与追踪记录中
+    trace: Optional[BackendTrace] = None
+    spans: List[Span] = field(default_factory=list)
+
+
+def downstream_nodes(workflow: Dict[str, Dict], roots: Iterable[str]) -> Set[str]:
+    """返回 roots 及所有直接或间接依赖它们的节点"""
+    result = set(roots)
+    changed = True
+    while changed:
+        changed = False
+        for node_id, node in workflow.items():
+            if node_id in result:
+                continue
+            for value in node["inputs"].values():
+                if isinstance(value, list) and len(value) == 2 and value[0] in result:
+                    result.add(node_id)
+                    changed = True
+                    break
+    return result
+
+
+def build_batch_workflow(spec: BatchSpec, params_list: List[Dict[str, Any]]) -> Tuple[Dict, List[List[str]]]:
+    """
+    合并多个请求为一个工作流
+
+    返回 (工作流, 每个请求对应的输出节点 ID 列表)，第一个请求沿用原节点 ID
+    """
+    workflow = load_workflow(spec.workflow_path)
+    cloned = sorted(downstream_nodes(workflow, spec.roots), key=int)
+    template = {node_id: copy.deepcopy(workflow[node_id]) for node_id in cloned}
+    next_id = max(int(i) for i in workflow if i.isdigit()) + 1
+
+    outputs: List[List[str]] = []
+    for index, params in enumerate(params_list):
+        if index == 0:
+            ids = {node_id: node_id for node_id in cloned}
+        else:
+            ids = {node_id: str(next_id + n) for n, node_id in enumerate(cloned)}
+            next_id += len(cloned)
+            for node_id, new_id in ids.items():
+                node = copy.deepcopy(template[node_id])
+                for key, value in node["inputs"].items():
+                    if isinstance(value, list) and len(value) == 2 and value[0] in ids:
+                        node["inputs"][key] = [ids[value[0]], value[1]]
+                workflow[new_id] = node
+
+        spec.apply(workflow, ids, **params)
+        outputs.append([ids[i] for i in cloned if template[i]["class_type"] in _OUTPUT_TYPES])
+    return workflow, outputs
+
+
+class MicroBatcher:
+    """按 (模型, 合并键) 分组收集请求，窗口到期或达到上限时合并提交"""
+
+    def __init__(self) -> None:
+        self._groups: Dict[Tuple, List[_Pending]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(RHCOMFYUI_CONFIG.get_config("Micro_Batch_Enable").data)
+
+    async def submit(self, spec: BatchSpec, key: Tuple, **params):
+        """加入等待队列并等待合并执行的结果（单张图片）"""
+        loop = asyncio.get_running_loop()
+        group_key = (spec.name, *key)
+        group = self._groups.setdefault(group_key, [])
+        pending = _Pending(spec, params, loop.create_future())
+        group.append(pending)
+
+        max_size = max(int(RHCOMFYUI_CONFIG.get_config("Micro_Batch_Max").data), 1)
+        if len(group) >= max_size:
+            self._flush(group_key)
+        elif len(group) == 1:
+            window = int(RHCOMFYUI_CONFIG.get_config("Micro_Batch_Window_MS").data) / 1000
+            self._timers[group_key] = loop.call_later(window, self._flush, group_key)
+
+        try:
+            return await pending.future
+        finally:
+            if pending.trace is not None:
+                merge_backend(pending.trace)
+                attach_spans(pending.spans)
+
+    def _flush(self, group_key: Tuple) -> None:
+        timer = self._timers.pop(group_key, None)
+        if timer is not None:
+            timer.cancel()
+
+        group = self._groups.pop(group_key, [])
+        if group:
+            task = asyncio.create_task(self._run(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: List[_Pending]) -> None:
+        # 等待期间已取消的请求不再提交
+        items = [p for p in group if not p.future.done()]
+        if not items:
+            return
+
+        spec = items[0].spec
+        COMFYUI_MICRO_BATCH.observe(len(items), model=spec.name)
+        logger.info(f"🧩 [ComfyUI] {spec.name} 合并 {len(items)} 个请求提交")
+
+        # 合并任务在触发提交的请求的上下文中运行，单独记录后端与 span，再分发给每个请求
+        error = None
+        with track_backend() as trace, collect_spans() as spans:
+            try:
+                with span("comfyui.micro_batch", model=spec.name, size=len(items)):
+                    workflow, outputs = build_batch_workflow(spec, [p.params for p in items])
+                    async with comfyui_dispatcher.acquire(workflow_models(workflow)) as api:
+                        by_node = await api.generate_images_by_node(workflow)
+            except Exception as e:
+                error = e
+
+        for p in items:
+            p.trace = trace
+            p.spans = spans
+        if error is not None:
+            for p in items:
+                if not p.future.done():
+                    p.future.set_exception(error)
+            return
+
+        for p, node_ids in zip(items, outputs):
+            if p.future.done():
+                continue
+            images = [image for node_id in node_ids for image in by_node.get(node_id, [])]
+            if images:
+                p.future.set_result(images[0])
+            else:
+                p.future.set_exception(ValueError("🚫 [ComfyUI失败] 合并提交的工作流缺少该请求的输出！"))
+
+
+micro_batcher = MicroBatcher()
@@ -3,9 +3,45 @@
 MODEL_PRIORITY = {
     "text2image": ["qwen_2512", "banana2", "banana_pro"],
     "image2image": ["qwen_2512_img2img"],
-    "image_edit": ["qwen_2511", "banana2", "banana_pro"],
+    "image_edit": ["qwen_2511", "banana2_edit", "banana_pro_edit"],
     "text2video": ["wan2.2_text2video"],
     "image2video": ["wan2.2_img2video"],
     "music": ["ace_step1.5"],
     "speech": ["IndexTTS2"],
 }
+
+# ===== 路由先验耗时 =====
+# 模型还没有历史耗时数据时，用于估算完成时间（秒）
+DEFAULT_EXPECTED_SECONDS = {
+    "text2image": 30,
+    "image2image": 30,
+    "image_edit": 40,
+    "text2video": 300,
+    "image2video": 300,
+    "music": 60,
+    "speech": 20,
+}
+
+# 各后端可同时处理的任务数，用于把排队深度换算为等待时间
+BACKEND_PARALLELISM = {
+    "comfyui": 1,
+    "blt": 8,
+    "runninghub": 4,
+}
+
+# ===== BLT 图片返回格式 =====
+# 优先使用 b64_json 随响应返回图片，省去一次 CDN 下载；不支持 b64_json 的模型在此声明为 url，
+# 未声明的模型先尝试 b64_json，服务端拒绝时自动退回 url
+BLT_RESPONSE_FORMAT = {
+    "gemini-3.1-flash-image-preview": "b64_json",
+    "nano-banana-2-2k": "b64_json",
+}
+
+# ===== BLT 图片编辑参考图的最长边 =====
+# 参考图以 multipart 原始字节上传到 /v1/images/edits；模型输出为 2K，
+# 超过该尺寸的参考图不会带来更好的结果，上传前等比缩小，未声明的模型使用 BLT_EDIT_DEFAULT_MAX_SIDE
+BLT_EDIT_MAX_SIDE = {
+    "gemini-3.1-flash-image-preview": 2048,
+    "nano-banana-2-2k": 2048,
+}
+BLT_EDIT_DEFAULT_MAX_SIDE = 2048
@@ -0,0 +1,213 @@
+"""
+生成任务公平调度
+所有生成任务在选择并调用 MODEL_REGISTRY 模型前先在此排队：
+- 并发上限：全局、每用户、每群、每类别（视频等昂贵类别单独限额，不会占满全部并发）
+- 排队顺序：起始时间公平队列，每个任务按 积分/权重 推进所属用户的虚拟时间，
+  同一用户连续提交的任务会排在其他用户之后，管理员与积分 VIP 的权重更高
+受限于类别或群上限而无法执行的任务不会阻塞后面的其他任务
+"""
+
+import time
+import asyncio
+import itertools
+from typing import Dict, List, Optional, AsyncIterator
+from contextlib import asynccontextmanager
+from collections import Counter
+from dataclasses import dataclass
+
+from gsuid_core.models import Event
+
+from .metrics import SCHEDULER_WAIT, SCHEDULER_QUEUE
+from .tracing import span
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 各类别单次任务消耗的积分配置项，作为调度成本
+CATEGORY_POINT_CONFIG: Dict[str, str] = {
+    "text2image": "Draw_Point",
+    "image2image": "Draw_Point",
+    "image_edit": "Edit_Image_Point",
+    "music": "Music_Point",
+    "speech": "Speech_Point",
+    "text2video": "Video_Point",
+    "image2video": "Video_Point",
+}
+
+
+def _config_int(key: str, default: int = 0) -> int:
+    try:
+        return int(RHCOMFYUI_CONFIG.get_config(key).data)
+    except Exception:
+        return default
+
+
+def parse_category_limits(text: str) -> Dict[str, int]:
+    """解析 `text2video:1,image2video:1` 格式的类别并发限额"""
+    limits: Dict[str, int] = {}
+    for item in text.split(","):
+        category, _, value = item.partition(":")
+        if category.strip() and value.strip().isdigit():
+            limits[category.strip()] = int(value)
+    return limits
+
+
+@dataclass(frozen=True)
+class Requester:
+    """发起任务的用户，私聊时 group 为空"""
+
+    user: str
+    group: str
+    weight: float
+
+
+ANONYMOUS = Requester(user="", group="", weight=1)
+
+
+async def resolve_requester(ev: Optional[Event]) -> Requester:
+    """根据事件确定用户、群与调度权重"""
+    if ev is None:
+        return ANONYMOUS
+
+    weight = 1
+    if ev.user_pm == 0:
+        weight = _config_int("Queue_Admin_Weight", 1)
+    else:
+        vip_point = _config_int("Queue_VIP_Point")
+        if vip_point > 0:
+            from .database.models import RHBind
+
+            if await RHBind.get_point(ev.user_id, ev.bot_id) >= vip_point:
+                weight = _config_int("Queue_VIP_Weight", 1)
+
+    group = f"{ev.bot_id}:{ev.group_id}" if ev.group_id else ""
+    return Requester(user=f"{ev.bot_id}:{ev.user_id}", group=group, weight=max(weight, 1))
+
+
+@dataclass(eq=False)
+class _Ticket:
+    requester: Requester
+    category: str
+    tag: float
+    seq: int
+    future: asyncio.Future
+    granted: bool = False
+
+
+class FairScheduler:
+    def __init__(self) -> None:
+        self._waiting: List[_Ticket] = []
+        self._running = 0
+        self._running_user: Counter = Counter()
+        self._running_group: Counter = Counter()
+        self._running_category: Counter = Counter()
+        self._finish: Dict[str, float] = {}
+        self._vclock = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def waiting_in(self, category: str) -> int:
+        return sum(1 for t in self._waiting if t.category == category)
+
+    def cost(self, category: str, batch: int = 1) -> int:
+        point = _config_int(CATEGORY_POINT_CONFIG.get(category, "Draw_Point"), 1)
+        return max(point, 1) * max(batch, 1)
+
+    @asynccontextmanager
+    async def slot(self, ev: Optional[Event], category: str, batch: int = 1) -> AsyncIterator[None]:
+        """排队直到可以执行，退出时释放并发名额"""
+        requester = await resolve_requester(ev)
+        ticket = self._enqueue(requester, category, self.cost(category, batch))
+        start = time.perf_counter()
+        try:
+            with span("scheduler.wait", category=category, weight=requester.weight):
+                await ticket.future
+        except asyncio.CancelledError:
+            if ticket.granted:
+                self._release(ticket)
+            else:
+                self._waiting.remove(ticket)
+                self._update_gauge()
+            raise
+        SCHEDULER_WAIT.observe(time.perf_counter() - start, category=category)
+
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def _enqueue(self, requester: Requester, category: str, cost: int) -> _Ticket:
+        tag = max(self._vclock, self._finish.get(requester.user, 0.0))
+        self._finish[requester.user] = tag + cost / requester.weight
+        ticket = _Ticket(
+            requester=requester,
+            category=category,
+            tag=tag,
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _can_run(self, ticket: _Ticket) -> bool:
+        max_total = _config_int("Queue_Max_Concurrency")
+        if max_total and self._running >= max_total:
+            return False
+
+        max_user = _config_int("Queue_User_Concurrency")
+        if max_user and ticket.requester.user and self._running_user[ticket.requester.user] >= max_user:
+            return False
+
+        max_group = _config_int("Queue_Group_Concurrency")
+        if max_group and ticket.requester.group and self._running_group[ticket.requester.group] >= max_group:
+            return False
+
+        limits = parse_category_limits(str(RHCOMFYUI_CONFIG.get_config("Queue_Category_Limits").data))
+        limit = limits.get(ticket.category)
+        return not limit or self._running_category[ticket.category] < limit
+
+    def _dispatch(self) -> None:
+        while self._waiting:
+            eligible = [t for t in self._waiting if not t.future.done() and self._can_run(t)]
+            if not eligible:
+                break
+
+            ticket = min(eligible, key=lambda t: (t.tag, t.seq))
+            self._waiting.remove(ticket)
+            self._vclock = max(self._vclock, ticket.tag)
+            self._running += 1
+            self._running_user[ticket.requester.user] += 1
+            self._running_group[ticket.requester.group] += 1
+            self._running_category[ticket.category] += 1
+            ticket.granted = True
+            ticket.future.set_result(None)
+        self._update_gauge()
+
+    def _release(self, ticket: _Ticket) -> None:
+        self._running -= 1
+        for counter, key in (
+            (self._running_user, ticket.requester.user),
+            (self._running_group, ticket.requester.group),
+            (self._running_category, ticket.category),
+        ):
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+
+        # 虚拟时间已落后于全局时钟的用户无需保留
+        if len(self._finish) > 1024:
+            self._finish = {k: v for k, v in self._finish.items() if v > self._vclock}
+        self._dispatch()
+
+    def _update_gauge(self) -> None:
+        SCHEDULER_QUEUE.set(len(self._waiting), state="waiting")
+        SCHEDULER_QUEUE.set(self._running, state="running")
+
+
+fair_scheduler = FairScheduler()
@@ -0,0 +1,129 @@
+"""
+对冲请求
+主模型超过其滚动 p95 耗时仍未返回时，向另一后端的同类别模型再发一次相同的请求，
+取先成功返回的结果并取消另一个（ComfyUI 上的任务会从队列删除或中断）。
+对冲产生的额外成本按每小时预算封顶
+"""
+
+import time
+import asyncio
+from typing import Any, Tuple, Callable, Optional
+from collections import deque
+
+from gsuid_core.logger import logger
+
+from .metrics import HEDGE_REQUESTS
+from .tracing import span
+from .model_router import model_router
+from .model_registry import MODEL_REGISTRY, run_model, supersede, is_failed_result, get_available_models
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 滚动耗时样本不足时不对冲，p95 不可信
+MIN_SAMPLES = 10
+
+# 对冲预算的统计窗口
+BUDGET_WINDOW = 3600
+
+
+class HedgeBudget:
+    """最近一小时对冲请求的额外成本"""
+
+    def __init__(self) -> None:
+        self._spent: deque = deque()
+
+    def spent(self) -> float:
+        cutoff = time.monotonic() - BUDGET_WINDOW
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(cost for _, cost in self._spent)
+
+    def try_spend(self, cost: float) -> bool:
+        budget = int(RHCOMFYUI_CONFIG.get_config("Hedge_Budget_Per_Hour").data)
+        if cost > 0 and self.spent() + cost > budget:
+            return False
+        self._spent.append((time.monotonic(), cost))
+        return True
+
+
+hedge_budget = HedgeBudget()
+
+
+def hedge_delay(model_name: str) -> Optional[float]:
+    """主模型的 p95 耗时，样本不足时返回 None"""
+    stats = model_router.stats(model_name)
+    if len(stats.durations) < MIN_SAMPLES:
+        return None
+    return stats.p95
+
+
+async def pick_secondary(model_name: str) -> Optional[str]:
+    """同类别、不同后端中评分最好的可用模型"""
+    primary = MODEL_REGISTRY[model_name]
+    candidates = [
+        name
+        for name in get_available_models(primary.category)
+        if name != model_name and MODEL_REGISTRY[name].backend != primary.backend
+    ]
+    ranked = await model_router.rank(candidates, MODEL_REGISTRY, primary.category)
+    return ranked[0][0] if ranked else None
+
+
+def _succeeded(task: asyncio.Task) -> bool:
+    return not task.cancelled() and task.exception() is None and not is_failed_result(task.result())
+
+
+async def _first_success(primary: asyncio.Task, secondary: asyncio.Task) -> Tuple[str, Any]:
+    """返回 (胜出方, 结果)，两者都失败时返回主模型的结果"""
+    pending = {primary, secondary}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if _succeeded(task):
+                return ("primary" if task is primary else "secondary"), task.result()
+    return "none", primary.result()
+
+
+async def run_hedged(model_name: str, model_func: Callable, *args, **kwargs) -> Any:
+    """
+    调用模型函数，开启对冲时在主模型超过 p95 后向备选模型发出对冲请求
+
+    未开启、样本不足、没有备选模型或超出预算时与 run_model 相同
+    """
+    delay = hedge_delay(model_name) if RHCOMFYUI_CONFIG.get_config("Hedge_Enable").data else None
+    if delay is None or model_name not in MODEL_REGISTRY:
+        return await run_model(model_name, model_func, *args, **kwargs)
+
+    primary = asyncio.create_task(run_model(model_name, model_func, *args, **kwargs))
+    secondary: Optional[asyncio.Task] = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        secondary_name = await pick_secondary(model_name)
+        if secondary_name is None:
+            HEDGE_REQUESTS.inc(model=model_name, result="no_secondary")
+            return await primary
+        if not hedge_budget.try_spend(MODEL_REGISTRY[secondary_name].cost):
+            HEDGE_REQUESTS.inc(model=model_name, result="over_budget")
+            return await primary
+
+        logger.info(f"[RHComfyUI][Hedge] {model_name} 超过 p95 {delay:.1f}s 未返回，对冲到 {secondary_name}")
+        with span("registry.hedge", primary=model_name, secondary=secondary_name, delay=round(delay, 2)) as hedge_span:
+            secondary = asyncio.create_task(
+                run_model(secondary_name, MODEL_REGISTRY[secondary_name].func, *args, **kwargs)
+            )
+            winner, result = await _first_success(primary, secondary)
+            if hedge_span:
+                hedge_span.set_attr(winner=winner)
+        # 落后方的已耗时计为其耗时下限
+        for task in (primary, secondary):
+            if not task.done():
+                supersede(task)
+        HEDGE_REQUESTS.inc(model=model_name, result=winner)
+        return result
+    finally:
+        # 调用方被取消时取消全部请求，不计入耗时
+        for task in (primary, secondary):
+            if task is not None and not task.done():
+                task.cancel()
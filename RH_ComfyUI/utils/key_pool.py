@@ -0,0 +1,183 @@
+"""
+API Key 池
+RH_apikey / BLT_apikey 可填写多个以逗号分隔的 Key，每个 Key 有独立的并发上限与令牌桶（见 rate_limiter）。
+请求时选择未停用、未被限速且进行中请求最少的 Key；返回 401/402 的 Key 停用一段时间，
+被限速（421/429）的 Key 在令牌桶暂停期间优先让给其他 Key。指标中只记录脱敏后的 Key
+"""
+
+import time
+import asyncio
+from typing import Dict, List, Union, Optional, AsyncIterator
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from gsuid_core.logger import logger
+
+from .metrics import API_KEY_BENCHED, API_KEY_INFLIGHT, API_KEY_REQUESTS, mask_key
+from .rate_limiter import rate_limiter
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 鉴权失败 / 余额不足，停用该 Key
+AUTH_FAILED_STATUS = (401, 402)
+AUTH_BENCH_SECONDS = 600
+
+
+def split_keys(value: str) -> List[str]:
+    return [key.strip() for key in str(value or "").split(",") if key.strip()]
+
+
+@dataclass(eq=False)
+class PoolKey:
+    key: str
+    label: str
+    inflight: int = 0
+    benched_until: float = 0
+    last_used: float = 0
+
+    @property
+    def benched(self) -> bool:
+        return time.monotonic() < self.benched_until
+
+
+class KeyPool:
+    def __init__(self, provider: str, keys_config: str, concurrency_config: str):
+        self.provider = provider
+        self.keys_config = keys_config
+        self.concurrency_config = concurrency_config
+        self._raw: Optional[str] = None
+        self._keys: Dict[str, PoolKey] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._bound: ContextVar[Optional[PoolKey]] = ContextVar(f"rh_key_{provider}", default=None)
+
+    def keys(self) -> List[PoolKey]:
+        """当前配置中的 Key，配置变更后保留已有 Key 的状态"""
+        raw = str(RHCOMFYUI_CONFIG.get_config(self.keys_config).data or "")
+        if raw != self._raw:
+            self._raw = raw
+            self._keys = {key: self._keys.get(key) or PoolKey(key, mask_key(key)) for key in split_keys(raw)}
+        return list(self._keys.values())
+
+    def primary(self) -> str:
+        """第一个 Key，用于不经过 Key 池的场景（如 ComfyUI 代理地址、健康探测）"""
+        keys = self.keys()
+        return keys[0].key if keys else ""
+
+    @property
+    def concurrency(self) -> int:
+        """每个 Key 同时进行的请求数，0 为不限制"""
+        try:
+            return int(RHCOMFYUI_CONFIG.get_config(self.concurrency_config).data)
+        except Exception:
+            return 0
+
+    def _has_capacity(self, key: PoolKey) -> bool:
+        return self.concurrency <= 0 or key.inflight < self.concurrency
+
+    def _pick(self, require_capacity: bool) -> Optional[PoolKey]:
+        """未被限速 > 进行中请求最少 > 最久未使用"""
+        candidates = [k for k in self.keys() if not k.benched]
+        if require_capacity:
+            candidates = [k for k in candidates if self._has_capacity(k)]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda k: (rate_limiter.paused(self.provider, k.key), k.inflight, k.last_used),
+        )
+
+    def current(self) -> Optional[str]:
+        """本次请求应使用的 Key：已绑定的 Key（已停用时为 None），否则选择负载最低的 Key"""
+        key = self._bound.get() or self._pick(require_capacity=False)
+        if key is None or key.benched:
+            return None
+        key.last_used = time.monotonic()
+        return key.key
+
+    @contextmanager
+    def pin(self):
+        """在当前上下文中固定使用同一个 Key（如上传的文件与提交任务需属于同一账号）"""
+        if self._bound.get() is not None:
+            yield self._bound.get()
+            return
+        key = self._pick(require_capacity=False)
+        token = self._bound.set(key)
+        try:
+            yield key
+        finally:
+            self._bound.reset(token)
+
+    async def _wait(self, bound: Optional[PoolKey]) -> Optional[PoolKey]:
+        while True:
+            if bound is not None:
+                if bound.benched:
+                    return None
+                if self._has_capacity(bound):
+                    return bound
+            else:
+                key = self._pick(require_capacity=True)
+                if key is not None or not any(not k.benched for k in self.keys()):
+                    return key
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Optional[str]]:
+        """
+        占用一个 Key 的并发名额并绑定到当前上下文
+
+        没有配置 Key 或全部 Key 已停用时返回 None
+        """
+        key = await self._wait(self._bound.get())
+        if key is None:
+            yield None
+            return
+
+        key.inflight += 1
+        key.last_used = time.monotonic()
+        API_KEY_INFLIGHT.set(key.inflight, provider=self.provider, key=key.label)
+        token = self._bound.set(key)
+        try:
+            yield key.key
+        finally:
+            self._bound.reset(token)
+            key.inflight -= 1
+            API_KEY_INFLIGHT.set(key.inflight, provider=self.provider, key=key.label)
+            self._wake()
+
+    def _wake(self) -> None:
+        for future in self._waiters:
+            if not future.done():
+                future.set_result(None)
+        self._waiters.clear()
+
+    def record(self, key: str, status: Union[int, str]) -> bool:
+        """
+        记录一次请求结果，鉴权失败时停用该 Key
+
+        返回是否还有其他可用的 Key 可以重试
+        """
+        pool_key = self._keys.get(key)
+        if pool_key is None:
+            return False
+        API_KEY_REQUESTS.inc(provider=self.provider, key=pool_key.label, status=status)
+        if status not in AUTH_FAILED_STATUS:
+            return False
+
+        pool_key.benched_until = time.monotonic() + AUTH_BENCH_SECONDS
+        API_KEY_BENCHED.inc(provider=self.provider, key=pool_key.label, status=status)
+        logger.warning(
+            f"[RHComfyUI][KeyPool] {self.provider} Key {pool_key.label} 返回 {status}，停用 {AUTH_BENCH_SECONDS}s"
+        )
+        self._wake()
+        return any(not k.benched for k in self.keys())
+
+
+rh_keys = KeyPool("runninghub", "RH_apikey", "RH_Max_Concurrency")
+blt_keys = KeyPool("blt", "BLT_apikey", "BLT_Key_Concurrency")
@@ -0,0 +1,506 @@
+"""
+性能指标模块
+提供 Prometheus 文本格式的计数器与直方图，统一记录生成流水线各阶段的耗时与流量
+"""
+
+import time
+import bisect
+from typing import Dict, List, Tuple, Union, Iterator, Optional, Sequence
+from contextlib import contextmanager
+
+LabelValues = Tuple[str, ...]
+
+# 默认耗时分桶（秒），覆盖从接口调用到视频生成的量级
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def mask_key(key: str) -> str:
+    """用于日志与指标的脱敏 Key"""
+    if len(key) <= 8:
+        return f"{key[:2]}***"
+    return f"{key[:4]}***{key[-4:]}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        pairs.extend(f'{k}="{_escape(v)}"' for k, v in extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """指标基类"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+
+    def _label_values(self, labels: Dict[str, Union[str, int]]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[k]) for k in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Union[str, int]) -> None:
+        key = self._label_values(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: Union[str, int]) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        return list(self._values.items())
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Union[str, int]) -> None:
+        self._values[self._label_values(labels)] = value
+
+    def get(self, **labels: Union[str, int]) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def items(self) -> List[Tuple[LabelValues, float]]:
+        return list(self._values.items())
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, bucket_num: int):
+        self.counts: List[int] = [0] * bucket_num
+        self.sum: float = 0
+        self.count: int = 0
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self._children: Dict[LabelValues, _HistogramChild] = {}
+
+    def observe(self, value: float, **labels: Union[str, int]) -> None:
+        key = self._label_values(labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _HistogramChild(len(self.buckets))
+
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            child.counts[index] += 1
+        child.sum += value
+        child.count += 1
+
+    @contextmanager
+    def time(self, **labels: Union[str, int]) -> Iterator[None]:
+        """记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summary(self, **labels: Union[str, int]) -> Tuple[int, float]:
+        """返回 (样本数, 总和)"""
+        child = self._children.get(self._label_values(labels))
+        if child is None:
+            return 0, 0
+        return child.count, child.sum
+
+    def items(self) -> List[Tuple[LabelValues, int, float]]:
+        return [(key, child.count, child.sum) for key, child in self._children.items()]
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {child.count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标重复注册时返回已有实例"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"指标 {name} 已注册为 {metric.type_name}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ===== RunningHub =====
+RH_QUEUE_WAIT = REGISTRY.histogram(
+    "rhcomfyui_rh_queue_wait_seconds",
+    "RunningHub AI 应用任务在本地等待并发名额的耗时",
+)
+RH_RETRIES = REGISTRY.counter(
+    "rhcomfyui_rh_retries_total",
+    "RunningHub _rh_request 的重试次数",
+    ["reason"],
+)
+RH_COMPLETIONS = REGISTRY.counter(
+    "rhcomfyui_rh_completions_total",
+    "RunningHub 任务结果的获取方式 (webhook/poll)",
+    ["source"],
+)
+RH_RATE_LIMITED = REGISTRY.counter(
+    "rhcomfyui_rh_rate_limited_total",
+    "RunningHub 返回 421 后触发的退避次数",
+)
+
+# ===== ComfyUI =====
+COMFYUI_QUEUE_PROMPT = REGISTRY.histogram(
+    "rhcomfyui_comfyui_queue_prompt_seconds",
+    "ComfyUI queue_prompt 提交耗时",
+)
+COMFYUI_EXECUTION_WAIT = REGISTRY.histogram(
+    "rhcomfyui_comfyui_execution_wait_seconds",
+    "ComfyUI 从提交到开始执行的排队耗时（来自 WS 事件）",
+)
+COMFYUI_SAMPLER = REGISTRY.histogram(
+    "rhcomfyui_comfyui_sampler_seconds",
+    "ComfyUI 采样耗时（首个到最后一个 progress 事件）",
+)
+COMFYUI_EXECUTION = REGISTRY.histogram(
+    "rhcomfyui_comfyui_execution_seconds",
+    "ComfyUI 工作流执行总耗时（来自 WS 事件）",
+)
+COMFYUI_HISTORY = REGISTRY.histogram(
+    "rhcomfyui_comfyui_history_seconds",
+    "ComfyUI /history 查询耗时",
+)
+COMFYUI_DISPATCH_WAIT = REGISTRY.histogram(
+    "rhcomfyui_comfyui_dispatch_wait_seconds",
+    "ComfyUI 任务在本地模型亲和调度队列中的等待耗时",
+)
+COMFYUI_MODEL_SWAPS = REGISTRY.counter(
+    "rhcomfyui_comfyui_model_swaps_total",
+    "分配任务时 ComfyUI 机器需要切换模型的次数",
+    ["address"],
+)
+COMFYUI_ROUTES = REGISTRY.counter(
+    "rhcomfyui_comfyui_routes_total",
+    "ComfyUI 任务的路由决策 (local/cloud) 及原因",
+    ["target", "reason"],
+)
+COMFYUI_CLOUD_SECONDS = REGISTRY.counter(
+    "rhcomfyui_comfyui_cloud_seconds_total",
+    "溢出到 RunningHub 代理的任务占用时长（按时长计费）",
+)
+COMFYUI_MICRO_BATCH = REGISTRY.histogram(
+    "rhcomfyui_comfyui_micro_batch_size",
+    "ComfyUI 跨用户微批合并提交的请求数",
+    ["model"],
+    buckets=(1, 2, 3, 4, 6, 8),
+)
+
+# ===== 通用传输 =====
+DOWNLOAD_SECONDS = REGISTRY.histogram(
+    "rhcomfyui_download_seconds",
+    "生成结果下载耗时",
+    ["backend"],
+)
+UPLOAD_SECONDS = REGISTRY.histogram(
+    "rhcomfyui_upload_seconds",
+    "输入文件上传耗时",
+    ["backend"],
+)
+TRANSFER_BYTES = REGISTRY.counter(
+    "rhcomfyui_transfer_bytes_total",
+    "与后端之间传输的字节数",
+    ["backend", "direction"],
+)
+
+# ===== BLT =====
+BLT_RESPONSES = REGISTRY.counter(
+    "rhcomfyui_blt_responses_total",
+    "BLT 接口返回的 HTTP 状态码计数",
+    ["status"],
+)
+BLT_RESPONSE_FORMATS = REGISTRY.counter(
+    "rhcomfyui_blt_response_format_total",
+    "BLT 生图请求最终使用的返回格式 (b64_json/url)",
+    ["model", "format"],
+)
+BLT_FIRST_BYTE = REGISTRY.histogram(
+    "rhcomfyui_blt_first_byte_seconds",
+    "BLT 请求发出到收到首个响应数据的耗时（流式请求为首个 SSE 事件）",
+    ["stream"],
+)
+
+# ===== 后端健康 =====
+BACKEND_CIRCUIT_STATE = REGISTRY.gauge(
+    "rhcomfyui_backend_circuit_state",
+    "后端熔断状态 (0=closed, 1=half_open, 2=open)",
+    ["backend"],
+)
+BACKEND_FAILURES = REGISTRY.counter(
+    "rhcomfyui_backend_failures_total",
+    "后端被动/主动检测到的失败次数",
+    ["backend", "source"],
+)
+
+# ===== 限速 =====
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "rhcomfyui_rate_limit_wait_seconds",
+    "请求在本地令牌桶中等待放行的耗时",
+    ["provider"],
+)
+RATE_LIMIT_THROTTLED = REGISTRY.counter(
+    "rhcomfyui_rate_limit_throttled_total",
+    "后端返回 421/429 的次数",
+    ["provider"],
+)
+RATE_LIMIT_RPS = REGISTRY.gauge(
+    "rhcomfyui_rate_limit_rps",
+    "各 API Key（脱敏）当前放行速率（请求/秒），限速后降低并逐步恢复",
+    ["provider", "key"],
+)
+
+# ===== API Key 池 =====
+API_KEY_REQUESTS = REGISTRY.counter(
+    "rhcomfyui_api_key_requests_total",
+    "各 API Key（脱敏）的请求次数与结果",
+    ["provider", "key", "status"],
+)
+API_KEY_INFLIGHT = REGISTRY.gauge(
+    "rhcomfyui_api_key_inflight",
+    "各 API Key（脱敏）进行中的请求/任务数",
+    ["provider", "key"],
+)
+API_KEY_BENCHED = REGISTRY.counter(
+    "rhcomfyui_api_key_benched_total",
+    "API Key 因鉴权失败/余额不足被停用的次数",
+    ["provider", "key", "status"],
+)
+
+# ===== RAG 推荐 =====
+RAG_QUERY_SECONDS = REGISTRY.histogram(
+    "rhcomfyui_rag_query_seconds",
+    "RAG query_knowledge 检索耗时",
+)
+RAG_CACHE_REQUESTS = REGISTRY.counter(
+    "rhcomfyui_rag_cache_requests_total",
+    "RAG 推荐缓存查询次数 (hit/miss/skip)",
+    ["result"],
+)
+RAG_CACHE_SAVED_SECONDS = REGISTRY.counter(
+    "rhcomfyui_rag_cache_saved_seconds_total",
+    "RAG 推荐缓存命中或跳过检索节省的估算耗时",
+)
+
+# ===== 公平调度 =====
+SCHEDULER_WAIT = REGISTRY.histogram(
+    "rhcomfyui_scheduler_wait_seconds",
+    "生成任务在公平调度队列中的等待耗时",
+    ["category"],
+)
+SCHEDULER_QUEUE = REGISTRY.gauge(
+    "rhcomfyui_scheduler_queue_length",
+    "公平调度队列中等待/运行的任务数",
+    ["state"],
+)
+
+# ===== 对冲请求 =====
+HEDGE_REQUESTS = REGISTRY.counter(
+    "rhcomfyui_hedge_requests_total",
+    "主模型超过 p95 后的对冲结果 (primary/secondary/none/no_secondary/over_budget)",
+    ["model", "result"],
+)
+
+# ===== 模型 =====
+MODEL_REQUESTS = REGISTRY.counter(
+    "rhcomfyui_model_requests_total",
+    "MODEL_REGISTRY 模型调用次数",
+    ["model", "category", "result"],
+)
+MODEL_DURATION = REGISTRY.histogram(
+    "rhcomfyui_model_duration_seconds",
+    "MODEL_REGISTRY 模型调用总耗时",
+    ["model"],
+)
+
+
+def record_transfer(backend: str, direction: str, size: int) -> None:
+    """记录传输字节数"""
+    TRANSFER_BYTES.inc(size, backend=backend, direction=direction)
+
+
+def render_summary() -> str:
+    """生成适合在聊天中查看的指标摘要"""
+    lines = ["📊 RH_ComfyUI 性能指标"]
+
+    totals: Dict[str, Dict[str, float]] = {}
+    for (model, _, result), value in MODEL_REQUESTS.items():
+        totals.setdefault(model, {}).setdefault(result, 0)
+        totals[model][result] += value
+
+    if totals:
+        lines.append("【模型成功率】")
+        for model, results in sorted(totals.items()):
+            total = sum(results.values())
+            success = results.get("success", 0)
+            count, duration = MODEL_DURATION.summary(model=model)
+            avg = duration / count if count else 0
+            lines.append(f"{model}: {success:.0f}/{total:.0f} ({success / total:.0%}) 平均 {avg:.1f}s")
+
+    stages = [
+        ("调度排队", SCHEDULER_WAIT),
+        ("限速等待", RATE_LIMIT_WAIT),
+        ("BLT首字节", BLT_FIRST_BYTE),
+        ("RH排队", RH_QUEUE_WAIT),
+        ("提交", COMFYUI_QUEUE_PROMPT),
+        ("亲和调度", COMFYUI_DISPATCH_WAIT),
+        ("ComfyUI排队", COMFYUI_EXECUTION_WAIT),
+        ("采样", COMFYUI_SAMPLER),
+        ("执行", COMFYUI_EXECUTION),
+        ("历史查询", COMFYUI_HISTORY),
+    ]
+    stage_lines = []
+    for title, metric in stages:
+        for _, count, total in metric.items():
+            if count:
+                stage_lines.append(f"{title}: {count}次 平均 {total / count:.2f}s")
+    if stage_lines:
+        lines.append("【阶段耗时】")
+        lines.extend(stage_lines)
+
+    transfer_lines = []
+    for (backend, direction), value in TRANSFER_BYTES.items():
+        transfer_lines.append(f"{backend} {direction}: {value / 1024 / 1024:.2f} MB")
+    if transfer_lines:
+        lines.append("【传输流量】")
+        lines.extend(sorted(transfer_lines))
+
+    routes = {target: 0.0 for target in ("local", "cloud")}
+    for (target, _), value in COMFYUI_ROUTES.items():
+        routes[target] += value
+    if routes["cloud"]:
+        lines.append("【ComfyUI 云端溢出】")
+        lines.append(
+            f"本地 {routes['local']:.0f}次 云端 {routes['cloud']:.0f}次 云端占用 {COMFYUI_CLOUD_SECONDS.get():.0f}s"
+        )
+
+    swaps = sum(value for _, value in COMFYUI_MODEL_SWAPS.items())
+    if swaps:
+        lines.append(f"【ComfyUI 模型切换】{swaps:.0f}次")
+
+    batch_lines = []
+    for (model,), count, total in COMFYUI_MICRO_BATCH.items():
+        if count:
+            batch_lines.append(f"{model}: 提交 {count}次 合并 {total:.0f} 个请求 平均 {total / count:.1f}")
+    if batch_lines:
+        lines.append("【ComfyUI 微批】")
+        lines.extend(batch_lines)
+
+    cache = {result: value for (result,), value in RAG_CACHE_REQUESTS.items()}
+    if cache:
+        total = sum(cache.values())
+        hit = cache.get("hit", 0) + cache.get("skip", 0)
+        lines.append("【RAG 推荐缓存】")
+        lines.append(f"命中/跳过: {hit:.0f}/{total:.0f} ({hit / total:.0%}) 节省 {RAG_CACHE_SAVED_SECONDS.get():.1f}s")
+
+    if len(lines) == 1:
+        lines.append("暂无数据")
+    return "\n".join(lines)
@@ -6,11 +6,16 @@
 import time
 import asyncio
 from enum import Enum, auto
-from typing import Dict, List, Tuple, Callable, Optional
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, List, Tuple, Mapping, Callable, Optional
 from dataclasses import dataclass
 
+from .backend_health import backend_health
 from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
 
+if TYPE_CHECKING:
+    from .registry_index import RegistryIndex
+
 
 class ModelRequirement(Enum):
     """模型依赖类型"""
@@ -20,6 +25,22 @@ class ModelRequirement(Enum):
     RH_API = auto()  # 需要 RunningHub API Key
 
 
+# 依赖类型对应的后端名称
+REQUIREMENT_BACKEND: Dict[ModelRequirement, str] = {
+    ModelRequirement.BLT_API: "blt",
+    ModelRequirement.COMFYUI_URL: "comfyui",
+    ModelRequirement.RH_API: "runninghub",
+}
+
+
+# 依赖类型对应的配置项，这些配置项的值决定了可用性
+REQUIREMENT_CONFIG: Dict[ModelRequirement, str] = {
+    ModelRequirement.BLT_API: "BLT_apikey",
+    ModelRequirement.COMFYUI_URL: "ComfyUI_BaseURL",
+    ModelRequirement.RH_API: "RH_apikey",
+}
+
+
 class ModelStatus(Enum):
     """模型可用状态"""
 
@@ -27,6 +48,7 @@ class ModelStatus(Enum):
     MISSING_BLT_API = "missing_blt_api"
     MISSING_COMFYUI = "missing_comfyui"
     MISSING_RH_API = "missing_rh_api"
+    BACKEND_UNHEALTHY = "backend_unhealthy"
     UNKNOWN = "unknown"
 
 
@@ -39,6 +61,16 @@ class ModelInfo:
     requirements: List[ModelRequirement]
     category: str
     description: str
+    tier: int = 1  # 质量档位，路由只在同档位内比较
+    cost: float = 0  # 单次调用的相对成本，自有 ComfyUI 视为 0
+
+    @property
+    def backend(self) -> str:
+        """模型所在后端 (comfyui / blt / runninghub)"""
+        for req in self.requirements:
+            if req in REQUIREMENT_BACKEND:
+                return REQUIREMENT_BACKEND[req]
+        return "unknown"
 
 
 @dataclass
@@ -50,6 +82,7 @@ class AvailabilityResult:
     is_available: bool
     reason: str
     last_checked: float
+    circuit_state: Optional[str] = None  # 所在后端的熔断状态 (closed / half_open / open)
 
     def to_error_message(self) -> str:
         """转换为错误消息"""
@@ -60,17 +93,41 @@ class AvailabilityResult:
             ModelStatus.MISSING_BLT_API: f"❌ 模型 {self.model_name} 不可用：未配置 BLT API Key",
             ModelStatus.MISSING_COMFYUI: f"❌ 模型 {self.model_name} 不可用：未配置 ComfyUI 服务地址",
             ModelStatus.MISSING_RH_API: f"❌ 模型 {self.model_name} 不可用：未配置 RunningHub API Key",
+            ModelStatus.BACKEND_UNHEALTHY: f"❌ 模型 {self.model_name} 暂不可用：后端连续失败已熔断，{self.reason}",
         }
         return status_messages.get(self.status, f"❌ 模型 {self.model_name} 不可用：{self.reason}")
 
 
+@dataclass(frozen=True)
+class _Snapshot:
+    """某一时刻全部模型的可用性"""
+
+    fingerprint: Tuple[Optional[str], ...]  # 计算时的配置取值
+    version: int  # 计算时的注册表索引版本
+    mask: int
+    results: Mapping[str, AvailabilityResult]
+
+
 class ModelAvailabilityChecker:
     """模型可用性检查器"""
 
-    def __init__(self, cache_ttl: int = 60):
-        self.cache_ttl = cache_ttl
-        self._cache: Dict[str, AvailabilityResult] = {}
-        self._lock = asyncio.Lock()
+    def __init__(self):
+        # 当前可用性快照，整体替换，读取无需加锁
+        self._snapshot: Optional[_Snapshot] = None
+        # 熔断状态变化时立即让快照失效
+        backend_health.add_listener(lambda _: self.clear_cache())
+
+    def _fingerprint(self) -> Tuple[Optional[str], ...]:
+        """决定可用性的配置项取值"""
+        keys = (*REQUIREMENT_CONFIG.values(), "Cloud_Overflow_Enable")
+        return tuple(self._get_config(key) for key in keys)
+
+    def _current(self) -> Optional["_Snapshot"]:
+        """配置未变化时返回当前快照"""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.fingerprint != self._fingerprint():
+            return None
+        return snapshot
 
     def _get_config(self, key: str) -> Optional[str]:
         """获取配置值"""
@@ -92,73 +149,86 @@ class ModelAvailabilityChecker:
     ]:
         """检查单个依赖"""
         if req == ModelRequirement.BLT_API:
-            api_key = self._get_config("BLT_apikey")
+            api_key = self._get_config(REQUIREMENT_CONFIG[req])
             if not api_key:
                 return False, ModelStatus.MISSING_BLT_API, "未配置 BLT API Key"
             return True, None, None
 
         elif req == ModelRequirement.COMFYUI_URL:
-            url = self._get_config("ComfyUI_BaseURL")
+            url = self._get_config(REQUIREMENT_CONFIG[req])
             if not url or url == "127.0.0.1:8188":
                 return False, ModelStatus.MISSING_COMFYUI, "未配置 ComfyUI 服务地址"
             return True, None, None
 
         elif req == ModelRequirement.RH_API:
-            api_key = self._get_config("RH_apikey")
+            api_key = self._get_config(REQUIREMENT_CONFIG[req])
             if not api_key:
                 return False, ModelStatus.MISSING_RH_API, "未配置 RunningHub API Key"
             return True, None, None
 
         return True, None, None
 
+    def _check_health(self, req: ModelRequirement) -> Tuple[bool, Optional[str]]:
+        """检查依赖对应后端的熔断状态（含半开试探进行中）"""
+        backend = REQUIREMENT_BACKEND.get(req)
+        breaker = backend_health.get(backend) if backend else None
+        if breaker is None:
+            return True, None
+        if breaker.is_blocked():
+            # 本地 ComfyUI 熔断时由调度器溢出到 RunningHub 代理
+            if req == ModelRequirement.COMFYUI_URL:
+                from .comfyui.dispatcher import comfyui_dispatcher
+
+                if comfyui_dispatcher.can_overflow():
+                    return True, breaker.state.value
+            return False, breaker.state.value
+        return True, breaker.state.value
+
+    def _evaluate(self, model_info: ModelInfo) -> AvailabilityResult:
+        """根据当前配置与熔断状态计算模型可用性"""
+        # 检查所有依赖
+        all_available = True
+        failed_status = ModelStatus.UNKNOWN
+        failed_reason = "未知错误"
+        circuit_state = None
+
+        for req in model_info.requirements:
+            available, status, reason = self._check_requirement(req)
+            if not available:
+                all_available = False
+                failed_status = status
+                failed_reason = reason
+                break
+
+            healthy, circuit_state = self._check_health(req)
+            if not healthy:
+                breaker = backend_health.get(REQUIREMENT_BACKEND[req])
+                all_available = False
+                failed_status = ModelStatus.BACKEND_UNHEALTHY
+                failed_reason = breaker.last_error if breaker else "后端不可用"
+                break
+
+        return AvailabilityResult(
+            model_name=model_info.name,
+            status=ModelStatus.AVAILABLE
+            if all_available
+            else (failed_status if failed_status else ModelStatus.UNKNOWN),
+            is_available=all_available,
+            reason=(failed_reason if failed_reason else "") if not all_available else "",
+            last_checked=time.time(),
+            circuit_state=circuit_state,
+        )
+
     async def check_model(
         self,
         model_info: ModelInfo,
         force: bool = False,
     ) -> AvailabilityResult:
         """检查单个模型可用性"""
-        model_name = model_info.name
-        now = time.time()
-
-        # 检查缓存
-        if not force and model_name in self._cache:
-            cached = self._cache[model_name]
-            if now - cached.last_checked < self.cache_ttl:
-                return cached
-
-        # 执行检查
-        async with self._lock:
-            # 双重检查
-            if not force and model_name in self._cache:
-                cached = self._cache[model_name]
-                if now - cached.last_checked < self.cache_ttl:
-                    return cached
-
-            # 检查所有依赖
-            all_available = True
-            failed_status = ModelStatus.UNKNOWN
-            failed_reason = "未知错误"
-
-            for req in model_info.requirements:
-                available, status, reason = self._check_requirement(req)
-                if not available:
-                    all_available = False
-                    failed_status = status
-                    failed_reason = reason
-                    break
-
-            result = AvailabilityResult(
-                model_name=model_name,
-                status=ModelStatus.AVAILABLE
-                if all_available
-                else (failed_status if failed_status else ModelStatus.UNKNOWN),
-                is_available=all_available,
-                reason=(failed_reason if failed_reason else "") if not all_available else "",
-                last_checked=time.time(),
-            )
-
-            self._cache[model_name] = result
-            return result
+        snapshot = None if force else self._current()
+        if snapshot is not None and model_info.name in snapshot.results:
+            return snapshot.results[model_info.name]
+        return self._evaluate(model_info)
 
     async def filter_available(self, model_names: List[str], registry: Dict[str, ModelInfo]) -> List[str]:
         """过滤出可用的模型列表"""
@@ -205,13 +275,44 @@ class ModelAvailabilityChecker:
 
         return results
 
+    def available_mask(self, index: "RegistryIndex") -> int:
+        """
+        返回索引中全部模型的可用性位图
+
+        仅在索引变化、相关配置变化或熔断状态变化时整体重算一次，
+        单个模型的检查结果保存在同一快照中，供 get_result / check_model 读取
+        """
+        snapshot = self._current()
+        if snapshot is not None and snapshot.version == index.version:
+            return snapshot.mask
+
+        fingerprint = self._fingerprint()
+        mask = 0
+        results: Dict[str, AvailabilityResult] = {}
+        for name, bit in index.bits.items():
+            info = index.registry.get(name)
+            if info is None:
+                continue
+            result = self._evaluate(info)
+            results[name] = result
+            if result.is_available:
+                mask |= bit
+
+        self._snapshot = _Snapshot(fingerprint, index.version, mask, MappingProxyType(results))
+        return mask
+
+    def get_result(self, model_name: str) -> Optional[AvailabilityResult]:
+        """读取最近一次的检查结果"""
+        snapshot = self._snapshot
+        return snapshot.results.get(model_name) if snapshot else None
+
     def clear_cache(self):
-        """清除缓存"""
-        self._cache.clear()
+        """让当前快照失效，下次读取时重算"""
+        self._snapshot = None
 
 
 # 全局检查器实例
-availability_checker = ModelAvailabilityChecker(cache_ttl=60)
+availability_checker = ModelAvailabilityChecker()
 
 
 class ModelUnavailableError(Exception):
@@ -2,67 +2,9 @@
 PLUGIN_NAME = "RH_ComfyUI"
 
 # 模型知识库 - 极简格式
+# ComfyUI 模型的知识写在工作流旁的 *.manifest.json 中，这里只保留非工作流模型
 MODEL_KNOWLEDGE = {
     "text2image": {
-        "qwen_2512": {
-            "title": "千问Qwen-Image2512",
-            "content": "千问Image2512模型，擅长中文提示词理解，适合各种风格的图像生成。优势：中文提示词理解能力强，支持复杂风格描述，输出质量稳定可靠，成本低。适用场景：中文场景的图像生成，简单需求，二次元动漫头像，通用图像生成。成本：低，速度：中等，输出质量：中等。",
-            "tags": [
-                # 常见生成指令
-                "生成",
-                "画",
-                "帮我画",
-                "生成一张",
-                "画一个",
-                "创建一个",
-                "绘制",
-                # 常见风格
-                "二次元",
-                "动漫",
-                "卡通",
-                "简约",
-                "简单",
-                "清新",
-                "可爱",
-                "甜美",
-                # 常见主题
-                "头像",
-                "女生",
-                "男生",
-                "女孩",
-                "男孩",
-                "人物",
-                "风景",
-                "风景画",
-                "动物",
-                "宠物",
-                "猫",
-                "狗",
-                "食物",
-                "美食",
-                "植物",
-                "花卉",
-                "花朵",
-                "背景",
-                "壁纸",
-                "海报",
-                "插画",
-                "封面",
-                "头像",
-                "大头照",
-                # 通用场景
-                "日常",
-                "休闲",
-                "普通",
-                "基础",
-                "标准",
-                "默认",
-                # 中文相关
-                "中文",
-                "文生图",
-                "图像生成",
-            ],
-        },
         "banana2": {
             "title": "Gemini 3.1 Flash Image / Nano Bnana 2",
             "content": "Gemini 3.1 Flash 图像生成模型，速度快，适合快速生成和预览。优势：生成速度非常快，支持快速迭代测试，质量稳定可控，适合批量生成。适用场景：需要较快速度但保持较好质量的图像，高清图像，精细画面。成本：中等，速度：快，输出质量：高。",
@@ -149,72 +91,18 @@ MODEL_KNOWLEDGE = {
             ],
         },
     },
-    "image2image": {
-        "qwen_2512_img2img": {
-            "title": "千问Qwen-Image2512 (图生图)",
-            "content": "千问Image2512模型，擅长中文提示词理解，适合各种风格的图像生成。优势：中文提示词理解能力强，支持复杂风格描述，输出质量稳定可靠。适用场景：中文场景的图像生成，需要精确描述的画面，艺术创作和插画。成本：低，速度：中等，输出质量：低。",
-            "tags": ["中文", "图生图"],
-        },
-    },
     "image_edit": {
-        "qwen_2511": {
-            "title": "通义千问 Edit 2511",
-            "content": "专业的图像编辑模型。优势：中文指令理解准确，支持精确的区域编辑，可同时处理多图输入。适用场景：局部修图和编辑，多图融合处理，照片精修，添加或删除元素。成本：低，速度：中等，输出质量：低。",
-            "tags": [
-                "中文",
-                "图片编辑",
-                "多图",
-                "精确编辑",
-                "风格迁移",
-                "添加文字",
-                "图片编辑",
-                "修改文字",
-                "局部修图",
-                "给图片加上字",
-                "删掉图片里的东西",
-                "P图",
-                "Image Editing Add Text",
-            ],
-        },
-        "banana2": {
+        "banana2_edit": {
             "title": "Gemini 3.1 Flash Image / Nano Bnana 2",
             "content": "快速图像编辑模型。优势：处理速度快，适合快速编辑。适用场景：较为复杂的图片修改。成本：中，速度：快，输出质量：中等。",
             "tags": ["快速", "图片编辑", "简单", "精细编辑", "画风修改"],
         },
-        "banana_pro": {
+        "banana_pro_edit": {
             "title": "Nano Banana 2.2K Editor",
             "content": "高质量图像编辑模型。优势：编辑质量高，细节处理好。适用场景：精细图片编辑，专业修图，需要高质量输出。成本：高，速度：较慢，输出质量：极高。",
             "tags": ["高质量", "图片编辑", "专业", "精细编辑"],
         },
     },
-    "text2video": {
-        "wan2.2_text2video": {
-            "title": "Wan 2.2 Text2Video",
-            "content": "文生视频模型。优势：中文支持良好，可以生成分辨率较高的视频，动作流畅。适用场景：创意视频生成，动画制作，短视频创作。成本：高，速度：慢，输出质量：高。",
-            "tags": ["中文", "文生视频", "动画", "创意"],
-        },
-    },
-    "image2video": {
-        "wan2.2_img2video": {
-            "title": "Wan 2.2 Image2Video",
-            "content": "图生视频模型。优势：可以让静态图片动起来，保持原图风格，中文支持良好。适用场景：让照片变生动，制作循环动画，基于图片的短视频。成本：极高，速度：慢，输出质量：高。",
-            "tags": ["图生视频", "动画", "让图片动起来", "风格保持"],
-        },
-    },
-    "music": {
-        "ace_step1.5": {
-            "title": "ACE Step 1.5",
-            "content": "音乐生成模型。优势：可以生成多种风格音乐，支持歌词输入，音乐质量较高。适用场景：背景音乐生成，创意音乐制作，配乐需求。成本：中等，速度：中慢，输出质量：高。",
-            "tags": ["音乐生成", "风格多样", "歌词支持", "背景音乐"],
-        },
-    },
-    "speech": {
-        "IndexTTS2": {
-            "title": "Index TTS 2",
-            "content": "语音合成模型。优势：语音自然，中文发音准确，支持多种语气。适用场景：文本转语音，有声内容制作，辅助阅读。成本：中等，速度：快，输出质量：高。",
-            "tags": ["语音合成", "中文", "自然语音", "TTS"],
-        },
-    },
 }
 
 
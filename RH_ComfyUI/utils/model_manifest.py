@@ -0,0 +1,409 @@
+"""
+模型清单模块
+在 WORKFLOW_PATH 下的工作流 JSON 旁放置 `<工作流名>.manifest.json` 即可声明一个模型，无需修改代码:
+
+{
+    "name": "my_model",
+    "category": "text2image",
+    "description": "我的模型",
+    "workflow": "my_model.json",
+    "handler": "draw_img_by_qwen_2512",       // 可选，绑定内置处理函数，以 workflow 指定的工作流运行
+    "inputs": {"prompt": [{"node": "6", "field": "text"}]},  // 无 handler 时的通用输入映射
+    "output": "image",
+    "tier": 1,
+    "cost": 0,
+    "knowledge": {"title": "...", "content": "...", "tags": ["..."]}
+}
+
+RunningHub AI 应用以 webappId 与 nodeInfoList 模板声明，不需要工作流文件，
+模板中带 param 的节点在调用时填入对应参数（图片等文件先上传），结果直接返回 fileUrl:
+
+{
+    "name": "rh_my_app",
+    "category": "text2image",
+    "backend": "runninghub",
+    "webappId": "1937084629516193794",
+    "nodeInfoList": [
+        {"nodeId": "6", "fieldName": "text", "param": "prompt"},
+        {"nodeId": "3", "fieldName": "seed", "fieldValue": "-1"}
+    ]
+}
+
+BLT 对话式图片模型（chat/completions）以 model 声明，仅支持文生图，
+生成时流式接收响应，期间的进度文本转发给用户:
+
+{
+    "name": "blt_gpt_image",
+    "category": "text2image",
+    "backend": "blt",
+    "model": "gpt-4o-image"
+}
+
+启动后在后台扫描清单，增量注册到 MODEL_REGISTRY 与 RAG 知识库，
+仅对内容发生变化的清单重新计算知识哈希
+"""
+
+import json
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Tuple, Union, Callable, Optional
+from pathlib import Path
+from dataclasses import field, dataclass
+
+from gsuid_core.logger import logger
+from gsuid_core.server import on_core_start
+
+from .comfyui import _request
+from .key_pool import rh_keys
+from .progress import report_progress
+from .model_knowledge import PLUGIN_NAME
+from .recommend_cache import recommend_cache
+from .model_availability import ModelInfo, ModelRequirement
+from .resource.RESOURCE_PATH import WORKFLOW_PATH, _CP_WORKFLOW_PATH, load_workflow, sync_workflows
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+# 各类别模型函数的位置参数，与 wrapper 中的调用方式一致
+CATEGORY_PARAMS: Dict[str, Tuple[str, ...]] = {
+    "text2image": ("prompt", "w", "h"),
+    "image2image": ("prompt", "image"),
+    "image_edit": ("prompt", "images"),
+    "music": ("prompt", "lyric"),
+    "speech": ("text",),
+    "text2video": ("prompt", "w", "h", "duration"),
+    "image2video": ("prompt", "image", "w", "h", "duration"),
+}
+
+# 清单中 backend 字段对应的依赖
+BACKEND_REQUIREMENT: Dict[str, ModelRequirement] = {
+    "comfyui": ModelRequirement.COMFYUI_URL,
+    "blt": ModelRequirement.BLT_API,
+    "runninghub": ModelRequirement.RH_API,
+}
+
+# 通用映射下各输出类型对应的生成方法
+_OUTPUT_METHODS = {
+    "image": "generate_image_by_prompt",
+    "audio": "generate_audio_by_prompt",
+    "video": "generate_video_by_prompt",
+}
+
+
+@dataclass
+class ModelManifest:
+    """模型清单"""
+
+    name: str
+    category: str
+    description: str
+    path: Path
+    digest: str
+    workflow: str = ""
+    backend: str = "comfyui"
+    handler: Optional[str] = None
+    inputs: Dict[str, List[Dict[str, str]]] = field(default_factory=dict)
+    output: str = "image"
+    tier: int = 1
+    cost: float = 0
+    knowledge: Dict[str, Any] = field(default_factory=dict)
+    webapp_id: str = ""
+    node_info_list: List[Dict[str, Any]] = field(default_factory=list)
+    model: str = ""
+
+    @property
+    def workflow_path(self) -> Path:
+        path = self.path.parent / (self.workflow or self.path.name[: -len(MANIFEST_SUFFIX)] + ".json")
+        # 插件自带的清单同样使用同步到 WORKFLOW_PATH 的工作流，未同步时 load_workflow 退回自带文件
+        try:
+            return WORKFLOW_PATH / path.relative_to(_CP_WORKFLOW_PATH)
+        except ValueError:
+            return path
+
+
+def parse_manifest(path: Path) -> ModelManifest:
+    """读取并校验清单文件"""
+    raw = path.read_bytes()
+    data = json.loads(raw)
+
+    for key in ("name", "category"):
+        if not data.get(key):
+            raise ValueError(f"缺少字段 {key}")
+    if data["category"] not in CATEGORY_PARAMS:
+        raise ValueError(f"未知类别 {data['category']}")
+    if data.get("backend", "comfyui") not in BACKEND_REQUIREMENT:
+        raise ValueError(f"未知后端 {data['backend']}")
+    if data.get("backend") == "runninghub":
+        if not data.get("webappId") or not isinstance(data.get("nodeInfoList"), list):
+            raise ValueError("RunningHub 应用需要 webappId 与 nodeInfoList")
+        for item in data["nodeInfoList"]:
+            if not item.get("nodeId") or not item.get("fieldName"):
+                raise ValueError("nodeInfoList 中的节点缺少 nodeId 或 fieldName")
+    elif data.get("backend") == "blt":
+        if not data.get("model"):
+            raise ValueError("BLT 模型需要 model")
+        if data["category"] != "text2image":
+            raise ValueError("BLT 对话式模型仅支持 text2image")
+    elif not data.get("handler") and not data.get("inputs"):
+        raise ValueError("handler 与 inputs 至少需要一个")
+
+    return ModelManifest(
+        name=data["name"],
+        category=data["category"],
+        description=data.get("description", data["name"]),
+        path=path,
+        digest=hashlib.sha256(raw).hexdigest(),
+        workflow=data.get("workflow", ""),
+        backend=data.get("backend", "comfyui"),
+        handler=data.get("handler"),
+        inputs=data.get("inputs", {}),
+        output=data.get("output", "image"),
+        tier=int(data.get("tier", 1)),
+        cost=float(data.get("cost", 0)),
+        knowledge=data.get("knowledge", {}),
+        webapp_id=str(data.get("webappId", "")),
+        node_info_list=data.get("nodeInfoList", []),
+        model=str(data.get("model", "")),
+    )
+
+
+def discover_manifests() -> List[ModelManifest]:
+    """扫描清单，WORKFLOW_PATH 中的同名文件优先于插件自带的文件"""
+    found: Dict[str, ModelManifest] = {}
+    for root in (_CP_WORKFLOW_PATH, WORKFLOW_PATH):
+        if not root.exists():
+            continue
+        for path in sorted(root.rglob(f"*{MANIFEST_SUFFIX}")):
+            try:
+                manifest = parse_manifest(path)
+            except Exception as e:
+                logger.warning(f"[RHComfyUI][Manifest] 清单 {path} 无效: {e}")
+                continue
+            found[manifest.name] = manifest
+    return list(found.values())
+
+
+def build_generic_func(manifest: ModelManifest) -> Callable:
+    """按 inputs 映射构建通用的 ComfyUI 模型函数"""
+    params = CATEGORY_PARAMS[manifest.category]
+    method = _OUTPUT_METHODS.get(manifest.output, _OUTPUT_METHODS["image"])
+
+    async def _run(*args, batch: int = 1, **kwargs):
+        values = dict(zip(params, args))
+        values.update(kwargs)
+        workflow = load_workflow(manifest.workflow_path)
+
+        async def _on_box(api):
+            for param, targets in manifest.inputs.items():
+                value = values.get(param)
+                if value is None:
+                    continue
+
+                if param == "images":
+                    # 多图输入：第 i 张图写入第 i 个目标
+                    for target, img in zip(targets, value):
+                        workflow[target["node"]]["inputs"][target["field"]] = await api.upload_image(img)
+                    continue
+                if isinstance(value, bytes):
+                    value = await api.upload_image(value)
+
+                for target in targets:
+                    workflow[target["node"]]["inputs"][target["field"]] = value
+
+            if manifest.output == "image":
+                return await _request.generate_images(api, workflow, batch)
+            return await getattr(api, method)(workflow)
+
+        return await _request.dispatch(workflow, _on_box)
+
+    _run.__name__ = f"manifest_{manifest.name}"
+    return _run
+
+
+def build_rh_app_func(manifest: ModelManifest) -> Callable:
+    """按 nodeInfoList 模板构建 RunningHub AI 应用的模型函数，返回结果文件的 fileUrl"""
+    params = CATEGORY_PARAMS[manifest.category]
+
+    async def _node_info_list(rh_request, values: Dict[str, Any]) -> Union[List[Dict[str, Any]], int]:
+        node_info_list = []
+        for template in manifest.node_info_list:
+            item = {"nodeId": str(template["nodeId"]), "fieldName": template["fieldName"]}
+            value = values.get(template["param"]) if "param" in template else None
+            if template.get("param") == "images":
+                # 多图输入：index 指定取第几张
+                index = int(template.get("index", 0))
+                value = value[index] if value and index < len(value) else None
+
+            if value is None:
+                if "fieldValue" not in template:
+                    continue
+                item["fieldValue"] = template["fieldValue"]
+            elif isinstance(value, (bytes, Path)):
+                uploaded = await rh_request.upload_file(value, template.get("fileType", "image"))
+                if isinstance(uploaded, int):
+                    return uploaded
+                item["fieldValue"] = uploaded
+            else:
+                item["fieldValue"] = str(value)
+            node_info_list.append(item)
+        return node_info_list
+
+    async def _run(*args, batch: int = 1, **kwargs):
+        from .RH import rh_request
+
+        values = dict(zip(params, args))
+        values.update(kwargs)
+        # 上传的文件与任务使用同一个 API Key
+        with rh_keys.pin():
+            node_info_list = await _node_info_list(rh_request, values)
+            if isinstance(node_info_list, int):
+                return node_info_list
+
+            # AI 应用一次只出一个结果，多张时用同一份输入并发提交多个任务
+            results = await asyncio.gather(
+                *(rh_request.get_aiapp_result(manifest.webapp_id, node_info_list) for _ in range(max(batch, 1)))
+            )
+        # 任务失败时返回状态字符串，统一为错误码
+        urls = [r for r in results if isinstance(r, str) and r != "FAILED"]
+        if not urls:
+            return 500 if results[0] == "FAILED" else results[0]
+        return urls if batch > 1 else urls[0]
+
+    _run.__name__ = f"rh_app_{manifest.name}"
+    return _run
+
+
+def build_blt_chat_func(manifest: ModelManifest) -> Callable:
+    """BLT 对话式图片模型 → 模型函数，流式接收响应并把进度文本发送给用户"""
+
+    async def _run(prompt: str, w: int = 720, h: int = 1280, batch: int = 1):
+        from .blt.blt_request import draw_image_by_model
+
+        # 对话式接口一次只出一张，多张时并发请求
+        results = await asyncio.gather(
+            *(
+                draw_image_by_model(manifest.model, prompt, stream=True, on_progress=report_progress)
+                for _ in range(max(batch, 1))
+            )
+        )
+        images = [r for r in results if not isinstance(r, int)]
+        if not images:
+            return results[0]
+        return images if batch > 1 else images[0]
+
+    _run.__name__ = f"blt_chat_{manifest.name}"
+    return _run
+
+
+def resolve_func(manifest: ModelManifest) -> Callable:
+    """清单 → 模型函数，优先绑定内置处理函数"""
+    if manifest.backend == "runninghub":
+        return build_rh_app_func(manifest)
+    if manifest.backend == "blt":
+        return build_blt_chat_func(manifest)
+    if manifest.handler:
+        handler = getattr(_request, manifest.handler, None)
+        if handler is None:
+            raise ValueError(f"内置处理函数 {manifest.handler} 不存在")
+
+        async def _run(*args, **kwargs):
+            return await handler(*args, workflow_path=manifest.workflow_path, **kwargs)
+
+        _run.__name__ = manifest.handler
+        return _run
+    return build_generic_func(manifest)
+
+
+def knowledge_point(manifest: ModelManifest) -> Optional[Dict[str, Any]]:
+    """清单 → RAG 知识点，哈希只依赖知识内容本身"""
+    knowledge = manifest.knowledge
+    if not knowledge:
+        return None
+
+    base = {
+        "id": f"{PLUGIN_NAME}:model:{manifest.category}:{manifest.name}",
+        "plugin": PLUGIN_NAME,
+        "type": "model",
+        "category": manifest.category,
+        "title": knowledge.get("title", manifest.description),
+        "content": knowledge.get("content", manifest.description),
+        "tags": knowledge.get("tags", []),
+    }
+    content = json.dumps(base, ensure_ascii=False, sort_keys=True)
+    return {**base, "_hash": hashlib.md5(content.encode("utf-8")).hexdigest()}
+
+
+class ManifestLoader:
+    """清单加载器，记录已加载清单的摘要以便增量更新"""
+
+    def __init__(self):
+        self._digests: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+
+    def apply(self, manifests: List[ModelManifest]) -> Tuple[List[str], List[str]]:
+        """注册新增或变化的清单并移除已删除清单的模型，返回 (更新的模型名, 移除的模型名)"""
+        from gsuid_core.ai_core.register import ai_entity
+
+        from .model_registry import register_model, unregister_model
+
+        # 清单文件被删除、改名或失效时，移除之前由清单注册的模型
+        scanned = {manifest.name for manifest in manifests}
+        removed = [name for name in self._digests if name not in scanned]
+        for name in removed:
+            unregister_model(name)
+            del self._digests[name]
+
+        updated = []
+        for manifest in manifests:
+            if self._digests.get(manifest.name) == manifest.digest:
+                continue
+            try:
+                func = resolve_func(manifest)
+            except Exception as e:
+                logger.warning(f"[RHComfyUI][Manifest] 模型 {manifest.name} 注册失败: {e}")
+                continue
+
+            register_model(
+                ModelInfo(
+                    name=manifest.name,
+                    func=func,
+                    requirements=[BACKEND_REQUIREMENT[manifest.backend]],
+                    category=manifest.category,
+                    description=manifest.description,
+                    tier=manifest.tier,
+                    cost=manifest.cost,
+                )
+            )
+            point = knowledge_point(manifest)
+            if point:
+                ai_entity(point)  # type: ignore
+            self._digests[manifest.name] = manifest.digest
+            updated.append(manifest.name)
+
+        if updated or removed:
+            recommend_cache.clear()
+        if updated:
+            logger.info(f"[RHComfyUI][Manifest] 已注册/更新模型: {updated}")
+        if removed:
+            logger.info(f"[RHComfyUI][Manifest] 已移除模型: {removed}")
+        return updated, removed
+
+    def load(self) -> Tuple[List[str], List[str]]:
+        """同步扫描并注册（脚本与基准测试使用）"""
+        return self.apply(discover_manifests())
+
+    async def reload(self) -> Tuple[List[str], List[str]]:
+        """在线程中扫描清单后注册"""
+        async with self._lock:
+            manifests = await asyncio.to_thread(discover_manifests)
+            return self.apply(manifests)
+
+
+# 全局清单加载器实例
+manifest_loader = ManifestLoader()
+
+
+@on_core_start
+async def load_model_manifests():
+    # 先在后台同步插件自带的工作流与清单，再扫描注册
+    await asyncio.to_thread(sync_workflows)
+    await manifest_loader.reload()
@@ -3,28 +3,21 @@
 存放 MODEL_REGISTRY 和模型创建逻辑，解决循环导入问题
 """
 
-import random
-from typing import Dict, Tuple, Callable, Optional
+import time
+import asyncio
+import weakref
+import importlib
+from typing import Any, Dict, List, Tuple, Callable, Optional
 
 from gsuid_core.logger import logger
 from gsuid_core.models import Event
 
-from .constant import MODEL_PRIORITY
-from .comfyui._request import (
-    draw_img_by_qwen_2512,
-    gen_music_by_ace_step_1_5,
-    gen_speech_by_index_tts_2,
-    edit_img_by_qwen_edit_2511,
-    gen_video_by_img_by_wan2_2,
-    gen_video_by_text_by_wan2_2,
-    draw_img_by_img_by_qwen_2512,
-)
-from ..utils.blt.request import (
-    edit_img_by_banana2,
-    draw_image_by_banana2,
-    edit_img_by_banana_pro,
-    draw_image_by_banana_pro,
-)
+from .metrics import MODEL_DURATION, MODEL_REQUESTS, RAG_QUERY_SECONDS
+from .tracing import span
+from .model_router import model_router
+from .backend_health import track_backend, backend_health
+from .registry_index import RegistryIndex
+from .recommend_cache import record_cache, recommend_cache
 from .model_availability import (
     ModelInfo,
     ModelStatus,
@@ -43,100 +36,68 @@ Speech_Point: int = RHCOMFYUI_CONFIG.get_config("Speech_Point").data
 Video_Point: int = RHCOMFYUI_CONFIG.get_config("Video_Point").data
 
 
+def _lazy_func(module: str, name: str) -> Callable:
+    """首次调用时才导入模型函数所在模块（及其 aiohttp / PIL 等依赖）"""
+
+    async def _call(*args, **kwargs):
+        func = getattr(importlib.import_module(module, __package__), name)
+        return await func(*args, **kwargs)
+
+    _call.__name__ = name
+    return _call
+
+
 def _create_model_registry() -> Dict[str, ModelInfo]:
     """创建模型注册表"""
     registry = {}
 
-    # ComfyUI 模型 - 需要 ComfyUI 地址
-    comfyui_models = [
-        (
-            "qwen_2512",
-            draw_img_by_qwen_2512,
-            "text2image",
-            "千问Qwen-Image2512",
-        ),
-        (
-            "qwen_2512_img2img",
-            draw_img_by_img_by_qwen_2512,
-            "image2image",
-            "千问Qwen-Image2512 (图生图)",
-        ),
-        (
-            "qwen_2511",
-            edit_img_by_qwen_edit_2511,
-            "image_edit",
-            "通义千问 Edit 2511",
-        ),
-        (
-            "ace_step1.5",
-            gen_music_by_ace_step_1_5,
-            "music",
-            "ACE Step 1.5",
-        ),
-        (
-            "IndexTTS2",
-            gen_speech_by_index_tts_2,
-            "speech",
-            "Index TTS 2",
-        ),
-        (
-            "wan2.2_text2video",
-            gen_video_by_text_by_wan2_2,
-            "text2video",
-            "Wan 2.2 Text2Video",
-        ),
-        (
-            "wan2.2_img2video",
-            gen_video_by_img_by_wan2_2,
-            "image2video",
-            "Wan 2.2 Image2Video",
-        ),
-    ]
-
-    for name, func, category, desc in comfyui_models:
-        registry[name] = ModelInfo(
-            name=name,
-            func=func,
-            requirements=[ModelRequirement.COMFYUI_URL],
-            category=category,
-            description=desc,
-        )
+    # ComfyUI 模型由工作流旁的 *.manifest.json 声明，启动后由 model_manifest 加载
 
-    # BLT 模型 - 需要 BLT API Key
+    # BLT 模型 - 需要 BLT API Key，按次计费
     blt_models = [
         (
             "banana2",
-            draw_image_by_banana2,
+            "draw_image_by_banana2",
             "text2image",
             "Nano Bnana 2",
+            1,
+            1,
         ),
         (
             "banana_pro",
-            draw_image_by_banana_pro,
+            "draw_image_by_banana_pro",
             "text2image",
             "Nano Banana 1 Pro",
+            2,
+            2,
         ),
         (
             "banana2_edit",
-            edit_img_by_banana2,
+            "edit_img_by_banana2",
             "image_edit",
             "Nano Bnana 2 (编辑)",
+            1,
+            1,
         ),
         (
             "banana_pro_edit",
-            edit_img_by_banana_pro,
+            "edit_img_by_banana_pro",
             "image_edit",
             "Nano Banana Pro (编辑)",
+            2,
+            2,
         ),
     ]
 
-    for name, func, category, desc in blt_models:
+    for name, func_name, category, desc, tier, cost in blt_models:
         registry[name] = ModelInfo(
             name=name,
-            func=func,
+            func=_lazy_func(".blt.request", func_name),
             requirements=[ModelRequirement.BLT_API],
             category=category,
             description=desc,
+            tier=tier,
+            cost=cost,
         )
 
     return registry
@@ -145,121 +106,157 @@ def _create_model_registry() -> Dict[str, ModelInfo]:
 # 全局模型注册表
 MODEL_REGISTRY: Dict[str, ModelInfo] = _create_model_registry()
 
+# 注册表索引，运行时注册模型请使用 register_model 以保持索引同步
+REGISTRY_INDEX = RegistryIndex(MODEL_REGISTRY)
+
+
+def register_model(info: ModelInfo) -> None:
+    """运行时注册（或替换）一个模型"""
+    REGISTRY_INDEX.register(info)
+    logger.info(f"[RHComfyUI] 注册模型: {info.name} ({info.category})")
+
+
+def unregister_model(name: str) -> None:
+    """运行时移除一个模型，RAG 检索结果按 MODEL_REGISTRY 过滤，其知识点不会再被推荐"""
+    REGISTRY_INDEX.unregister(name)
+    logger.info(f"[RHComfyUI] 移除模型: {name}")
+
+
+def get_available_models(category: str) -> List[str]:
+    """按位图取出该类别当前可用的模型"""
+    mask = availability_checker.available_mask(REGISTRY_INDEX)
+    return REGISTRY_INDEX.select(REGISTRY_INDEX.category(category), mask)
+
 
 # ===== 积分检查 =====
-async def check_point(ev: Event, point: int) -> Tuple[bool, str]:
-    """检查用户是否有足够的积分"""
+async def check_point(
+    ev: Event,
+    point: int,
+    category: Optional[str] = None,
+) -> Tuple[bool, str]:
+    """
+    检查用户是否有足够的积分
+
+    传入 category 时先做准入控制，预计等待超出 SLA 则不扣积分直接拒绝，
+    准入后在回复中告知排队位置与预计等待时间
+    """
     logger.info(f"[RHComfyUI] check_point: 用户:{ev.user_id} BotID:{ev.bot_id} 消费:{point}")
 
+    waiting = "预计将等待1分钟..."
+    if category is not None:
+        # 延迟导入，避免与路由/调度模块循环导入
+        from .admission import admit, format_seconds
+
+        admission = await admit(category)
+        if not admission.admitted:
+            return False, f"⏳ {admission.reason}，本次未扣除积分，请稍后再试！"
+        if admission.position:
+            waiting = f"前方还有{admission.position}个任务，预计将等待{format_seconds(admission.eta)}..."
+        else:
+            waiting = f"预计将等待{format_seconds(admission.eta)}..."
+
     bind = await RHBind.deduct_point(ev.user_id, ev.bot_id, point)
     now_point = await RHBind.get_point(ev.user_id, ev.bot_id)
 
     if bind:
-        return True, f"💪 积分充足！已扣除{point}积分!\n📋 当前积分: {now_point}\n✅ 正在生成，预计将等待1分钟..."
+        return True, f"💪 积分充足！已扣除{point}积分!\n📋 当前积分: {now_point}\n✅ 正在生成，{waiting}"
     else:
         return False, f"❌ 积分不足！需要{point}积分！\n📋 当前积分: {now_point}"
 
 
-def _get_priority_model(available_models: list, category: str) -> Optional[str]:
-    """根据优先级从可用模型中选择"""
-    priority_list = MODEL_PRIORITY.get(category, [])
-    for model_name in priority_list:
-        if model_name in available_models:
-            return model_name
-    return None
+async def refund_point(ev: Event, point: int) -> int:
+    """退还积分（如批量生成中未成功的部分），返回退还后的积分"""
+    if point > 0:
+        logger.info(f"[RHComfyUI] refund_point: 用户:{ev.user_id} BotID:{ev.bot_id} 退还:{point}")
+        await RHBind.add_point(ev.user_id, ev.bot_id, point)
+    return await RHBind.get_point(ev.user_id, ev.bot_id)
 
 
 # ===== RAG 模型推荐 =====
+async def _rag_rank(query: str, category: str, limit: int) -> List[str]:
+    """RAG 检索并按得分排序该类别的模型，结果带缓存"""
+    from gsuid_core.ai_core.rag import query_knowledge
+
+    cached = recommend_cache.get(category, query)
+    if cached is not None:
+        record_cache("hit")
+        return cached
+
+    record_cache("miss")
+    with span("registry.rag_query", category=category, limit=limit), RAG_QUERY_SECONDS.time():
+        results = await query_knowledge(
+            query=query,
+            category=category,
+            limit=limit,
+        )
+
+    scored = []
+    for result in results:
+        if result.payload is None:
+            continue
+        model_id = result.payload.get("id", "")
+        model_name = model_id.split(":")[-1] if ":" in model_id else model_id
+        if model_name in MODEL_REGISTRY:
+            scored.append((model_name, result.score))
+
+    ranked = [name for name, _ in sorted(scored, key=lambda x: x[1], reverse=True)]
+    recommend_cache.set(category, query, ranked)
+    return ranked
+
+
 async def recommend_model(
     query: str,
     category: str,
     limit: int = 3,
     fallback: bool = True,
+    available_models: Optional[List[str]] = None,
 ) -> Optional[str]:
     """
     为特定类别推荐模型（带可用性预过滤）
 
     该函数会：
-    1. 使用 RAG 获取候选模型
-    2. 过滤掉当前不可用的模型
-    3. 返回最佳匹配的可用模型
-    4. fallback 时按优先级选择（默认优先 qwen）
+    1. 先过滤出当前可用的模型，只有一个可用时直接返回，跳过 RAG
+    2. 使用 RAG 获取候选模型排序（按类别 + 归一化提示词缓存）
+    3. 返回排序最靠前的可用模型
+    4. fallback 时交给路由器按预计完成时间选择（无历史数据时优先 qwen）
 
     Args:
         query: 用户需求描述
         category: 模型类别 (text2image, image2image, etc.)
         limit: 查询结果数量
         fallback: 当没有找到匹配时是否回退到按优先级选择
+        available_models: 已过滤好的可用模型列表，不传则现场检查
 
     Returns:
         推荐的模型名称，如果没有找到且fallback=False则返回None
     """
-    from gsuid_core.ai_core.rag import query_knowledge
-
-    try:
-        # 1. 使用 RAG 获取候选模型
-        results = await query_knowledge(
-            query=query,
-            category=category,
-            limit=limit,
-        )
-
-        # 2. 获取该类别所有模型
-        all_models = [name for name, info in MODEL_REGISTRY.items() if info.category == category]
-
-        # 3. 检查每个候选模型的可用性
-        available_candidates = []
-        for result in results:
-            if result.payload is None:
-                continue
-
-            model_id = result.payload.get("id", "")
-            model_name = model_id.split(":")[-1] if ":" in model_id else model_id
-
-            # 检查可用性
-            if model_name in MODEL_REGISTRY:
-                check_result = await availability_checker.check_model(MODEL_REGISTRY[model_name])
-                if check_result.is_available:
-                    available_candidates.append((model_name, result.score))
-
-        # 4. 如果有可用候选，返回最佳匹配
-        if available_candidates:
-            best_model = max(available_candidates, key=lambda x: x[1])
-            logger.info(f"[RHComfyUI][RAG] 选择可用模型: {best_model[0]}")
-            return best_model[0]
-
-        # 5. fallback：按优先级选择（默认优先 qwen）
-        if fallback and all_models:
-            available_models = await availability_checker.filter_available(all_models, MODEL_REGISTRY)
-
-            if available_models:
-                # 按优先级选择，而不是随机选择
-                selected = _get_priority_model(available_models, category)
-                if selected:
-                    logger.info(f"[RHComfyUI][RAG] Fallback 优先选择模型: {selected}")
-                    return selected
-                # 如果没有优先级中的模型，随机选择
-                selected = random.choice(available_models)
-                logger.info(f"[RHComfyUI][RAG] Fallback 随机选择模型: {selected}")
-                return selected
+    if available_models is None:
+        available_models = get_available_models(category)
 
+    if not available_models:
         return None
 
+    # 只有一个可用模型时 RAG 无从选择
+    if len(available_models) == 1:
+        record_cache("skip")
+        return available_models[0]
+
+    try:
+        ranked = await _rag_rank(query, category, limit)
+        for model_name in ranked:
+            if model_name in available_models:
+                logger.info(f"[RHComfyUI][RAG] 选择可用模型: {model_name}")
+                return model_name
     except Exception as e:
         logger.error(f"[RHComfyUI][RAG] 推荐模型失败: {e}")
 
-        # 出错时按优先级选择一个可用模型
-        if fallback:
-            all_models = [name for name, info in MODEL_REGISTRY.items() if info.category == category]
-            if all_models:
-                available_models = await availability_checker.filter_available(all_models, MODEL_REGISTRY)
-                if available_models:
-                    selected = _get_priority_model(available_models, category)
-                    if selected:
-                        return selected
-                    return random.choice(available_models)
+    # fallback：交给路由器选择
+    if fallback:
+        selected = await model_router.pick(available_models, MODEL_REGISTRY, category)
+        logger.info(f"[RHComfyUI][RAG] Fallback 路由选择模型: {selected}")
+        return selected
 
-        return None
+    return None
 
 
 # ===== 模型选择 =====
@@ -282,51 +279,156 @@ async def select_available_model(
     Raises:
         ModelUnavailableError: 如果该类别没有可用模型
     """
-    # 获取该类别所有模型
-    category_models = [name for name, info in MODEL_REGISTRY.items() if info.category == category]
-
-    if not category_models:
-        raise ModelUnavailableError(
-            f"类别 {category} 没有注册的模型",
-            "",
-            ModelStatus.UNKNOWN,
-        )
+    with span("registry.select_model", category=category) as select_span:
+        # 获取该类别所有模型
+        category_models = REGISTRY_INDEX.category(category)
+
+        if not category_models:
+            raise ModelUnavailableError(
+                f"类别 {category} 没有注册的模型",
+                "",
+                ModelStatus.UNKNOWN,
+            )
+
+        # 按可用性位图过滤该类别的模型
+        available_models = get_available_models(category)
+
+        # 如果指定了优先模型，先检查它
+        if preferred_model and preferred_model in category_models:
+            if preferred_model in available_models:
+                return preferred_model, MODEL_REGISTRY[preferred_model].func
+            else:
+                logger.warning(f"[RHComfyUI] 优先模型 {preferred_model} 不可用，尝试其他模型")
+
+        if not available_models:
+            # 记录所有不可用的原因（位图计算时已缓存各模型的检查结果）
+            for name in category_models:
+                result = availability_checker.get_result(name)
+                logger.warning(f"[RHComfyUI] 模型 {name} 不可用: {result.reason if result else '未知'}")
+
+            raise ModelUnavailableError(f"类别 {category} 没有可用模型，请检查配置", "", ModelStatus.UNKNOWN)
+
+        # 如果提供了 query，尝试使用 RAG 智能推荐（推荐结果已是可用模型）
+        if query:
+            rag_model = await recommend_model(
+                query,
+                category,
+                limit=3,
+                fallback=False,
+                available_models=available_models,
+            )
+            if rag_model:
+                logger.info(f"[RHComfyUI] RAG 推荐模型: {rag_model}")
+                if select_span:
+                    select_span.set_attr(model=rag_model)
+                return rag_model, MODEL_REGISTRY[rag_model].func
+
+        # 按排队深度、滚动耗时与错误率选择预计最快完成的模型
+        selected = await model_router.pick(available_models, MODEL_REGISTRY, category)
+        if selected is None:
+            selected = available_models[0]
+        logger.info(f"[RHComfyUI] 从类别 {category} 选择模型: {selected}")
+        if select_span:
+            select_span.set_attr(model=selected)
+        return selected, MODEL_REGISTRY[selected].func
+
+
+# ===== 模型调用 =====
+def is_failed_result(result: Any) -> bool:
+    """判断模型函数返回值是否表示失败（None 或错误状态码）"""
+    return result is None or (isinstance(result, int) and not isinstance(result, bool))
+
+
+def is_backend_failure(result: Any) -> bool:
+    """
+    判断失败结果是否归咎于后端（计入熔断）
 
-    # 如果指定了优先模型，先检查它
-    if preferred_model and preferred_model in category_models:
-        result = await availability_checker.check_model(MODEL_REGISTRY[preferred_model])
-        if result.is_available:
-            return preferred_model, MODEL_REGISTRY[preferred_model].func
-        else:
-            logger.warning(f"[RHComfyUI] 优先模型 {preferred_model} 不可用，尝试其他模型")
-
-    # 如果提供了 query，尝试使用 RAG 智能推荐
-    if query:
-        try:
-            rag_model = await recommend_model(query, category, limit=3, fallback=False)
-            if rag_model and rag_model in category_models:
-                # 检查 RAG 推荐的模型是否可用
-                result = await availability_checker.check_model(MODEL_REGISTRY[rag_model])
-                if result.is_available:
-                    logger.info(f"[RHComfyUI] RAG 推荐模型: {rag_model}")
-                    return rag_model, MODEL_REGISTRY[rag_model].func
-                else:
-                    logger.warning(f"[RHComfyUI] RAG 推荐模型 {rag_model} 不可用，尝试其他模型")
-        except Exception as e:
-            logger.warning(f"[RHComfyUI] RAG 推荐失败: {e}")
-
-    # 检查该类别所有模型的可用性
-    available_models = await availability_checker.filter_available(category_models, MODEL_REGISTRY)
+    传输错误/超时（None）与 5xx 视为后端故障；4xx、内容审核拒绝、
+    缺少密钥（-1）等属于请求本身的问题，后端是健康的
+    """
+    if result is None:
+        return True
+    return isinstance(result, int) and not isinstance(result, bool) and result >= 500
 
-    if not available_models:
-        # 记录所有不可用的原因
-        for name in category_models:
-            result = await availability_checker.check_model(MODEL_REGISTRY[name])
-            logger.warning(f"[RHComfyUI] 模型 {name} 不可用: {result.reason}")
 
-        raise ModelUnavailableError(f"类别 {category} 没有可用模型，请检查配置", "", ModelStatus.UNKNOWN)
+# 被对冲胜出方取代而取消的调用任务
+_superseded: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+
+
+def supersede(task: asyncio.Task) -> None:
+    """取消已被其他调用取代的 run_model 任务，其已耗时计为耗时下限"""
+    _superseded.add(task)
+    task.cancel()
+
 
-    # 随机选择一个可用模型
-    selected = random.choice(available_models)
-    logger.info(f"[RHComfyUI] 从类别 {category} 选择模型: {selected}")
-    return selected, MODEL_REGISTRY[selected].func
+async def run_model(model_name: str, model_func: Callable, *args, **kwargs) -> Any:
+    """
+    调用模型函数，并记录耗时与成功率
+
+    Args:
+        model_name: 模型名称
+        model_func: 模型函数
+        *args, **kwargs: 透传给模型函数的参数
+
+    Returns:
+        模型函数的返回值
+    """
+    info = MODEL_REGISTRY.get(model_name)
+    category = info.category if info else "unknown"
+
+    if info:
+        model_router.on_start(info)
+
+    start = time.perf_counter()
+    success = False
+    # 异常（连接错误、超时等）默认视为后端故障
+    backend_failed = True
+    cancelled = False
+    try:
+        with span("registry.run_model", model=model_name, category=category) as run_span, track_backend() as trace:
+            result = await model_func(*args, **kwargs)
+            success = not is_failed_result(result)
+            backend_failed = not success and is_backend_failure(result)
+            if run_span:
+                run_span.set_attr(failed=not success)
+    except asyncio.CancelledError:
+        # 被取消不代表后端故障，不计入熔断与路由统计
+        cancelled = True
+        MODEL_REQUESTS.inc(model=model_name, category=category, result="cancelled")
+        raise
+    except Exception:
+        MODEL_REQUESTS.inc(model=model_name, category=category, result="error")
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        if cancelled:
+            if info:
+                superseded = asyncio.current_task() in _superseded
+                model_router.on_cancel(info, duration if superseded else None)
+        elif trace.rejected and not success:
+            # 熔断器拒绝（半开期间已有试探调用），后端未收到请求，不计入熔断与路由统计
+            MODEL_DURATION.observe(duration, model=model_name)
+            if info:
+                model_router.on_cancel(info)
+        else:
+            MODEL_DURATION.observe(duration, model=model_name)
+            if info:
+                # 溢出到其他后端（如 RunningHub 代理）的调用计入实际后端
+                backend = trace.served[-1] if trace.served else info.backend
+                model_router.on_finish(info, duration, success, backend)
+                # 仅后端故障计入熔断，客户端错误（4xx、内容审核）说明后端可达
+                backend_health.record(
+                    backend,
+                    not backend_failed,
+                    "" if not backend_failed else f"模型 {model_name} 调用失败",
+                )
+        # 未记录结果的试探调用（取消、被其他后端拒绝）释放试探名额
+        for backend in trace.trial:
+            backend_health.end_trial(backend)
+
+    MODEL_REQUESTS.inc(
+        model=model_name,
+        category=category,
+        result="success" if success else "failed",
+    )
+    return result
@@ -0,0 +1,210 @@
+"""
+模型路由模块
+根据实时信号（后端排队深度、滚动 p50 耗时、错误率）在同一质量档位内挑选预计完成最快的模型
+"""
+
+import time
+import asyncio
+from typing import Dict, List, Tuple, Optional
+from collections import deque, defaultdict
+
+from gsuid_core.logger import logger
+
+from .constant import MODEL_PRIORITY, BACKEND_PARALLELISM, DEFAULT_EXPECTED_SECONDS
+from .model_availability import ModelInfo
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+
+class ModelStats:
+    """单个模型的滚动统计"""
+
+    def __init__(self, window: int = 50):
+        self.durations: deque = deque(maxlen=window)  # 成功调用的耗时
+        self.outcomes: deque = deque(maxlen=window)  # 调用结果 True/False
+        self.inflight = 0
+
+    def record(self, duration: float, success: bool) -> None:
+        self.outcomes.append(success)
+        if success:
+            self.durations.append(duration)
+
+    def record_lower_bound(self, duration: float) -> None:
+        """
+        记录截尾样本：调用被对冲取消时真实耗时至少为 duration
+
+        只在不低于当前 p95 时计入，较短的截尾样本会把分位数拉低
+        """
+        p95 = self.p95
+        if p95 is None or duration >= p95:
+            self.durations.append(duration)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.durations:
+            return None
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def p50(self) -> Optional[float]:
+        return self.percentile(0.5)
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class ModelRouter:
+    """基于预计完成时间的模型路由器"""
+
+    def __init__(self, window: int = 50, queue_ttl: float = 3):
+        self.window = window
+        self.queue_ttl = queue_ttl
+        self._stats: Dict[str, ModelStats] = {}
+        self._backend_inflight: Dict[str, int] = defaultdict(int)
+        # 获取失败同样缓存（值为 None），后端无响应时不必每次路由都等待超时
+        self._queue_cache: Dict[str, Tuple[float, Optional[int]]] = {}
+
+    def stats(self, model_name: str) -> ModelStats:
+        if model_name not in self._stats:
+            self._stats[model_name] = ModelStats(self.window)
+        return self._stats[model_name]
+
+    def on_start(self, info: ModelInfo) -> None:
+        """模型调用开始"""
+        self.stats(info.name).inflight += 1
+        self._backend_inflight[info.backend] += 1
+
+    def on_finish(self, info: ModelInfo, duration: float, success: bool, backend: Optional[str] = None) -> None:
+        """模型调用结束，backend 为实际完成调用的后端，与模型所在后端不同时不计入该模型的统计"""
+        stats = self.stats(info.name)
+        stats.inflight = max(0, stats.inflight - 1)
+        if backend is None or backend == info.backend:
+            stats.record(duration, success)
+        self._backend_inflight[info.backend] = max(0, self._backend_inflight[info.backend] - 1)
+
+    def on_cancel(self, info: ModelInfo, lower_bound: Optional[float] = None) -> None:
+        """
+        模型调用被取消，不计入错误率
+
+        对冲请求的落后方传入已耗时作为耗时下限，避免慢调用从样本中消失使 p95 持续偏低；
+        调用方主动取消时不计入耗时
+        """
+        stats = self.stats(info.name)
+        stats.inflight = max(0, stats.inflight - 1)
+        if lower_bound is not None:
+            stats.record_lower_bound(lower_bound)
+        self._backend_inflight[info.backend] = max(0, self._backend_inflight[info.backend] - 1)
+
+    async def _fetch_remote_queue(self, backend: str) -> Optional[int]:
+        if backend != "comfyui":
+            return None
+        from .comfyui.comfyui_api import get_api
+
+        return await asyncio.wait_for(get_api().get_queue_remaining(), timeout=2)
+
+    async def backend_queue_depth(self, backend: str) -> int:
+        """后端当前排队深度，优先使用后端实时数据，失败时退回本地在途数"""
+        local = self._backend_inflight[backend]
+        now = time.monotonic()
+
+        cached = self._queue_cache.get(backend)
+        if cached and now - cached[0] < self.queue_ttl:
+            remote = cached[1]
+        else:
+            try:
+                remote = await self._fetch_remote_queue(backend)
+            except Exception as e:
+                logger.debug(f"[RHComfyUI][Router] 获取 {backend} 排队深度失败: {e}")
+                remote = None
+            self._queue_cache[backend] = (now, remote)
+
+        if remote is None:
+            return local
+        return max(local, remote)
+
+    def expected_seconds(self, info: ModelInfo, queue_depth: int) -> float:
+        """估算一个新任务在该模型上的完成时间（秒）"""
+        stats = self._stats.get(info.name)
+        p50 = stats.p50 if stats else None
+        if p50 is None:
+            p50 = DEFAULT_EXPECTED_SECONDS.get(info.category, 60)
+
+        parallelism = BACKEND_PARALLELISM.get(info.backend, 1)
+        wait = queue_depth / parallelism * p50
+
+        # 失败意味着要重试或换模型，按错误率放大期望耗时
+        error_rate = stats.error_rate if stats else 0
+        return (wait + p50) / max(1 - error_rate, 0.2)
+
+    def _cost_weight(self) -> float:
+        try:
+            return float(RHCOMFYUI_CONFIG.get_config("Route_Cost_Weight").data)
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _target_tier(candidates: List[ModelInfo], category: str) -> int:
+        """以优先级最高的可用模型所在档位为准，否则取最低档位"""
+        names = {info.name: info for info in candidates}
+        for name in MODEL_PRIORITY.get(category, []):
+            if name in names:
+                return names[name].tier
+        return min(info.tier for info in candidates)
+
+    async def rank(
+        self,
+        available_models: List[str],
+        registry: Dict[str, ModelInfo],
+        category: str,
+    ) -> List[Tuple[str, float]]:
+        """
+        对可用模型按评分排序（越小越好）
+
+        评分 = 预计完成时间(秒) + 成本权重 × 成本
+        """
+        candidates = [registry[name] for name in available_models if name in registry]
+        if not candidates:
+            return []
+
+        tier = self._target_tier(candidates, category)
+        candidates = [info for info in candidates if info.tier == tier]
+
+        backends = sorted({info.backend for info in candidates})
+        depths = await asyncio.gather(*(self.backend_queue_depth(b) for b in backends))
+        queue_depth = dict(zip(backends, depths))
+
+        cost_weight = self._cost_weight()
+        priority = MODEL_PRIORITY.get(category, [])
+
+        def _priority_index(name: str) -> int:
+            return priority.index(name) if name in priority else len(priority)
+
+        scored = [
+            (info.name, self.expected_seconds(info, queue_depth[info.backend]) + cost_weight * info.cost)
+            for info in candidates
+        ]
+        scored.sort(key=lambda x: (x[1], _priority_index(x[0])))
+        return scored
+
+    async def pick(
+        self,
+        available_models: List[str],
+        registry: Dict[str, ModelInfo],
+        category: str,
+    ) -> Optional[str]:
+        """选出评分最好的模型"""
+        ranked = await self.rank(available_models, registry, category)
+        if not ranked:
+            return None
+        logger.info(f"[RHComfyUI][Router] {category} 路由评分: " + ", ".join(f"{n}={s:.1f}" for n, s in ranked))
+        return ranked[0][0]
+
+
+# 全局路由器实例
+model_router = ModelRouter()
@@ -3,6 +3,7 @@
 提供 RAG 预过滤和可用性检查集成
 """
 
+from gsuid_core.server import on_core_start
 from gsuid_core.ai_core.register import ai_entity
 
 from .model_knowledge import MODEL_KNOWLEDGE
@@ -37,4 +38,7 @@ def register_model_kai():
             ai_entity(knowledge_point)  # type: ignore
 
 
-register_model_kai()
+@on_core_start
+async def register_model_kai_on_start():
+    # 知识注册不在插件导入时执行，避免拖慢启动
+    register_model_kai()
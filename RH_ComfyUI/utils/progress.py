@@ -0,0 +1,55 @@
+"""
+生成进度通知
+指令处理函数通过 progress_reporter 登记发送进度消息的回调，模型函数在生成期间调用 report_progress，
+同一任务内的进度消息按最小间隔发送，避免刷屏
+"""
+
+import time
+from typing import Callable, Iterator, Optional, Awaitable
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from gsuid_core.logger import logger
+
+# 两条进度消息之间的最小间隔（秒）
+PROGRESS_INTERVAL = 5
+
+ProgressCallback = Callable[[str], Awaitable[object]]
+
+
+class _Reporter:
+    def __init__(self, callback: ProgressCallback, interval: float):
+        self.callback = callback
+        self.interval = interval
+        self._last = float("-inf")
+
+    async def report(self, text: str) -> None:
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        await self.callback(text)
+
+
+_reporter: ContextVar[Optional[_Reporter]] = ContextVar("rh_progress_reporter", default=None)
+
+
+@contextmanager
+def progress_reporter(callback: ProgressCallback, interval: float = PROGRESS_INTERVAL) -> Iterator[None]:
+    """在当前任务内登记进度消息的发送方式"""
+    token = _reporter.set(_Reporter(callback, interval))
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+
+async def report_progress(text: str) -> None:
+    """报告一行生成进度，没有登记回调时不做任何事"""
+    reporter = _reporter.get()
+    if reporter is None:
+        return
+    try:
+        await reporter.report(text)
+    except Exception as e:
+        logger.warning(f"[RHComfyUI] 发送进度消息失败: {e}")
@@ -0,0 +1,168 @@
+"""
+后端请求限速
+每个 (后端, API Key) 共用一个令牌桶，按配置的每分钟请求数平滑放行；
+排队的请求按到达顺序逐个放行，不会在退避结束时同时涌出。
+收到 421/429 时按 Retry-After（没有时按指数退避）暂停整个桶，并将速率减半，
+之后每次成功请求逐步恢复到配置值
+"""
+
+import time
+import asyncio
+from typing import Dict, Tuple, Union, Optional
+from email.utils import parsedate_to_datetime
+
+from gsuid_core.logger import logger
+
+from .metrics import RATE_LIMIT_RPS, RATE_LIMIT_WAIT, RATE_LIMIT_THROTTLED, mask_key
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+# 各后端对应的每分钟请求数配置
+RATE_CONFIG = {
+    "runninghub": "RH_Requests_Per_Minute",
+    "blt": "BLT_Requests_Per_Minute",
+}
+
+# 没有 Retry-After 时的退避秒数，连续限速时翻倍
+BACKOFF_BASE = 10
+BACKOFF_MAX = 180
+
+# 限速后速率的下限（相对配置值），以及每次成功请求恢复的比例
+MIN_RATE_FACTOR = 0.1
+RECOVER_FACTOR = 0.05
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After，支持秒数与 HTTP 日期两种格式"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """单个 (后端, API Key) 的令牌桶"""
+
+    def __init__(self, provider: str, per_minute: int, label: str = ""):
+        self.provider = provider
+        self.label = label  # 脱敏后的 Key，用于指标
+        self.configured = per_minute / 60
+        self.rate = self.configured
+        self.tokens = max(self.configured, 1)
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def capacity(self) -> float:
+        # 最多积攒 1 秒的请求量
+        return max(self.rate, 1)
+
+    def configure(self, per_minute: int) -> None:
+        configured = per_minute / 60
+        if configured != self.configured:
+            self.configured = configured
+            self.rate = configured if not self.strikes else min(self.rate, configured)
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """距离下一个令牌可用的秒数"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.configured <= 0:
+            return 0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        start = time.monotonic()
+        # 持锁等待，后到的请求排在锁上依次放行
+        async with self._lock:
+            while (delay := self._delay()) > 0:
+                await asyncio.sleep(delay)
+            if self.configured > 0:
+                self.tokens -= 1
+        RATE_LIMIT_WAIT.observe(time.monotonic() - start, provider=self.provider)
+
+    def throttled(self, retry_after: Optional[float] = None) -> float:
+        """被后端限速，暂停整个桶并降低速率，返回暂停秒数"""
+        now = time.monotonic()
+        # 同一次暂停期间陆续返回的限速响应只降速一次
+        paused = now < self.blocked_until
+        if not paused:
+            self.strikes += 1
+        if retry_after is None:
+            retry_after = min(BACKOFF_BASE * 2 ** (self.strikes - 1), BACKOFF_MAX)
+
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        RATE_LIMIT_THROTTLED.inc(provider=self.provider)
+        if paused:
+            return retry_after
+        if self.configured > 0:
+            self.rate = max(self.rate / 2, self.configured * MIN_RATE_FACTOR)
+            self.tokens = 0
+            self._updated = self.blocked_until
+        RATE_LIMIT_RPS.set(self.rate, provider=self.provider, key=self.label)
+        return retry_after
+
+    def succeeded(self) -> None:
+        if not self.strikes and self.rate >= self.configured:
+            return
+        self.strikes = 0
+        self.rate = min(self.configured, self.rate + self.configured * RECOVER_FACTOR)
+        RATE_LIMIT_RPS.set(self.rate, provider=self.provider, key=self.label)
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    @staticmethod
+    def _per_minute(provider: str) -> int:
+        try:
+            return int(RHCOMFYUI_CONFIG.get_config(RATE_CONFIG[provider]).data)
+        except Exception:
+            return 0
+
+    def bucket(self, provider: str, key: str) -> TokenBucket:
+        per_minute = self._per_minute(provider)
+        bucket = self._buckets.get((provider, key))
+        if bucket is None:
+            bucket = self._buckets[(provider, key)] = TokenBucket(provider, per_minute, mask_key(key))
+            RATE_LIMIT_RPS.set(bucket.rate, provider=provider, key=bucket.label)
+        else:
+            bucket.configure(per_minute)
+        return bucket
+
+    async def acquire(self, provider: str, key: str) -> None:
+        await self.bucket(provider, key).acquire()
+
+    def paused(self, provider: str, key: str) -> bool:
+        """该 Key 是否处于限速暂停中"""
+        bucket = self._buckets.get((provider, key))
+        return bucket is not None and time.monotonic() < bucket.blocked_until
+
+    def throttled(self, provider: str, key: str, retry_after: Union[str, float, None] = None) -> None:
+        if isinstance(retry_after, str):
+            retry_after = parse_retry_after(retry_after)
+        seconds = self.bucket(provider, key).throttled(retry_after)
+        logger.info(f"[RHComfyUI][RateLimit] {provider} 请求过于频繁，暂停 {seconds:.0f} 秒并降低请求速率")
+
+    def succeeded(self, provider: str, key: str) -> None:
+        self.bucket(provider, key).succeeded()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,83 @@
+"""
+RAG 模型推荐缓存
+以 (类别, 归一化提示词) 为键缓存 RAG 排序后的模型列表，避免每次生成都在关键路径上做向量检索
+缓存的是与可用性无关的排序结果，读取时再按当前可用模型过滤
+"""
+
+import re
+import time
+import unicodedata
+from typing import List, Tuple, Optional
+from collections import OrderedDict
+
+from .metrics import RAG_QUERY_SECONDS, RAG_CACHE_REQUESTS, RAG_CACHE_SAVED_SECONDS
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+_PUNCTUATION = re.compile(r"[\s\W_]+", re.UNICODE)
+_CJK_SPACE = re.compile(r"(?<=[\u3040-\u30ff\u4e00-\u9fff]) (?=[\u3040-\u30ff\u4e00-\u9fff])")
+
+
+def normalize_query(query: str) -> str:
+    """归一化提示词：全角转半角、小写、标点与空白折叠为单个空格，中文之间的空格去掉"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _PUNCTUATION.sub(" ", text).strip()
+    return _CJK_SPACE.sub("", text)
+
+
+class RecommendCache:
+    """带 TTL 的 LRU 缓存"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+
+    @staticmethod
+    def _ttl() -> int:
+        try:
+            return int(RHCOMFYUI_CONFIG.get_config("RAG_Cache_TTL").data)
+        except Exception:
+            return 600
+
+    def get(self, category: str, query: str) -> Optional[List[str]]:
+        ttl = self._ttl()
+        if ttl <= 0:
+            return None
+
+        key = (category, normalize_query(query))
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if time.monotonic() - item[0] > ttl:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, category: str, query: str, ranked: List[str]) -> None:
+        if self._ttl() <= 0:
+            return
+        key = (category, normalize_query(query))
+        self._data[key] = (time.monotonic(), ranked)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def record_cache(result: str) -> None:
+    """记录一次缓存结果，命中或跳过时按历史平均检索耗时计入节省时间"""
+    RAG_CACHE_REQUESTS.inc(result=result)
+    if result in ("hit", "skip"):
+        count, total = RAG_QUERY_SECONDS.summary()
+        if count:
+            RAG_CACHE_SAVED_SECONDS.inc(total / count)
+
+
+# 全局推荐缓存实例
+recommend_cache = RecommendCache()
@@ -0,0 +1,117 @@
+"""
+模型注册表索引
+一次性构建 类别 / 后端 / 依赖 → 模型名 的只读索引，运行时注册或移除模型时增量更新
+每个模型分配一个固定的位，可用性以位图表示，过滤时无需逐个检查
+"""
+
+from types import MappingProxyType
+from typing import Dict, List, Tuple, Mapping, Callable, Iterable, Iterator
+
+from .model_availability import ModelInfo, ModelRequirement
+
+_EMPTY: Tuple[str, ...] = ()
+
+
+def _add(index: Mapping[str, Tuple[str, ...]], key, name: str) -> Mapping:
+    """写时复制：返回加入 name 后的新索引"""
+    data = dict(index)
+    data[key] = data.get(key, _EMPTY) + (name,)
+    return MappingProxyType(data)
+
+
+def _remove(index: Mapping[str, Tuple[str, ...]], key, name: str) -> Mapping:
+    """写时复制：返回移除 name 后的新索引"""
+    data = dict(index)
+    names = tuple(n for n in data.get(key, _EMPTY) if n != name)
+    if names:
+        data[key] = names
+    else:
+        data.pop(key, None)
+    return MappingProxyType(data)
+
+
+class RegistryIndex:
+    """MODEL_REGISTRY 的只读索引"""
+
+    def __init__(self, registry: Dict[str, ModelInfo]):
+        self.registry = registry
+        self.version = 0
+        self.bits: Mapping[str, int] = MappingProxyType({})
+        self.by_category: Mapping[str, Tuple[str, ...]] = MappingProxyType({})
+        self.by_backend: Mapping[str, Tuple[str, ...]] = MappingProxyType({})
+        self.by_requirement: Mapping[ModelRequirement, Tuple[str, ...]] = MappingProxyType({})
+        for info in registry.values():
+            self._index(info)
+
+    def _unindex(self, info: ModelInfo) -> None:
+        self.by_category = _remove(self.by_category, info.category, info.name)
+        self.by_backend = _remove(self.by_backend, info.backend, info.name)
+        for req in info.requirements:
+            self.by_requirement = _remove(self.by_requirement, req, info.name)
+
+    def _index(self, info: ModelInfo) -> None:
+        if info.name not in self.bits:
+            bits = dict(self.bits)
+            bits[info.name] = 1 << len(bits)
+            self.bits = MappingProxyType(bits)
+
+        self.by_category = _add(self.by_category, info.category, info.name)
+        self.by_backend = _add(self.by_backend, info.backend, info.name)
+        for req in info.requirements:
+            self.by_requirement = _add(self.by_requirement, req, info.name)
+        self.version += 1
+
+    def register(self, info: ModelInfo) -> None:
+        """注册（或替换）一个模型，只更新受影响的索引项"""
+        old = self.registry.get(info.name)
+        if old is not None:
+            self._unindex(old)
+        self.registry[info.name] = info
+        self._index(info)
+
+    def unregister(self, name: str) -> None:
+        """移除一个模型，其位不再复用"""
+        info = self.registry.pop(name, None)
+        if info is None:
+            return
+        self._unindex(info)
+        self.version += 1
+
+    def category(self, category: str) -> Tuple[str, ...]:
+        return self.by_category.get(category, _EMPTY)
+
+    def backend(self, backend: str) -> Tuple[str, ...]:
+        return self.by_backend.get(backend, _EMPTY)
+
+    def requirement(self, req: ModelRequirement) -> Tuple[str, ...]:
+        return self.by_requirement.get(req, _EMPTY)
+
+    def mask(self, names: Iterable[str]) -> int:
+        """模型名集合 → 位图"""
+        mask = 0
+        for name in names:
+            mask |= self.bits.get(name, 0)
+        return mask
+
+    def select(self, names: Iterable[str], mask: int) -> List[str]:
+        """保持顺序地取出位图中置位的模型"""
+        return [name for name in names if self.bits.get(name, 0) & mask]
+
+
+class CategoryFuncs(Mapping):
+    """某一类别 模型名 → 模型函数 的实时只读视图，运行时注册的模型会自动出现"""
+
+    def __init__(self, index: RegistryIndex, category: str):
+        self._index = index
+        self._category = category
+
+    def __getitem__(self, name: str) -> Callable:
+        if name not in self._index.category(self._category):
+            raise KeyError(name)
+        return self._index.registry[name].func
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index.category(self._category))
+
+    def __len__(self) -> int:
+        return len(self._index.category(self._category))
@@ -2,8 +2,11 @@ import sys
 import json
 import random
 import shutil
+import hashlib
+from typing import Dict, List
 from pathlib import Path
 
+from gsuid_core.logger import logger
 from gsuid_core.data_store import get_res_path
 
 MAIN_PATH = get_res_path() / "RHComfyUI"
@@ -15,6 +18,7 @@ CONFIG_PATH = MAIN_PATH / "config.json"
 _CP_WORKFLOW_PATH = Path(__file__).parent / "workflow"
 WORKFLOW_PATH = MAIN_PATH / "workflow"
 OUTPUT_PATH = MAIN_PATH / "output"
+TRACE_PATH = MAIN_PATH / "trace"
 
 DRAW_TEXT_WORKFLOW_PATH = WORKFLOW_PATH / "文生图"
 DRAW_IMAGE_WORKFLOW_PATH = WORKFLOW_PATH / "图生图"
@@ -26,7 +30,22 @@ VIDEO_BY_TEXT_WORKFLOW_PATH = WORKFLOW_PATH / "文生视频"
 VIDEO_BY_IMAGE_WORKFLOW_PATH = WORKFLOW_PATH / "图生视频"
 
 
+# 记录每个插件自带文件上次同步时的内容哈希，用于判断运维是否修改过
+SYNC_STATE_PATH = WORKFLOW_PATH / ".sync_state.json"
+
+
+def _bundled_path(path: Path) -> Path:
+    """WORKFLOW_PATH 下的路径 → 插件自带的对应路径"""
+    try:
+        return _CP_WORKFLOW_PATH / path.relative_to(WORKFLOW_PATH)
+    except ValueError:
+        return path
+
+
 def load_workflow(path: Path):
+    # 启动后的同步尚未完成时，退回插件自带的工作流
+    if not path.exists():
+        path = _bundled_path(path)
     with open(path, "r", encoding="utf-8") as f:
         workflow = json.load(f)
     for i in workflow:
@@ -42,6 +61,7 @@ def init_dir():
         MAIN_PATH,
         WORKFLOW_PATH,
         OUTPUT_PATH,
+        TRACE_PATH,
         EDIT_WORKFLOW_PATH,
         DRAW_TEXT_WORKFLOW_PATH,
         DRAW_IMAGE_WORKFLOW_PATH,
@@ -52,12 +72,59 @@ def init_dir():
     ]:
         i.mkdir(parents=True, exist_ok=True)
 
-    # 将workflow中的文件复制到MAIN_PATH/workflow中
-    for _dir in _CP_WORKFLOW_PATH.iterdir():
-        for _file in _dir.iterdir():
-            pa = WORKFLOW_PATH / _dir.name / _file.name
-            pa.parent.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(_file, pa)
+
+def _file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def sync_workflows() -> List[str]:
+    """
+    将插件自带的工作流增量同步到 WORKFLOW_PATH
+
+    - 目标不存在：复制
+    - 目标与自带文件一致：跳过
+    - 目标与上次同步的内容一致（未被修改过）而自带文件已更新：覆盖
+    - 没有同步记录（升级后首次启动，旧版本每次启动都会覆盖）：覆盖并记录
+    - 目标与同步记录不一致（被运维修改过）：保留，不覆盖
+
+    Returns:
+        本次复制的文件（相对路径）
+    """
+    try:
+        state: Dict[str, str] = json.loads(SYNC_STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {}
+
+    copied = []
+    for src in sorted(_CP_WORKFLOW_PATH.rglob("*")):
+        if not src.is_file():
+            continue
+        rel = src.relative_to(_CP_WORKFLOW_PATH).as_posix()
+        dst = WORKFLOW_PATH / rel
+        src_hash = _file_hash(src)
+
+        if dst.exists():
+            dst_hash = _file_hash(dst)
+            if dst_hash == src_hash:
+                state[rel] = src_hash
+                continue
+            recorded = state.get(rel)
+            if recorded is not None and dst_hash != recorded:
+                logger.info(f"[RHComfyUI] 工作流 {rel} 已被修改，保留本地版本（删除该文件可恢复插件自带版本）")
+                continue
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+        state[rel] = src_hash
+        copied.append(rel)
+
+    tmp = SYNC_STATE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(SYNC_STATE_PATH)
+
+    if copied:
+        logger.info(f"[RHComfyUI] 已同步工作流: {copied}")
+    return copied
 
 
 init_dir()
@@ -0,0 +1,200 @@
+"""
+任务追踪模块
+为每次生成任务分配 job_id，并记录 wrapper → registry → 后端 各阶段的耗时 span，
+任务结束后以 JSON Lines 格式按天写入 TRACE_PATH，新建当天文件时清理超出保留天数的旧文件
+"""
+
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, List, Iterator, Optional, AsyncIterator
+from datetime import datetime, timedelta
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import field, replace, dataclass
+
+from gsuid_core.logger import logger
+
+from .resource.RESOURCE_PATH import TRACE_PATH
+from ..rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+
+@dataclass
+class Span:
+    """单个阶段的追踪记录"""
+
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    def set_attr(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+@dataclass
+class JobTrace:
+    """一次生成任务的所有 span"""
+
+    job_id: str
+    name: str
+    start_time: float
+    spans: List[Span] = field(default_factory=list)
+
+    def to_lines(self) -> List[str]:
+        lines = []
+        for span in self.spans:
+            record = {
+                "job_id": self.job_id,
+                "job": self.name,
+                "span_id": span.span_id,
+                "parent_id": span.parent_id,
+                "name": span.name,
+                "offset_ms": round((span.start - self.spans[0].start) * 1000, 2),
+                "duration_ms": round(span.duration * 1000, 2) if span.duration is not None else None,
+                "attrs": span.attrs,
+                "error": span.error,
+                "time": datetime.fromtimestamp(self.start_time).isoformat(),
+            }
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        return lines
+
+
+_current_job: ContextVar[Optional[JobTrace]] = ContextVar("rh_current_job", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("rh_current_span", default=None)
+
+
+def current_job_id() -> Optional[str]:
+    """获取当前任务的 job_id，不在任务中时返回 None"""
+    job = _current_job.get()
+    return job.job_id if job else None
+
+
+def _is_enabled() -> bool:
+    try:
+        return bool(RHCOMFYUI_CONFIG.get_config("Trace_Enable").data)
+    except Exception:
+        return False
+
+
+def _retention_days() -> int:
+    try:
+        return int(RHCOMFYUI_CONFIG.get_config("Trace_Retention_Days").data)
+    except Exception:
+        return 7
+
+
+def _prune_traces(today: datetime) -> None:
+    """删除超出保留天数的追踪文件，保留天数为 0 时不清理"""
+    days = _retention_days()
+    if days <= 0:
+        return
+    cutoff = (today - timedelta(days=days)).strftime("%Y-%m-%d")
+    for path in TRACE_PATH.glob("*.jsonl"):
+        # 文件名为 YYYY-MM-DD，按字符串比较即按日期比较
+        if path.stem < cutoff:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"[RHComfyUI][Trace] 删除旧追踪文件失败: {e}")
+
+
+def _write_lines(lines: List[str]) -> None:
+    TRACE_PATH.mkdir(parents=True, exist_ok=True)
+    now = datetime.now()
+    path = TRACE_PATH / f"{now.strftime('%Y-%m-%d')}.jsonl"
+    if not path.exists():
+        _prune_traces(now)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """
+    记录一个阶段的耗时，不在任务中时不做任何事
+
+    Args:
+        name: 阶段名称 (如 comfyui.queue_prompt)
+        **attrs: 附加属性
+    """
+    job = _current_job.get()
+    if job is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start=time.perf_counter(),
+        attrs=attrs,
+    )
+    job.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+
+
+@contextmanager
+def collect_spans() -> Iterator[List[Span]]:
+    """
+    在独立的 span 列表中记录阶段耗时，供多个任务共享的子任务（如微批合并提交）使用
+
+    退出后由各任务通过 attach_spans 挂到自己的追踪记录下
+    """
+    job = JobTrace(job_id="", name="", start_time=time.time())
+    job_token = _current_job.set(job)
+    span_token = _current_span.set(None)
+    try:
+        yield job.spans
+    finally:
+        _current_span.reset(span_token)
+        _current_job.reset(job_token)
+
+
+def attach_spans(spans: List[Span]) -> None:
+    """将 collect_spans 收集的 span 挂到当前任务的当前 span 下，不在任务中时不做任何事"""
+    job = _current_job.get()
+    if job is None:
+        return
+    parent = _current_span.get()
+    parent_id = parent.span_id if parent else None
+    for item in spans:
+        job.spans.append(replace(item, parent_id=parent_id) if item.parent_id is None else item)
+
+
+@asynccontextmanager
+async def trace_job(name: str, **attrs: Any) -> AsyncIterator[Optional[Span]]:
+    """
+    开启一次任务追踪，退出时导出所有 span
+
+    已处于任务中时仅作为普通 span 记录，不会重复创建 job
+    """
+    if _current_job.get() is not None or not _is_enabled():
+        with span(name, **attrs) as s:
+            yield s
+        return
+
+    job = JobTrace(job_id=uuid.uuid4().hex, name=name, start_time=time.time())
+    job_token = _current_job.set(job)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _current_job.reset(job_token)
+        try:
+            await asyncio.to_thread(_write_lines, job.to_lines())
+        except Exception as e:
+            logger.warning(f"[RHComfyUI][Trace] 写入追踪记录失败: {e}")
@@ -1,45 +1,56 @@
 from typing import List, Optional
 
+from gsuid_core.models import Event
 from gsuid_core.segment import MessageSegment
 from gsuid_core.ai_core.register import ai_tools
 from gsuid_core.utils.resource_manager import RM
 
 # 导入 model_wrapper 以注册模型知识库到 RAG
-from . import model_wrapper  # noqa: F401
+# 导入 model_manifest 以在启动后加载工作流清单中声明的模型
+from . import (
+    model_wrapper,  # noqa: F401
+    model_manifest,  # noqa: F401
+)
+from .hedging import run_hedged
+from .tracing import trace_job
+from .fair_scheduler import fair_scheduler
 from .model_registry import (
-    MODEL_REGISTRY,
+    REGISTRY_INDEX,
     Draw_Point,
     Music_Point,
     Video_Point,
     Speech_Point,
     Edit_Image_Point,
+    run_model,
     check_point,
     select_available_model,
 )
+from .registry_index import CategoryFuncs
 
-# 工作流字典（保持与原代码兼容）
-text2image_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "text2image"}
+# 工作流字典（保持与原代码兼容，为注册表索引的实时视图）
+text2image_workflow = CategoryFuncs(REGISTRY_INDEX, "text2image")
 
-image2image_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "image2image"}
+image2image_workflow = CategoryFuncs(REGISTRY_INDEX, "image2image")
 
-image_edit_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "image_edit"}
+image_edit_workflow = CategoryFuncs(REGISTRY_INDEX, "image_edit")
 
-music_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "music"}
+music_workflow = CategoryFuncs(REGISTRY_INDEX, "music")
 
-speech_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "speech"}
+speech_workflow = CategoryFuncs(REGISTRY_INDEX, "speech")
 
-text2video_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "text2video"}
+text2video_workflow = CategoryFuncs(REGISTRY_INDEX, "text2video")
 
-image2video_workflow = {name: info.func for name, info in MODEL_REGISTRY.items() if info.category == "image2video"}
+image2video_workflow = CategoryFuncs(REGISTRY_INDEX, "image2video")
 
 
 # ===== AI 工具函数 =====
-@ai_tools(check_func=check_point, point=Draw_Point)
+@ai_tools(check_func=check_point, point=Draw_Point, category="text2image")
 async def gen_image_by_text(
     prompt: str,
     w: int = 720,
     h: int = 1280,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     文生图工具：根据文字描述生成图片
@@ -54,20 +65,24 @@ async def gen_image_by_text(
     - banana2: 高效轻量级文生图模型（需要配置 BLT API Key）
     - banana_pro: 高质量文生图专业模型（需要配置 BLT API Key）
     """
-    model_name, model_func = await select_available_model(
-        "text2image",
-        model,
-        query=prompt,
-    )
-    result = await model_func(prompt, w, h)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Draw_Point)
+    async with trace_job("gen_image_by_text"), fair_scheduler.slot(ev, "text2image"):
+        model_name, model_func = await select_available_model(
+            "text2image",
+            model,
+            query=prompt,
+        )
+        # 指定了模型时不对冲到其他模型
+        run = run_model if model else run_hedged
+        result = await run(model_name, model_func, prompt, w, h)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Draw_Point, category="image2image")
 async def gen_image_by_img(
     prompt: str,
     image_id: str,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     图生图工具：以现有图片为基础，根据文字描述生成新图片
@@ -78,21 +93,23 @@ async def gen_image_by_img(
     可用模型：
     - qwen_2512_img2img: 通义千问图生图模型（需要配置 ComfyUI 地址）
     """
-    model_name, model_func = await select_available_model(
-        "image2image",
-        model,
-        query=prompt,
-    )
-    image = await RM.get(image_id)
-    result = await model_func(prompt, image)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Edit_Image_Point)
+    async with trace_job("gen_image_by_img"), fair_scheduler.slot(ev, "image2image"):
+        model_name, model_func = await select_available_model(
+            "image2image",
+            model,
+            query=prompt,
+        )
+        image = await RM.get(image_id)
+        result = await run_model(model_name, model_func, prompt, image)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Edit_Image_Point, category="image_edit")
 async def gen_edit_img_by_img(
     prompt: str,
     image_id_list: List[str],
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     图片编辑工具：对已有图片进行智能编辑和修改
@@ -107,21 +124,23 @@ async def gen_edit_img_by_img(
     - banana2: 高效轻量级图片编辑模型（需要配置 BLT API Key）
     - banana_pro: 高质量图片编辑专业模型（需要配置 BLT API Key）
     """
-    model_name, model_func = await select_available_model(
-        "image_edit",
-        model,
-        query=prompt,
-    )
-    image_list = [await RM.get(image_id) for image_id in image_id_list]
-    result = await model_func(prompt, image_list)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Music_Point)
+    async with trace_job("gen_edit_img_by_img"), fair_scheduler.slot(ev, "image_edit"):
+        model_name, model_func = await select_available_model(
+            "image_edit",
+            model,
+            query=prompt,
+        )
+        image_list = [await RM.get(image_id) for image_id in image_id_list]
+        result = await run_model(model_name, model_func, prompt, image_list)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Music_Point, category="music")
 async def gen_music(
     style_prompt: str,
     lyric_prompt: Optional[str] = None,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     音乐生成工具：根据风格和歌词描述生成音乐
@@ -133,21 +152,23 @@ async def gen_music(
     可用模型：
     - ace_step1.5: 高质量音乐生成模型（需要配置 ComfyUI 地址）
     """
-    model_name, model_func = await select_available_model(
-        "music",
-        model,
-        query=style_prompt,
-    )
-    result = await model_func(style_prompt, lyric_prompt)
-    if result is not None:
-        return MessageSegment.record(result)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Speech_Point)
+    async with trace_job("gen_music"), fair_scheduler.slot(ev, "music"):
+        model_name, model_func = await select_available_model(
+            "music",
+            model,
+            query=style_prompt,
+        )
+        result = await run_model(model_name, model_func, style_prompt, lyric_prompt)
+        if result is not None:
+            return MessageSegment.record(result)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Speech_Point, category="speech")
 async def gen_speech(
     text: str,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     语音生成工具：将文字转换为语音音频
@@ -159,23 +180,25 @@ async def gen_speech(
     可用模型：
     - IndexTTS2: 高质量语音合成模型（需要配置 ComfyUI 地址）
     """
-    model_name, model_func = await select_available_model(
-        "speech",
-        model,
-        query=text,
-    )
-    result = await model_func(text)
-    if result is not None:
-        return MessageSegment.record(result)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Video_Point)
+    async with trace_job("gen_speech"), fair_scheduler.slot(ev, "speech"):
+        model_name, model_func = await select_available_model(
+            "speech",
+            model,
+            query=text,
+        )
+        result = await run_model(model_name, model_func, text)
+        if result is not None:
+            return MessageSegment.record(result)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Video_Point, category="text2video")
 async def gen_video_by_text(
     prompt: str,
     w: int = 720,
     h: int = 1280,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     文生视频工具：根据文字描述生成视频
@@ -187,24 +210,26 @@ async def gen_video_by_text(
     可用模型：
     - wan2.2_text2video: 高质量文生视频模型（需要配置 ComfyUI 地址）
     """
-    model_name, model_func = await select_available_model(
-        "text2video",
-        model,
-        query=prompt,
-    )
-    result = await model_func(prompt, w, h)
-    if result is not None:
-        return MessageSegment.video(result)
-    return result
-
-
-@ai_tools(check_func=check_point, point=Video_Point)
+    async with trace_job("gen_video_by_text"), fair_scheduler.slot(ev, "text2video"):
+        model_name, model_func = await select_available_model(
+            "text2video",
+            model,
+            query=prompt,
+        )
+        result = await run_model(model_name, model_func, prompt, w, h)
+        if result is not None:
+            return MessageSegment.video(result)
+        return result
+
+
+@ai_tools(check_func=check_point, point=Video_Point, category="image2video")
 async def gen_video_by_img(
     prompt: str,
     image_id: str,
     w: int = 720,
     h: int = 1280,
     model: Optional[str] = None,
+    ev: Optional[Event] = None,
 ):
     """
     图生视频工具：以图片为基础生成动态视频
@@ -216,13 +241,74 @@ async def gen_video_by_img(
     可用模型：
     - wan2.2_img2video: 高质量图生视频模型（需要配置 ComfyUI 地址）
     """
-    model_name, model_func = await select_available_model(
-        "image2video",
-        model,
-        query=prompt,
-    )
-    image = await RM.get(image_id)
-    result = await model_func(prompt, image, w, h)
-    if result is not None:
-        return MessageSegment.video(result)
-    return result
+    async with trace_job("gen_video_by_img"), fair_scheduler.slot(ev, "image2video"):
+        model_name, model_func = await select_available_model(
+            "image2video",
+            model,
+            query=prompt,
+        )
+        image = await RM.get(image_id)
+        result = await run_model(model_name, model_func, prompt, image, w, h)
+        if result is not None:
+            return MessageSegment.video(result)
+        return result
+
+
+# ===== 批量生成（供指令使用，按张扣除积分，不注册为 AI 工具） =====
+def _batch_kwargs(batch: int) -> dict:
+    return {"batch": batch} if batch > 1 else {}
+
+
+async def gen_images_by_text(
+    prompt: str,
+    batch: int = 1,
+    w: int = 720,
+    h: int = 1280,
+    model: Optional[str] = None,
+    ev: Optional[Event] = None,
+):
+    """文生图，一次生成 batch 张，batch 大于 1 时返回图片列表"""
+    async with trace_job("gen_images_by_text", batch=batch), fair_scheduler.slot(ev, "text2image", batch):
+        model_name, model_func = await select_available_model(
+            "text2image",
+            model,
+            query=prompt,
+        )
+        run = run_model if model else run_hedged
+        return await run(model_name, model_func, prompt, w, h, **_batch_kwargs(batch))
+
+
+async def gen_images_by_img(
+    prompt: str,
+    image_id: str,
+    batch: int = 1,
+    model: Optional[str] = None,
+    ev: Optional[Event] = None,
+):
+    """图生图，一次生成 batch 张，batch 大于 1 时返回图片列表"""
+    async with trace_job("gen_images_by_img", batch=batch), fair_scheduler.slot(ev, "image2image", batch):
+        model_name, model_func = await select_available_model(
+            "image2image",
+            model,
+            query=prompt,
+        )
+        image = await RM.get(image_id)
+        return await run_model(model_name, model_func, prompt, image, **_batch_kwargs(batch))
+
+
+async def gen_edit_imgs_by_img(
+    prompt: str,
+    image_id_list: List[str],
+    batch: int = 1,
+    model: Optional[str] = None,
+    ev: Optional[Event] = None,
+):
+    """图片编辑，一次生成 batch 张，batch 大于 1 时返回图片列表"""
+    async with trace_job("gen_edit_imgs_by_img", batch=batch), fair_scheduler.slot(ev, "image_edit", batch):
+        model_name, model_func = await select_available_model(
+            "image_edit",
+            model,
+            query=prompt,
+        )
+        image_list = [await RM.get(image_id) for image_id in image_id_list]
+        return await run_model(model_name, model_func, prompt, image_list, **_batch_kwargs(batch))
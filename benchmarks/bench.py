@@ -0,0 +1,337 @@
+"""
+RH_ComfyUI 离线基准测试
+
+启动本地 ComfyUI / RunningHub / BLT 桩服务，把插件的后端地址指向桩服务，
+再以指定并发驱动 MODEL_REGISTRY 中的模型函数，统计插件自身的开销:
+吞吐量、p50/p99 延迟、RSS 峰值与事件循环延迟。
+
+需要在 gsuid_core 的运行环境中执行（插件依赖 gsuid_core）:
+
+    cd gsuid_core
+    python plugins/RH_ComfyUI/benchmarks/bench.py --models qwen_2512,banana2 -n 50 -c 8
+
+所有请求都只会发往本地桩服务，不会消耗任何 GPU 或云端额度。
+"""
+
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List, Tuple, Callable, Optional, Awaitable
+from pathlib import Path
+from dataclasses import asdict, fields, dataclass
+
+from PIL import Image
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from stub_servers import StubConfig, StubServers  # noqa: E402
+
+
+def _sample_image(size: Optional[int] = None) -> bytes:
+    """默认为 512x512 纯色图；指定 size 时生成带噪点的图片，体积接近同尺寸照片"""
+    buffer = io.BytesIO()
+    if size is None:
+        Image.new("RGB", (512, 512), (128, 160, 192)).save(buffer, format="PNG")
+    else:
+        noise = [Image.effect_noise((size, size), 48) for _ in range(3)]
+        Image.merge("RGB", noise).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def build_args(category: str, ref_size: Optional[int] = None) -> Tuple[Any, ...]:
+    """按模型类别构造调用参数"""
+    image = _sample_image(ref_size)
+    prompt = "一只在樱花树下看书的猫，二次元风格"
+    return {
+        "text2image": (prompt, 720, 1280),
+        "image2image": (prompt, image),
+        "image_edit": (prompt, [image, image]),
+        "music": ("轻快的钢琴曲", None),
+        "speech": ("你好，这是一次基准测试。",),
+        "text2video": (prompt, 480, 832),
+        "image2video": (prompt, image, 480, 832),
+    }[category]
+
+
+def point_plugin_at(servers: StubServers, blt_keys: str = "sk-bench", rh_keys: str = "bench") -> None:
+    """把插件各后端的请求地址与 API Key 改为本地桩服务（只修改内存中的配置）"""
+    from RH_ComfyUI.utils.RH import rh_request
+    from RH_ComfyUI.utils.blt import blt_request
+    from RH_ComfyUI.utils.comfyui import comfyui_api
+    from RH_ComfyUI.rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+    # 云端溢出的 RunningHub 代理同样指向本地 ComfyUI 桩服务
+    for api in (comfyui_api.get_api(), comfyui_api.get_cloud_api()):
+        api.server_address = servers.comfyui_address
+        api.url = f"http://{servers.comfyui_address}"
+
+    RHCOMFYUI_CONFIG.get_config("BLT_apikey").data = blt_keys
+    RHCOMFYUI_CONFIG.get_config("RH_apikey").data = rh_keys
+    blt_request.BASE_URL = servers.blt_url
+    blt_request.CHAT_COMPLETIONS_URL = f"{servers.blt_url}/v1/chat/completions"
+    blt_request.IMAGES_GENERATIONS_URL = f"{servers.blt_url}/v1/images/generations"
+    blt_request.IMAGES_EDITS_URL = f"{servers.blt_url}/v1/images/edits"
+
+    rh_request.BASE_URL = servers.runninghub_url
+    rh_request.UPLOAD_URL = f"{servers.runninghub_url}/task/openapi/upload"
+    rh_request.APP_URL = f"{servers.runninghub_url}/task/openapi/ai-app/run"
+    rh_request.STATUS_URL = f"{servers.runninghub_url}/task/openapi/status"
+    rh_request.OUTPUT_URL = f"{servers.runninghub_url}/task/openapi/outputs"
+
+
+class WebhookReceiver:
+    """模拟 gsuid_core 上挂载的 RunningHub 回调接口，转交给插件的回调处理"""
+
+    def routes(self, app: web.Application) -> None:
+        from RH_ComfyUI.utils.RH.rh_webhook import WEBHOOK_PATH
+
+        app.router.add_post(WEBHOOK_PATH, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        from RH_ComfyUI.utils.RH.rh_webhook import verify_token, handle_callback
+
+        if not verify_token(request.query.get("token", "")):
+            return web.json_response({"code": 403, "msg": "invalid token"}, status=403)
+        handle_callback(await request.json())
+        return web.json_response({"code": 0, "msg": "success"})
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _rss_mb() -> float:
+    """当前进程 RSS (MB)"""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024
+    except ImportError:
+        return 0
+
+
+class LoopMonitor:
+    """采样事件循环延迟与 RSS 峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags: List[float] = []
+        self.peak_rss = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+            self.peak_rss = max(self.peak_rss, _rss_mb())
+
+    def start(self) -> None:
+        self.lags.clear()
+        self.peak_rss = _rss_mb()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+@dataclass
+class ScenarioResult:
+    model: str
+    requests: int
+    concurrency: int
+    errors: int
+    wall_seconds: float
+    throughput: float
+    p50: float
+    p99: float
+    peak_rss_mb: float
+    loop_lag_p50_ms: float
+    loop_lag_p99_ms: float
+    loop_lag_max_ms: float
+
+
+def build_call(model_name: str, ref_size: Optional[int] = None) -> Callable[[], Awaitable[Any]]:
+    """构造单次调用，rh_app 表示直接调用 RunningHub AI 应用接口"""
+    from RH_ComfyUI.utils.RH import rh_request
+    from RH_ComfyUI.utils.hedging import run_hedged
+    from RH_ComfyUI.utils.model_registry import MODEL_REGISTRY
+
+    if model_name == "rh_app":
+        return lambda: rh_request.get_aiapp_result("bench", [])
+
+    # 未开启对冲时与 run_model 相同
+    info = MODEL_REGISTRY[model_name]
+    args = build_args(info.category, ref_size)
+    return lambda: run_hedged(model_name, info.func, *args)
+
+
+async def run_scenario(
+    model_name: str,
+    requests: int,
+    concurrency: int,
+    ref_size: Optional[int] = None,
+) -> ScenarioResult:
+    """以固定并发调用同一个模型 requests 次"""
+    from RH_ComfyUI.utils.model_registry import is_failed_result
+
+    call = build_call(model_name, ref_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def _one() -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await call()
+                if is_failed_result(result):
+                    errors += 1
+            except Exception as e:
+                print(f"[bench] {model_name} 调用失败: {e!r}", file=sys.stderr)
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    monitor = LoopMonitor()
+    monitor.start()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(_one() for _ in range(requests)))
+    wall = time.perf_counter() - wall_start
+    await monitor.stop()
+
+    return ScenarioResult(
+        model=model_name,
+        requests=requests,
+        concurrency=concurrency,
+        errors=errors,
+        wall_seconds=round(wall, 3),
+        throughput=round(requests / wall, 3) if wall else 0,
+        p50=round(_percentile(latencies, 0.5), 3),
+        p99=round(_percentile(latencies, 0.99), 3),
+        peak_rss_mb=round(monitor.peak_rss, 1),
+        loop_lag_p50_ms=round(_percentile(monitor.lags, 0.5) * 1000, 2),
+        loop_lag_p99_ms=round(_percentile(monitor.lags, 0.99) * 1000, 2),
+        loop_lag_max_ms=round(max(monitor.lags, default=0) * 1000, 2),
+    )
+
+
+def print_table(results: List[ScenarioResult]) -> None:
+    header = f"{'model':<20}{'req':>6}{'conc':>6}{'err':>5}{'req/s':>9}{'p50(s)':>9}{'p99(s)':>9}"
+    header += f"{'rss(MB)':>9}{'lag p99(ms)':>13}{'lag max(ms)':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = f"{r.model:<20}{r.requests:>6}{r.concurrency:>6}{r.errors:>5}{r.throughput:>9}{r.p50:>9}{r.p99:>9}"
+        line += f"{r.peak_rss_mb:>9}{r.loop_lag_p99_ms:>13}{r.loop_lag_max_ms:>13}"
+        print(line)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="RH_ComfyUI 离线基准测试")
+    parser.add_argument(
+        "--models", default="qwen_2512,banana2", help="逗号分隔的模型名，rh_app 表示 RunningHub AI 应用"
+    )
+    parser.add_argument("-n", "--requests", type=int, default=20, help="每个模型的请求数")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("--json", dest="json_path", default=None, help="将结果写入 JSON 文件")
+    parser.add_argument("--metrics", action="store_true", help="结束后打印插件的 Prometheus 指标")
+    parser.add_argument("--micro-batch", action="store_true", help="开启 ComfyUI 跨用户微批处理（仅本次运行）")
+    parser.add_argument("--cloud-overflow", action="store_true", help="开启 ComfyUI 云端溢出（仅本次运行）")
+    parser.add_argument("--rpm", type=int, default=0, help="插件侧每分钟请求数限制，0 为不限制（默认不限制）")
+    parser.add_argument("--blt-url", action="store_true", help="BLT 生图使用 url 返回格式（默认优先 b64_json）")
+    parser.add_argument("--hedge", action="store_true", help="开启对冲请求（仅本次运行）")
+    parser.add_argument("--blt-keys", default="sk-bench", help="逗号分隔的 BLT Key，用于测试 Key 池")
+    parser.add_argument("--rh-keys", default="bench", help="逗号分隔的 RunningHub Key，用于测试 Key 池")
+    parser.add_argument("--ref-size", type=int, default=None, help="参考图边长，默认 512x512 纯色图")
+    parser.add_argument("--rh-webhook", action="store_true", help="RunningHub 任务通过本地回调接口通知完成")
+    for f in fields(StubConfig):
+        if isinstance(f.default, bool):
+            parser.add_argument(f"--{f.name.replace('_', '-')}", action="store_true", default=f.default)
+        else:
+            parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(f.default), default=f.default)
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> List[ScenarioResult]:
+    args = parse_args(argv)
+    stub_config = StubConfig(**{f.name: getattr(args, f.name) for f in fields(StubConfig)})
+
+    from RH_ComfyUI.utils.model_manifest import manifest_loader
+    from RH_ComfyUI.utils.model_registry import MODEL_REGISTRY
+
+    # 不经过 gsuid_core 启动流程，手动加载工作流清单中的模型
+    manifest_loader.load()
+    # 只修改内存中的配置，不写回配置文件
+    from RH_ComfyUI.rh_config.comfyui_config import RHCOMFYUI_CONFIG
+
+    if args.micro_batch:
+        RHCOMFYUI_CONFIG.get_config("Micro_Batch_Enable").data = True
+    for key in ("RH_Requests_Per_Minute", "BLT_Requests_Per_Minute"):
+        RHCOMFYUI_CONFIG.get_config(key).data = args.rpm
+    if args.blt_url:
+        RHCOMFYUI_CONFIG.get_config("BLT_Prefer_B64").data = False
+    if args.hedge:
+        RHCOMFYUI_CONFIG.get_config("Hedge_Enable").data = True
+    if args.cloud_overflow:
+        RHCOMFYUI_CONFIG.get_config("Cloud_Overflow_Enable").data = True
+
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    unknown = [m for m in models if m not in MODEL_REGISTRY and m != "rh_app"]
+    if unknown:
+        raise SystemExit(f"未注册的模型: {unknown}，可选: {sorted(MODEL_REGISTRY)}")
+
+    results: List[ScenarioResult] = []
+    async with StubServers(stub_config) as servers:
+        point_plugin_at(servers, args.blt_keys, args.rh_keys)
+        if args.rh_webhook:
+            address = await servers.serve(WebhookReceiver())
+            RHCOMFYUI_CONFIG.get_config("RH_Webhook_URL").data = f"http://{address}"
+        for model_name in models:
+            results.append(await run_scenario(model_name, args.requests, args.concurrency, args.ref_size))
+        if servers.blt.edit_upload_bytes:
+            print(f"[bench] BLT 图片编辑上传: {servers.blt.edit_upload_bytes / 1024 / 1024:.1f} MiB")
+        if args.hedge:
+            print(
+                f"[bench] ComfyUI 桩服务: 中断 {servers.comfyui.interrupted} 个，删除排队 {servers.comfyui.deleted} 个"
+            )
+
+    print_table(results)
+    if args.json_path:
+        payload: Dict[str, Any] = {
+            "stub_config": asdict(stub_config),
+            "results": [asdict(r) for r in results],
+        }
+        Path(args.json_path).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.metrics:
+        from RH_ComfyUI.utils.metrics import REGISTRY
+
+        print(REGISTRY.render())
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+RH_ComfyUI 插件导入耗时检查
+
+在子进程中以 `python -X importtime` 导入插件的全部子包（与 gsuid_core 加载插件的方式一致），
+统计插件导入引起的总耗时与最慢的模块，并检查 httpx / websockets / aiohttp / PIL
+等重依赖是否被提前导入。超出预算或导入了禁止的模块时以非零状态码退出，可直接用于 CI:
+
+    cd gsuid_core
+    python plugins/RH_ComfyUI/benchmarks/import_time.py --budget-ms 300
+
+--preload 指定的模块（默认 gsuid_core 中插件用到的部分）会先导入，不计入插件耗时。
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple, Optional
+from pathlib import Path
+from dataclasses import dataclass
+
+PLUGIN_MODULES = [
+    "RH_ComfyUI",
+    "RH_ComfyUI.rh_config",
+    "RH_ComfyUI.rh_admin",
+    "RH_ComfyUI.rh_draw",
+    "RH_ComfyUI.rh_audio",
+    "RH_ComfyUI.rh_video",
+    "RH_ComfyUI.rh_status",
+    "RH_ComfyUI.rh_webhook",
+]
+DEFAULT_PRELOAD = [
+    "gsuid_core.sv",
+    "gsuid_core.server",
+    "gsuid_core.logger",
+    "gsuid_core.web_app",
+    "gsuid_core.ai_core.register",
+]
+DEFAULT_FORBID = ["httpx", "websockets", "aiohttp", "PIL"]
+
+_MARKER = "--rhcomfyui-import-start--"
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def _script(preload: List[str], modules: List[str]) -> str:
+    lines = ["import sys, importlib"]
+    for name in preload:
+        lines.append(f"try:\n    importlib.import_module({name!r})\nexcept Exception:\n    pass")
+    lines.append(f"sys.stderr.write({_MARKER!r} + '\\n')")
+    for name in modules:
+        lines.append(f"importlib.import_module({name!r})")
+    return "\n".join(lines)
+
+
+def measure(preload: List[str], modules: List[str]) -> List[ImportRecord]:
+    """运行子进程并解析插件部分的 importtime 输出"""
+    env = dict(os.environ)
+    root = str(Path(__file__).parents[1])
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH", "")]))
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _script(preload, modules)],
+        env=env,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"插件导入失败:\n{proc.stderr[-2000:]}")
+
+    records: List[ImportRecord] = []
+    started = False
+    for line in proc.stderr.splitlines():
+        if line.strip() == _MARKER:
+            started = True
+            continue
+        if not started or not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        records.append(
+            ImportRecord(
+                name=name.strip(),
+                self_us=int(parts[0]),
+                cumulative_us=int(parts[1]),
+                depth=(len(name) - len(name.lstrip())) // 2,
+            )
+        )
+    return records
+
+
+def summarize(records: List[ImportRecord], forbid: List[str]) -> Tuple[float, List[str]]:
+    """返回 (插件导入总耗时 ms, 被导入的禁止模块)"""
+    total_ms = sum(r.cumulative_us for r in records if r.depth == 0) / 1000
+    names = {r.name for r in records}
+    forbidden = [m for m in forbid if m in names]
+    return total_ms, forbidden
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="RH_ComfyUI 插件导入耗时检查")
+    parser.add_argument("--budget-ms", type=float, default=0, help="导入耗时预算（毫秒），0 表示不检查")
+    parser.add_argument("--preload", default=",".join(DEFAULT_PRELOAD), help="先导入且不计入耗时的模块")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBID), help="插件导入时不应加载的模块")
+    parser.add_argument("--top", type=int, default=15, help="列出最慢的模块数量")
+    args = parser.parse_args(argv)
+
+    preload = [m for m in args.preload.split(",") if m]
+    forbid = [m for m in args.forbid.split(",") if m]
+
+    records = measure(preload, PLUGIN_MODULES)
+    total_ms, forbidden = summarize(records, forbid)
+
+    print(f"插件导入总耗时: {total_ms:.1f} ms ({len(records)} 个模块)")
+    print(f"{'cumulative(ms)':>15}{'self(ms)':>10}  module")
+    for r in sorted(records, key=lambda r: r.cumulative_us, reverse=True)[: args.top]:
+        print(f"{r.cumulative_us / 1000:>15.1f}{r.self_us / 1000:>10.1f}  {'  ' * r.depth}{r.name}")
+
+    failed = False
+    if forbidden:
+        print(f"❌ 插件导入时加载了重依赖: {forbidden}")
+        failed = True
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"❌ 导入耗时 {total_ms:.1f} ms 超出预算 {args.budget_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
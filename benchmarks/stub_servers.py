@@ -0,0 +1,474 @@
+"""
+离线基准测试用的本地桩服务
+模拟 ComfyUI、RunningHub OpenAPI 与 BLT(OpenAI 兼容) 接口，延迟与载荷大小均可配置
+"""
+
+import io
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+from dataclasses import field, dataclass
+
+from PIL import Image
+from aiohttp import ClientSession, web
+
+
+@dataclass
+class StubConfig:
+    """桩服务参数"""
+
+    # ComfyUI
+    comfy_workers: int = 1  # 同时执行的工作流数量（模拟 GPU 串行）
+    comfy_exec_delay: float = 2.0  # 每个工作流的执行耗时（秒）
+    comfy_steps: int = 4  # progress 事件数量
+    comfy_upload_delay: float = 0.05
+    comfy_view_delay: float = 0.05
+    comfy_slow_ratio: float = 0.0  # 以该概率执行耗时乘以 comfy_slow_factor，模拟长尾
+    comfy_slow_factor: float = 5.0
+    # BLT
+    blt_delay: float = 3.0
+    blt_cdn_delay: float = 0.5
+    blt_rps: float = 0.0  # 每个 Key 超出该速率时返回 429 + Retry-After，0 为不限制
+    blt_bad_keys: str = ""  # 逗号分隔，这些 Key 返回 401
+    blt_no_b64: bool = False  # 不支持 b64_json，请求该格式时返回 400
+    blt_no_edits: bool = False  # 没有 /v1/images/edits 接口，返回 404
+    blt_moderation: bool = False  # 提示词未通过审核，生图与编辑均返回 400
+    blt_stream_steps: int = 4  # 流式 chat/completions 在图片之前发送的进度行数
+    blt_stream_b64: bool = False  # 流式 chat/completions 以单个事件返回 data URL 图片
+    # RunningHub
+    rh_task_delay: float = 3.0
+    rh_webhook_drop: float = 0.0  # 请求带 webhookUrl 时不发送回调的概率（测试兜底轮询）
+    # 载荷
+    image_width: int = 1024
+    image_height: int = 1024
+    media_size: int = 2 * 1024 * 1024  # 音视频载荷字节数
+
+
+def make_png(width: int, height: int) -> bytes:
+    """生成带噪声的 PNG，使体积接近真实出图"""
+    image = Image.frombytes("RGB", (width, height), random.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _output_kind(workflow: Dict[str, Any]) -> str:
+    for node in workflow.values():
+        class_type = node.get("class_type", "")
+        if class_type == "VHS_VideoCombine":
+            return "gifs"
+        if class_type.startswith("SaveAudio"):
+            return "audio"
+    return "images"
+
+
+def _batch_size(workflow: Dict[str, Any]) -> int:
+    """工作流一次输出的图片数（空 latent 的 batch_size 或 RepeatLatentBatch 的 amount）"""
+    batch = 1
+    for node in workflow.values():
+        inputs = node.get("inputs", {})
+        if node.get("class_type") == "RepeatLatentBatch":
+            batch = max(batch, int(inputs.get("amount", 1)))
+        elif "batch_size" in inputs and isinstance(inputs["batch_size"], int):
+            batch = max(batch, inputs["batch_size"])
+    return batch
+
+
+@dataclass
+class _ComfyPrompt:
+    prompt_id: str
+    client_id: str
+    workflow: Dict[str, Any]
+    outputs: Dict[str, Any] = field(default_factory=dict)
+
+
+class ComfyUIStub:
+    """模拟 ComfyUI 的 /prompt、/ws、/history、/view、/upload/image、/queue"""
+
+    def __init__(self, config: StubConfig, png: bytes):
+        self.config = config
+        self.png = png
+        self.media = random.randbytes(config.media_size)
+        self._clients: Dict[str, web.WebSocketResponse] = {}
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._history: Dict[str, Dict[str, Any]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._queued: Dict[str, _ComfyPrompt] = {}
+        self._workers: List[asyncio.Task] = []
+        self.interrupted = 0
+        self.deleted = 0
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_get("/ws", self.handle_ws)
+        app.router.add_post("/prompt", self.handle_prompt)
+        app.router.add_get("/prompt", self.handle_prompt_info)
+        app.router.add_get("/queue", self.handle_queue)
+        app.router.add_post("/queue", self.handle_queue_delete)
+        app.router.add_post("/interrupt", self.handle_interrupt)
+        app.router.add_get("/history/{prompt_id}", self.handle_history)
+        app.router.add_get("/view", self.handle_view)
+        app.router.add_post("/upload/image", self.handle_upload)
+        app.router.add_get("/system_stats", self.handle_system_stats)
+        app.on_startup.append(self._start_workers)
+        app.on_cleanup.append(self._stop_workers)
+
+    async def _start_workers(self, _app: web.Application) -> None:
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.config.comfy_workers)]
+
+    async def _stop_workers(self, _app: web.Application) -> None:
+        for task in self._workers:
+            task.cancel()
+
+    async def _send(self, client_id: str, message: Dict[str, Any]) -> None:
+        ws = self._clients.get(client_id)
+        if ws is not None and not ws.closed:
+            await ws.send_str(json.dumps(message))
+
+    async def _worker(self) -> None:
+        while True:
+            item: _ComfyPrompt = await self._pending.get()
+            # 已从队列删除
+            if self._queued.pop(item.prompt_id, None) is None:
+                continue
+            task = asyncio.create_task(self._execute(item))
+            self._running[item.prompt_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            finally:
+                self._running.pop(item.prompt_id, None)
+
+    async def _execute(self, item: _ComfyPrompt) -> None:
+        pid = item.prompt_id
+        await self._send(item.client_id, {"type": "execution_start", "data": {"prompt_id": pid}})
+        steps = max(self.config.comfy_steps, 1)
+        delay = self.config.comfy_exec_delay
+        if random.random() < self.config.comfy_slow_ratio:
+            delay *= self.config.comfy_slow_factor
+        for step in range(1, steps + 1):
+            await asyncio.sleep(delay / steps)
+            await self._send(
+                item.client_id,
+                {"type": "progress", "data": {"prompt_id": pid, "value": step, "max": steps}},
+            )
+
+        kind = _output_kind(item.workflow)
+        suffix = {"images": "png", "gifs": "mp4", "audio": "mp3"}[kind]
+        count = _batch_size(item.workflow) if kind == "images" else 1
+        # 每个 SaveImage 节点各自输出，合并提交的工作流据此拆分结果
+        nodes = [i for i, n in item.workflow.items() if n.get("class_type") == "SaveImage"]
+        outputs: Dict[str, Any] = {}
+        for node_id in nodes if kind == "images" and nodes else ["9"]:
+            files = [
+                {"filename": f"{pid}_{node_id}_{i}.{suffix}", "subfolder": "", "type": "output"} for i in range(count)
+            ]
+            outputs[node_id] = {kind: files}
+        self._history[pid] = {"outputs": outputs}
+        await self._send(item.client_id, {"type": "executing", "data": {"prompt_id": pid, "node": None}})
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        client_id = request.query.get("clientId", "")
+        self._clients[client_id] = ws
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self._clients.pop(client_id, None)
+        return ws
+
+    async def handle_prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        item = _ComfyPrompt(
+            prompt_id=str(uuid.uuid4()),
+            client_id=body.get("client_id", ""),
+            workflow=body.get("prompt", {}),
+        )
+        self._queued[item.prompt_id] = item
+        self._pending.put_nowait(item)
+        return web.json_response({"prompt_id": item.prompt_id, "number": self._pending.qsize(), "node_errors": {}})
+
+    async def handle_prompt_info(self, request: web.Request) -> web.Response:
+        remaining = len(self._queued) + len(self._running)
+        return web.json_response({"exec_info": {"queue_remaining": remaining}})
+
+    async def handle_queue(self, request: web.Request) -> web.Response:
+        running = [[n, pid, {}, {}, []] for n, pid in enumerate(self._running)]
+        pending = [[n, pid, {}, {}, []] for n, pid in enumerate(self._queued)]
+        return web.json_response({"queue_running": running, "queue_pending": pending})
+
+    async def handle_queue_delete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        for pid in body.get("delete", []):
+            if self._queued.pop(pid, None) is not None:
+                self.deleted += 1
+        return web.json_response({})
+
+    async def handle_interrupt(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        # 未指定 prompt_id 时与旧版 ComfyUI 相同，中断当前执行的任务
+        pid = body.get("prompt_id") or next(iter(self._running), None)
+        task = self._running.get(pid) if pid else None
+        if task is not None:
+            task.cancel()
+            self.interrupted += 1
+        return web.json_response({})
+
+    async def handle_history(self, request: web.Request) -> web.Response:
+        pid = request.match_info["prompt_id"]
+        if pid not in self._history:
+            return web.json_response({})
+        return web.json_response({pid: self._history[pid]})
+
+    async def handle_view(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.config.comfy_view_delay)
+        filename = request.query.get("filename", "")
+        if filename.endswith(".png"):
+            return web.Response(body=self.png, content_type="image/png")
+        return web.Response(body=self.media, content_type="application/octet-stream")
+
+    async def handle_upload(self, request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(self.config.comfy_upload_delay)
+        return web.json_response({"name": f"{uuid.uuid4().hex}.png", "subfolder": "", "type": "input"})
+
+    async def handle_system_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"system": {"os": "stub"}, "devices": []})
+
+
+class RunningHubStub:
+    """模拟 RunningHub OpenAPI 的上传、提交、状态与结果接口"""
+
+    def __init__(self, config: StubConfig, png: bytes):
+        self.config = config
+        self.png = png
+        self._tasks: Dict[str, float] = {}
+        self._callbacks: List[asyncio.Task] = []
+        self.base_url = ""
+        self.status_requests = 0
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/task/openapi/upload", self.handle_upload)
+        app.router.add_post("/task/openapi/ai-app/run", self.handle_run)
+        app.router.add_post("/task/openapi/status", self.handle_status)
+        app.router.add_post("/task/openapi/outputs", self.handle_outputs)
+        app.router.add_post("/uc/openapi/accountStatus", self.handle_account)
+        app.router.add_get("/rh_files/{name}", self.handle_file)
+
+    @staticmethod
+    def _ok(data: Any) -> web.Response:
+        return web.json_response({"code": 0, "msg": "success", "data": data})
+
+    async def handle_upload(self, request: web.Request) -> web.Response:
+        await request.read()
+        return self._ok({"fileName": f"api/{uuid.uuid4().hex}.png", "fileType": "image"})
+
+    async def handle_run(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        task_id = str(random.randint(10**17, 10**18))
+        self._tasks[task_id] = asyncio.get_running_loop().time() + self.config.rh_task_delay
+        webhook = body.get("webhookUrl")
+        if webhook and random.random() >= self.config.rh_webhook_drop:
+            self._callbacks.append(asyncio.create_task(self._callback(webhook, task_id)))
+        return self._ok({"taskId": task_id, "taskStatus": "QUEUED"})
+
+    async def _callback(self, url: str, task_id: str) -> None:
+        """任务结束后按 RunningHub 的格式 POST TASK_END 事件"""
+        await asyncio.sleep(self.config.rh_task_delay)
+        event_data = {
+            "code": 0,
+            "msg": "success",
+            "data": [{"fileUrl": f"{self.base_url}/rh_files/{task_id}.png", "fileType": "png"}],
+        }
+        payload = {"event": "TASK_END", "taskId": task_id, "eventData": json.dumps(event_data)}
+        async with ClientSession() as session:
+            async with session.post(url, json=payload) as resp:
+                await resp.read()
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        self.status_requests += 1
+        body = await request.json()
+        done_at = self._tasks.get(str(body.get("taskId")))
+        if done_at is None:
+            return self._ok("FAILED")
+        if asyncio.get_running_loop().time() >= done_at:
+            return self._ok("SUCCESS")
+        return self._ok("RUNNING")
+
+    async def handle_outputs(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return self._ok([{"fileUrl": f"{self.base_url}/rh_files/{body.get('taskId')}.png", "fileType": "png"}])
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.png, content_type="image/png")
+
+    async def handle_account(self, request: web.Request) -> web.Response:
+        return self._ok({"remainCoins": "1000", "currentTaskCounts": "0"})
+
+
+class BLTStub:
+    """模拟 BLT 的 /v1/images/generations、/v1/images/edits、/v1/chat/completions 与图片 CDN"""
+
+    def __init__(self, config: StubConfig, png: bytes):
+        self.config = config
+        self.png = png
+        self.b64 = base64.b64encode(png).decode()
+        self.base_url = ""
+        self.rate_limited = 0
+        self.edit_upload_bytes = 0
+        self.image_requests = 0
+        self._b64_bodies: Dict[int, bytes] = {}
+        self._last_accept: Dict[str, float] = {}
+
+    def routes(self, app: web.Application) -> None:
+        app.router.add_post("/v1/images/generations", self.handle_generations)
+        app.router.add_post("/v1/images/edits", self.handle_edits)
+        app.router.add_post("/v1/chat/completions", self.handle_chat)
+        app.router.add_get("/v1/models", self.handle_models)
+        app.router.add_get("/cdn/{name}", self.handle_cdn)
+
+    def _reject(self, request: web.Request) -> Optional[web.Response]:
+        """无效 Key 返回 401，按 Key 超出 blt_rps 时返回 429"""
+        key = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if key in self.config.blt_bad_keys.split(","):
+            return web.json_response({"error": "invalid api key"}, status=401)
+        if self.config.blt_rps <= 0:
+            return None
+        now = time.monotonic()
+        if now - self._last_accept.get(key, 0) < 1 / self.config.blt_rps:
+            self.rate_limited += 1
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "1"})
+        self._last_accept[key] = now
+        return None
+
+    async def handle_generations(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+        await asyncio.sleep(self.config.blt_delay)
+        return self._images(int(body.get("n") or 1), body.get("response_format"))
+
+    async def handle_edits(self, request: web.Request) -> web.Response:
+        if self.config.blt_no_edits:
+            return web.json_response({"error": "not found"}, status=404)
+        fields: Dict[str, str] = {}
+        async for part in await request.multipart():
+            if part.filename:
+                self.edit_upload_bytes += len(await part.read())
+            else:
+                fields[part.name or ""] = await part.text()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+        await asyncio.sleep(self.config.blt_delay)
+        return self._images(int(fields.get("n") or 1), fields.get("response_format"))
+
+    def _images(self, n: int, response_format: Optional[str]) -> web.Response:
+        self.image_requests += 1
+        if self.config.blt_moderation:
+            return web.json_response({"error": {"message": "prompt rejected by safety system"}}, status=400)
+        if response_format == "b64_json" and self.config.blt_no_b64:
+            return web.json_response({"error": "unsupported response_format"}, status=400)
+        if response_format == "b64_json":
+            # 桩服务与插件在同一进程，预先序列化以免桩服务自身的编码耗时计入事件循环延迟
+            if n not in self._b64_bodies:
+                data = [{"b64_json": self.b64} for _ in range(n)]
+                self._b64_bodies[n] = json.dumps({"created": 0, "data": data}).encode()
+            return web.Response(body=self._b64_bodies[n], content_type="application/json")
+        else:
+            data = [{"url": f"{self.base_url}/cdn/{uuid.uuid4().hex}.png"} for _ in range(n)]
+        return web.json_response({"created": 0, "data": data})
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if (rejected := self._reject(request)) is not None:
+            return rejected
+        if body.get("stream"):
+            return await self._stream_chat(request)
+        await asyncio.sleep(self.config.blt_delay)
+        content = f"{self.base_url}/cdn/{uuid.uuid4().hex}.png"
+        return web.json_response({"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]})
+
+    async def _stream_chat(self, request: web.Request) -> web.StreamResponse:
+        """按 SSE 先发送进度行，最后发送 Markdown 图片"""
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+
+        async def send(content: str) -> None:
+            event = {"choices": [{"index": 0, "delta": {"content": content}}]}
+            await resp.write(f"data: {json.dumps(event)}\n\n".encode())
+
+        steps = max(self.config.blt_stream_steps, 1)
+        for step in range(steps):
+            await asyncio.sleep(self.config.blt_delay / steps)
+            await send(f"> 进度 {(step + 1) * 100 // (steps + 1)}%\n")
+        if self.config.blt_stream_b64:
+            await send(f"![image](data:image/png;base64,{self.b64})")
+        else:
+            url = f"{self.base_url}/cdn/{uuid.uuid4().hex}.png"
+            # URL 分两段发送，验证增量拼接
+            await send(f"![image]({url[: len(url) // 2]}")
+            await send(f"{url[len(url) // 2 :]})")
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        return web.json_response({"data": []})
+
+    async def handle_cdn(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.config.blt_cdn_delay)
+        return web.Response(body=self.png, content_type="image/png")
+
+
+class StubServers:
+    """在本地随机端口上同时启动三个桩服务"""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1"):
+        self.config = config or StubConfig()
+        self.host = host
+        png = make_png(self.config.image_width, self.config.image_height)
+        self.comfyui = ComfyUIStub(self.config, png)
+        self.runninghub = RunningHubStub(self.config, png)
+        self.blt = BLTStub(self.config, png)
+        self._runners: List[web.AppRunner] = []
+        self.comfyui_address = ""
+        self.runninghub_url = ""
+        self.blt_url = ""
+
+    async def serve(self, stub) -> str:
+        """在随机端口上启动一个提供 routes(app) 的服务，返回 host:port"""
+        app = web.Application(client_max_size=1024**3)
+        stub.routes(app)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, 0)
+        await site.start()
+        self._runners.append(runner)
+        port = runner.addresses[0][1]
+        return f"{self.host}:{port}"
+
+    async def start(self) -> "StubServers":
+        self.comfyui_address = await self.serve(self.comfyui)
+        self.runninghub_url = f"http://{await self.serve(self.runninghub)}"
+        self.runninghub.base_url = self.runninghub_url
+        self.blt_url = f"http://{await self.serve(self.blt)}"
+        self.blt.base_url = self.blt_url
+        return self
+
+    async def stop(self) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+
+    async def __aenter__(self) -> "StubServers":
+        return await self.start()
+
+    async def __aexit__(self, *args) -> None:
+        await self.stop()
@@ -0,0 +1,88 @@
+import asyncio
+
+from RH_ComfyUI.utils.model_router import model_router
+from RH_ComfyUI.utils.backend_health import CircuitState, BackendHealth, CircuitBreaker, backend_health
+from RH_ComfyUI.utils.model_registry import MODEL_REGISTRY, run_model
+from RH_ComfyUI.utils.model_availability import ModelInfo, ModelRequirement, availability_checker
+
+
+def _half_open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("down")
+    breaker._opened_at -= breaker.recovery_timeout
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_half_open_allows_single_trial():
+    health = BackendHealth()
+    _half_open(health.breakers["blt"])
+
+    assert health.allow_request("blt")
+    assert not health.allow_request("blt")
+
+    health.record("blt", True)
+    assert health.allow_request("blt")
+    assert health.allow_request("blt")
+
+
+def test_rejected_call_does_not_reopen_breaker(monkeypatch):
+    breaker = backend_health.breakers["blt"]
+    monkeypatch.setattr(breaker, "_state", CircuitState.CLOSED)
+    monkeypatch.setattr(breaker, "failures", 0)
+    _half_open(breaker)
+    states = []
+    monkeypatch.setattr(breaker, "_listeners", [lambda b: states.append(b._state)])
+
+    async def call(*args):
+        # 与 BLT _request 相同：多次请求只在入口检查一次
+        if not backend_health.allow_request("blt"):
+            return 503
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    info = ModelInfo("test_trial", call, [ModelRequirement.BLT_API], "text2image", "test")
+    monkeypatch.setitem(MODEL_REGISTRY, "test_trial", info)
+
+    async def main():
+        return await asyncio.gather(run_model("test_trial", call), run_model("test_trial", call))
+
+    assert asyncio.run(main()) == ["ok", 503]
+    # 试探开始与结束各通知一次，被拒绝的调用不会使熔断器重新打开
+    assert states == [CircuitState.HALF_OPEN, CircuitState.CLOSED]
+    assert model_router.stats("test_trial").error_rate == 0
+
+
+def test_client_errors_do_not_trip_breaker(monkeypatch):
+    breaker = backend_health.breakers["blt"]
+    monkeypatch.setattr(breaker, "_state", CircuitState.CLOSED)
+    monkeypatch.setattr(breaker, "failures", 0)
+    results = iter([400, 415, 422, -1, 500])
+
+    async def call(*args):
+        return next(results)
+
+    info = ModelInfo("test_client_error", call, [ModelRequirement.BLT_API], "text2image", "test")
+    monkeypatch.setitem(MODEL_REGISTRY, "test_client_error", info)
+
+    async def main():
+        return [await run_model("test_client_error", call) for _ in range(5)]
+
+    assert asyncio.run(main()) == [400, 415, 422, -1, 500]
+    # 只有 5xx 计入熔断
+    assert breaker.failures == 1
+
+
+def test_backend_blocked_while_trial_in_flight(monkeypatch):
+    breaker = backend_health.breakers["blt"]
+    monkeypatch.setattr(breaker, "_state", CircuitState.CLOSED)
+    monkeypatch.setattr(breaker, "failures", 0)
+    monkeypatch.setattr(breaker, "_probing", False)
+    _half_open(breaker)
+
+    assert availability_checker._check_health(ModelRequirement.BLT_API)[0]
+    assert backend_health.allow_request("blt")
+    assert not availability_checker._check_health(ModelRequirement.BLT_API)[0]
+
+    # 试探调用被取消后释放名额，后端重新可选
+    backend_health.end_trial("blt")
+    assert availability_checker._check_health(ModelRequirement.BLT_API)[0]
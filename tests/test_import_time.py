@@ -0,0 +1,9 @@
+from benchmarks.import_time import DEFAULT_FORBID, PLUGIN_MODULES, DEFAULT_PRELOAD, measure, summarize
+
+
+def test_plugin_import_skips_heavy_dependencies():
+    records = measure(DEFAULT_PRELOAD, PLUGIN_MODULES)
+    _, forbidden = summarize(records, DEFAULT_FORBID)
+
+    assert records
+    assert forbidden == []
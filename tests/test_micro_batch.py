@@ -0,0 +1,45 @@
+import asyncio
+from pathlib import Path
+from contextlib import asynccontextmanager
+
+from RH_ComfyUI.utils import tracing
+from RH_ComfyUI.utils.comfyui import micro_batch
+from RH_ComfyUI.utils.backend_health import mark_backend, track_backend
+
+
+class _API:
+    async def generate_images_by_node(self, workflow):
+        return {"1": ["first"], "2": ["second"]}
+
+
+@asynccontextmanager
+async def _overflow_acquire(models):
+    # 与调度器溢出到云端相同：在合并任务中标记实际后端
+    mark_backend("runninghub")
+    with tracing.span("comfyui.dispatch", target="cloud"):
+        yield _API()
+
+
+def test_batch_backend_and_spans_reach_every_waiter(monkeypatch):
+    monkeypatch.setattr(micro_batch, "build_batch_workflow", lambda spec, params: ({}, [["1"], ["2"]]))
+    monkeypatch.setattr(micro_batch.comfyui_dispatcher, "acquire", _overflow_acquire)
+    monkeypatch.setattr(tracing, "_is_enabled", lambda: True)
+    monkeypatch.setattr(tracing, "_write_lines", lambda lines: None)
+    spec = micro_batch.BatchSpec("test_batch", Path("unused.json"), (), lambda *a, **k: None)
+    batcher = micro_batch.MicroBatcher()
+
+    async def request(prompt):
+        async with tracing.trace_job("job"):
+            with track_backend() as trace:
+                image = await batcher.submit(spec, (512, 512), prompt=prompt)
+            job = tracing._current_job.get()
+            return image, trace.served, [s.name for s in job.spans]
+
+    async def main():
+        return await asyncio.gather(request("a"), request("b"))
+
+    for image, served, spans in asyncio.run(main()):
+        assert image in ("first", "second")
+        assert served == ["runninghub"]
+        assert "comfyui.micro_batch" in spans
+        assert "comfyui.dispatch" in spans
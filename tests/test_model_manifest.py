@@ -0,0 +1,100 @@
+import json
+import asyncio
+
+import pytest
+
+from RH_ComfyUI.utils import model_manifest
+from RH_ComfyUI.utils.comfyui import _request
+
+
+class _Loaded(Exception):
+    pass
+
+
+def test_handler_runs_manifest_workflow(monkeypatch, tmp_path):
+    path = tmp_path / "my_qwen.manifest.json"
+    path.write_text(
+        json.dumps(
+            {
+                "name": "my_qwen",
+                "category": "text2image",
+                "workflow": "custom.json",
+                "handler": "draw_img_by_qwen_2512",
+            }
+        ),
+        encoding="utf-8",
+    )
+    loaded = []
+
+    def load_workflow(workflow_path):
+        loaded.append(workflow_path)
+        raise _Loaded
+
+    monkeypatch.setattr(_request, "load_workflow", load_workflow)
+    func = model_manifest.resolve_func(model_manifest.parse_manifest(path))
+
+    with pytest.raises(_Loaded):
+        asyncio.run(func("cat", 720, 1280, batch=2))
+    assert loaded == [tmp_path / "custom.json"]
+
+
+def test_bundled_manifest_uses_synced_workflow():
+    bundled = model_manifest._CP_WORKFLOW_PATH / "文生图" / "qwen_2512.manifest.json"
+    manifest = model_manifest.parse_manifest(bundled)
+    assert manifest.workflow_path == model_manifest.WORKFLOW_PATH / "文生图" / "qwen_2512.json"
+
+
+def test_blt_chat_manifest_streams_progress(monkeypatch, tmp_path):
+    from RH_ComfyUI.utils.blt import blt_request
+    from RH_ComfyUI.utils.progress import progress_reporter
+
+    path = tmp_path / "blt_chat.manifest.json"
+    path.write_text(
+        json.dumps({"name": "blt_chat", "category": "text2image", "backend": "blt", "model": "gpt-4o-image"}),
+        encoding="utf-8",
+    )
+    calls = []
+
+    async def draw_image_by_model(model, prompt, stream=False, on_progress=None):
+        calls.append((model, stream))
+        await on_progress("排队中")
+        await on_progress("生成中")
+        return "image"
+
+    monkeypatch.setattr(blt_request, "draw_image_by_model", draw_image_by_model)
+    func = model_manifest.resolve_func(model_manifest.parse_manifest(path))
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    async def main():
+        with progress_reporter(send):
+            return await func("cat", 720, 1280)
+
+    assert asyncio.run(main()) == "image"
+    assert calls == [("gpt-4o-image", True)]
+    # 间隔内的进度合并，只发送第一条
+    assert sent == ["排队中"]
+
+
+def test_reload_removes_deleted_manifest(tmp_path):
+    from RH_ComfyUI.utils.model_registry import MODEL_REGISTRY, REGISTRY_INDEX
+    from RH_ComfyUI.utils.recommend_cache import recommend_cache
+
+    path = tmp_path / "gone.manifest.json"
+    path.write_text(
+        json.dumps({"name": "test_gone", "category": "text2image", "backend": "blt", "model": "gpt-4o-image"}),
+        encoding="utf-8",
+    )
+    loader = model_manifest.ManifestLoader()
+    assert loader.apply([model_manifest.parse_manifest(path)]) == (["test_gone"], [])
+    assert "test_gone" in REGISTRY_INDEX.category("text2image")
+
+    recommend_cache.set("text2image", "cat", ["test_gone"])
+    assert loader.apply([]) == ([], ["test_gone"])
+    assert "test_gone" not in MODEL_REGISTRY
+    assert "test_gone" not in REGISTRY_INDEX.category("text2image")
+    assert recommend_cache.get("text2image", "cat") is None
+    # 内置模型不由清单注册，不会被移除
+    assert "banana2" in MODEL_REGISTRY
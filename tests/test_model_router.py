@@ -0,0 +1,93 @@
+import asyncio
+
+from RH_ComfyUI.utils import hedging
+from RH_ComfyUI.utils.model_router import ModelStats, ModelRouter, model_router
+from RH_ComfyUI.utils.model_registry import MODEL_REGISTRY, run_model
+from RH_ComfyUI.rh_config.comfyui_config import RHCOMFYUI_CONFIG
+from RH_ComfyUI.utils.model_availability import ModelInfo, ModelRequirement
+
+
+def test_lower_bound_raises_p95_but_ignores_short_samples():
+    stats = ModelStats()
+    for _ in range(10):
+        stats.record(0.1, True)
+
+    stats.record_lower_bound(0.05)
+    assert len(stats.durations) == 10
+
+    for _ in range(3):
+        stats.record_lower_bound(0.5)
+    assert stats.p95 == 0.5
+
+
+def _register(monkeypatch, name: str, requirement: ModelRequirement, func) -> ModelInfo:
+    info = ModelInfo(name, func, [requirement], "text2image", "test")
+    monkeypatch.setitem(MODEL_REGISTRY, name, info)
+    return info
+
+
+def test_hedge_loser_keeps_p95_from_drifting(monkeypatch):
+    async def slow(*args):
+        await asyncio.sleep(0.5)
+        return "slow"
+
+    async def fast(*args):
+        await asyncio.sleep(0.01)
+        return "fast"
+
+    _register(monkeypatch, "test_primary", ModelRequirement.COMFYUI_URL, slow)
+    _register(monkeypatch, "test_secondary", ModelRequirement.BLT_API, fast)
+    monkeypatch.setattr(RHCOMFYUI_CONFIG.get_config("Hedge_Enable"), "data", True)
+
+    async def pick_secondary(model_name):
+        return "test_secondary"
+
+    monkeypatch.setattr(hedging, "pick_secondary", pick_secondary)
+
+    stats = model_router.stats("test_primary")
+    for _ in range(10):
+        stats.record(0.1, True)
+
+    async def main():
+        for _ in range(5):
+            assert await hedging.run_hedged("test_primary", slow) == "fast"
+
+    asyncio.run(main())
+    assert stats.p95 > 0.1
+    assert stats.error_rate == 0
+
+
+def test_caller_cancel_records_no_duration(monkeypatch):
+    async def slow(*args):
+        await asyncio.sleep(0.5)
+
+    _register(monkeypatch, "test_cancelled", ModelRequirement.COMFYUI_URL, slow)
+    stats = model_router.stats("test_cancelled")
+
+    async def main():
+        task = asyncio.create_task(run_model("test_cancelled", slow))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert len(stats.durations) == 0
+    assert stats.inflight == 0
+
+
+def test_failed_queue_fetch_is_cached(monkeypatch):
+    calls = []
+
+    async def fetch(backend):
+        calls.append(backend)
+        raise asyncio.TimeoutError
+
+    router = ModelRouter(queue_ttl=60)
+    monkeypatch.setattr(router, "_fetch_remote_queue", fetch)
+    router._backend_inflight["comfyui"] = 2
+
+    async def main():
+        return [await router.backend_queue_depth("comfyui") for _ in range(3)]
+
+    assert asyncio.run(main()) == [2, 2, 2]
+    assert calls == ["comfyui"]
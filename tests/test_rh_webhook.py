@@ -0,0 +1,45 @@
+import json
+import asyncio
+
+from RH_ComfyUI.utils.RH import rh_webhook
+
+
+def _payload(event_data, task_id="42"):
+    return {"taskId": task_id, "event": "TASK_END", "eventData": event_data}
+
+
+def test_parse_callback_success():
+    data = json.dumps({"code": 0, "data": [{"fileUrl": "https://x/1.png"}]})
+    assert rh_webhook.parse_callback(_payload(data)) == ("42", "https://x/1.png")
+
+
+def test_parse_callback_errors():
+    assert rh_webhook.parse_callback(_payload(json.dumps({"code": 805}))) == ("42", 805)
+    assert rh_webhook.parse_callback(_payload("not json")) == ("42", 500)
+    assert rh_webhook.parse_callback(_payload(json.dumps([1, 2]))) == ("42", 500)
+    assert rh_webhook.parse_callback(_payload(json.dumps({"code": 0, "data": ["x"]}))) == ("42", 500)
+    assert rh_webhook.parse_callback(_payload(json.dumps({"code": "bad"}))) == ("42", 500)
+    assert rh_webhook.parse_callback(_payload(json.dumps({"code": "805"}))) == ("42", 805)
+    assert rh_webhook.parse_callback(_payload(json.dumps({"data": []}))) == ("42", 500)
+
+
+def test_parse_callback_ignores_other_events():
+    assert rh_webhook.parse_callback({"taskId": "42", "event": "TASK_START"}) is None
+    assert rh_webhook.parse_callback({"event": "TASK_END"}) is None
+
+
+def test_verify_token():
+    assert rh_webhook.verify_token(rh_webhook.WEBHOOK_TOKEN)
+    assert not rh_webhook.verify_token("forged")
+
+
+def test_callback_before_waiter():
+    data = json.dumps({"code": 0, "data": [{"fileUrl": "https://x/early.png"}]})
+    assert rh_webhook.handle_callback(_payload(data, "early"))
+
+    async def main():
+        future = rh_webhook.expect("early")
+        assert future.done()
+        return await future
+
+    assert asyncio.run(main()) == "https://x/early.png"
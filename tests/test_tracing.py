@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from RH_ComfyUI.utils import tracing
+
+
+def test_new_day_prunes_old_traces(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_PATH", tmp_path)
+    monkeypatch.setattr(tracing, "_retention_days", lambda: 7)
+    today = datetime.now()
+    old = tmp_path / f"{(today - timedelta(days=8)).strftime('%Y-%m-%d')}.jsonl"
+    recent = tmp_path / f"{(today - timedelta(days=6)).strftime('%Y-%m-%d')}.jsonl"
+    old.write_text("{}\n")
+    recent.write_text("{}\n")
+
+    tracing._write_lines(["{}"])
+
+    assert not old.exists()
+    assert recent.exists()
+    assert (tmp_path / f"{today.strftime('%Y-%m-%d')}.jsonl").read_text() == "{}\n"
+
+
+def test_zero_retention_keeps_traces(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_PATH", tmp_path)
+    monkeypatch.setattr(tracing, "_retention_days", lambda: 0)
+    old = tmp_path / "2000-01-01.jsonl"
+    old.write_text("{}\n")
+
+    tracing._write_lines(["{}"])
+
+    assert old.exists()
@@ -0,0 +1,38 @@
+from RH_ComfyUI.utils.resource import RESOURCE_PATH
+
+
+def _setup(monkeypatch, tmp_path):
+    bundled = tmp_path / "bundled"
+    local = tmp_path / "local"
+    bundled.mkdir()
+    local.mkdir()
+    monkeypatch.setattr(RESOURCE_PATH, "_CP_WORKFLOW_PATH", bundled)
+    monkeypatch.setattr(RESOURCE_PATH, "WORKFLOW_PATH", local)
+    monkeypatch.setattr(RESOURCE_PATH, "SYNC_STATE_PATH", local / ".sync_state.json")
+    return bundled, local
+
+
+def test_first_sync_after_upgrade_overwrites_stale_copy(monkeypatch, tmp_path):
+    bundled, local = _setup(monkeypatch, tmp_path)
+    (bundled / "draw.json").write_text("new")
+    (local / "draw.json").write_text("old")
+
+    assert RESOURCE_PATH.sync_workflows() == ["draw.json"]
+    assert (local / "draw.json").read_text() == "new"
+
+
+def test_modified_copy_is_kept(monkeypatch, tmp_path):
+    bundled, local = _setup(monkeypatch, tmp_path)
+    (bundled / "draw.json").write_text("v1")
+    RESOURCE_PATH.sync_workflows()
+
+    (local / "draw.json").write_text("edited")
+    (bundled / "draw.json").write_text("v2")
+    assert RESOURCE_PATH.sync_workflows() == []
+    assert (local / "draw.json").read_text() == "edited"
+
+    # 未修改过的文件随自带文件更新
+    (local / "draw.json").write_text("v2")
+    RESOURCE_PATH.sync_workflows()
+    (bundled / "draw.json").write_text("v3")
+    assert RESOURCE_PATH.sync_workflows() == ["draw.json"]